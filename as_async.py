@@ -0,0 +1,483 @@
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+import aiohttp
+
+import as_export as asx
+import as_transport as astransport
+import cleanup as clean
+import export_archive as exarchive
+import export_pool as expool
+import export_timing as extiming
+import lookup_cache as lcache
+from as_logging import logger
+
+DEFAULT_CONCURRENCY = 8
+"""int: number of resources exported at the same time if _ASYNC_CONCURRENCY_ is missing from defaults.json"""
+DEFAULT_TIMEOUT = 300
+"""int: seconds before a request is cancelled if _REQUEST_TIMEOUT_ is missing from defaults.json"""
+_RUN_FINISHED = object()
+"""object: placed in the results queue when every resource of an export all run has been handled"""
+
+
+class AsyncASClient:
+    """
+    Sends requests to the ASpace API with asyncio, reusing the session token of an authorized ASnake client.
+
+    Requests go through the same as_transport.AdaptiveLimiter as the ASnake client's, and use its connection pool size,
+    if as_transport.configure_client() mounted them. Each attempt holds its place in the limiter until its body is read.
+    """
+    def __init__(self, client, max_concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, max_retries=None):
+        """
+        Must contain an authorized ASnake client.
+
+        Args:
+            client (ASnake.client object): an authorized client object from ASnake.client, used for the API URL and
+            session token
+            max_concurrency (int, optional): number of requests that can be sent to ArchivesSpace at the same time
+            timeout (int, optional): seconds before a single request is cancelled
+            max_retries (int, optional): number of times a request is retried after a connection error, timeout, or
+            one of as_transport.RETRY_STATUSES, as_transport.DEFAULT_MAX_RETRIES if None
+        """
+        self.baseurl = client.config['baseurl'].rstrip("/")
+        """str: the ArchivesSpace API URL"""
+        self.headers = dict(client.session.headers)
+        """dict: headers of the ASnake session, including the ArchivesSpace session token"""
+        self.max_concurrency = max_concurrency
+        """int: number of requests that can be sent to ArchivesSpace at the same time"""
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        """aiohttp.ClientTimeout object: timeout applied to each request"""
+        self.max_retries = astransport.DEFAULT_MAX_RETRIES if max_retries is None else max_retries
+        """int: number of times a request is retried, waiting twice as long before each retry"""
+        self.limiter, pool_size = astransport.get_limiter(client)
+        """as_transport.AdaptiveLimiter instance: the limiter shared with the ASnake client, None if it has none"""
+        self.pool_size = max(max_concurrency, pool_size or 0)
+        """int: number of connections kept open to ArchivesSpace"""
+        self.semaphore = None
+        """asyncio.Semaphore object: limits the number of requests waiting on ArchivesSpace at the same time"""
+        self.session = None
+        """aiohttp.ClientSession object: the open HTTP session, None until the client is entered"""
+
+    async def __aenter__(self):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.pool_size)
+        self.session = aiohttp.ClientSession(headers=self.headers, timeout=self.timeout, connector=connector)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    async def retry(self, send, *args):
+        """
+        Sends a request, retrying it with exponential backoff if it fails in a way worth retrying.
+
+        Args:
+            send (coroutine function): sends the request once and returns a tuple starting with the HTTP status code
+            *args: arguments passed to send
+
+        Returns:
+            response (tuple): what send returned for the last attempt
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await send(*args)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.info(f'Retrying {args[0]} after error: {e!r}')
+            else:
+                if response[0] not in astransport.RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                logger.info(f'Retrying {args[0]} after response {response[0]}')
+            await asyncio.sleep(astransport.get_backoff(attempt))
+
+    async def acquire(self):
+        """
+        Waits for the shared limiter to allow another request, if there is one.
+
+        Returns:
+            start_time (float): time.perf_counter() once the request is allowed
+        """
+        if self.limiter is not None:
+            await self.limiter.acquire_async()
+        return time.perf_counter()
+
+    def release(self, full_url, start_time, failed):
+        """
+        Counts a request as finished in the shared limiter, if there is one.
+
+        Args:
+            full_url (str): the full URL of the request
+            start_time (float): what acquire() returned for the request
+            failed (bool): whether the request errored or ArchivesSpace returned a server error
+
+        Returns:
+            None
+        """
+        if self.limiter is not None:
+            self.limiter.release(astransport.get_route(full_url), time.perf_counter() - start_time, failed)
+
+    async def get(self, url, params=None):
+        """
+        Sends a GET request to the ASpace API and reads the whole response, retrying it if it fails.
+
+        Args:
+            url (str): the API endpoint, ex. /repositories/2/resources/1
+            params (dict, optional): query parameters, booleans are sent the same way requests sends them
+
+        Returns:
+            status (int): the HTTP status code of the response
+            content (bytes): the body of the response
+        """
+        return await self.retry(self.get_once, url, params)
+
+    async def get_once(self, url, params=None):
+        """
+        Sends a GET request to the ASpace API and reads the whole response.
+
+        Args:
+            url (str): the API endpoint, ex. /repositories/2/resources/1
+            params (dict, optional): query parameters, booleans are sent the same way requests sends them
+
+        Returns:
+            status (int): the HTTP status code of the response
+            content (bytes): the body of the response
+        """
+        full_url = "/".join([self.baseurl, url.lstrip("/")])
+        if params is not None:
+            params = {key: str(value) for key, value in params.items()}
+        async with self.semaphore:
+            start_time = await self.acquire()
+            failed = True
+            try:
+                async with self.session.get(full_url, params=params) as response:
+                    content = await response.read()
+                    failed = astransport.is_failure(response.status)
+                    return response.status, content
+            finally:
+                self.release(full_url, start_time, failed)
+
+    async def download(self, url, filepath, params=None):
+        """
+        Streams the body of a GET request to filepath with download_once(), retrying it if it fails.
+
+        Args:
+            url (str): the API endpoint, ex. /repositories/2/resource_descriptions/1.xml
+            filepath (str): where to write the body of the response
+            params (dict, optional): query parameters, booleans are sent the same way requests sends them
+
+        Returns:
+            see download_once()
+        """
+        return await self.retry(self.download_once, url, filepath, params)
+
+    async def download_once(self, url, filepath, params=None):
+        """
+        Streams the body of a GET request to a temporary file, then renames it to filepath once complete.
+
+        Nothing is written for an unsuccessful request, and the temporary file is removed if the download fails. The
+        file is written in the event loop's default executor, so a slow disk does not hold up the other downloads.
+
+        Args:
+            url (str): the API endpoint, ex. /repositories/2/resource_descriptions/1.xml
+            filepath (str): where to write the body of the response
+            params (dict, optional): query parameters, booleans are sent the same way requests sends them
+
+        Returns:
+            status (int): the HTTP status code of the response
+            error (bytes or None): the body of the response if the status code is not 200, otherwise None
+            bytes_written (int): number of bytes written to filepath
+            sha256 (str or None): SHA-256 hex digest of the file written, None if nothing was written
+        """
+        full_url = "/".join([self.baseurl, url.lstrip("/")])
+        if params is not None:
+            params = {key: str(value) for key, value in params.items()}
+        async with self.semaphore:
+            start_time = await self.acquire()
+            failed = True
+            try:
+                async with self.session.get(full_url, params=params) as response:
+                    if response.status != 200:
+                        content = await response.read()
+                        failed = astransport.is_failure(response.status)
+                        return response.status, content, 0, None
+                    loop = asyncio.get_running_loop()
+                    bytes_written = 0
+                    file_hash = hashlib.sha256()
+                    temp_fd, temp_path = await loop.run_in_executor(
+                        None, lambda: tempfile.mkstemp(suffix=".part", prefix=".", dir=os.path.dirname(filepath)))
+
+                    def write_chunk(temp_file, chunk):
+                        temp_file.write(chunk)
+                        file_hash.update(chunk)
+
+                    try:
+                        temp_file = os.fdopen(temp_fd, "wb")
+                        try:
+                            async for chunk in response.content.iter_chunked(asx.chunk_size):
+                                await loop.run_in_executor(None, write_chunk, temp_file, chunk)
+                                bytes_written += len(chunk)
+                        finally:
+                            await loop.run_in_executor(None, temp_file.close)
+                        await loop.run_in_executor(None, os.replace, temp_path, filepath)
+                    except BaseException:
+                        if os.path.exists(temp_path):
+                            os.remove(temp_path)
+                        raise
+                    failed = False
+                    return response.status, None, bytes_written, file_hash.hexdigest()
+            finally:
+                self.release(full_url, start_time, failed)
+
+
+def export_request(export_format, resource_repo, resource_id, defaults):
+    """
+    Builds the API endpoint and parameters ASExport uses to export a resource in the given format.
+
+    Args:
+        export_format (str): one of the keys in export_pool.EXPORT_FORMATS - ead, marcxml, pdf, or labels
+        resource_repo (str): ArchivesSpace's assigned repository identifier found in the resource URI
+        resource_id (str): ArchivesSpace's assigned resource identifier found in the resource URI
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        url (str): the API endpoint for the export
+        params (dict): query parameters for the export
+    """
+    if export_format == "ead":
+        return f'repositories/{resource_repo}/resource_descriptions/{resource_id}.xml', \
+            {'include_unpublished': defaults["ead_export_default"]["_INCLUDE_UNPUB_"],
+             'include_daos': defaults["ead_export_default"]["_INCLUDE_DAOS_"],
+             'numbered_cs': defaults["ead_export_default"]["_NUMBERED_CS_"],
+             'print_pdf': False, 'ead3': defaults["ead_export_default"]["_USE_EAD3_"]}
+    elif export_format == "marcxml":
+        return f'/repositories/{resource_repo}/resources/marc21/{resource_id}.xml', \
+            {'include_unpublished_marc': defaults["marc_export_default"]["_INCLUDE_UNPUB_"]}
+    elif export_format == "pdf":
+        return f'repositories/{resource_repo}/resource_descriptions/{resource_id}.pdf', \
+            {'include_unpublished': defaults["pdf_export_default"]["_INCLUDE_UNPUB_"],
+             'include_daos': defaults["pdf_export_default"]["_INCLUDE_DAOS_"],
+             'numbered_cs': defaults["pdf_export_default"]["_NUMBERED_CS_"],
+             'print_pdf': True, 'ead3': defaults["pdf_export_default"]["_USE_EAD3_"]}
+    else:
+        return f'repositories/{resource_repo}/resource_labels/{resource_id}.tsv', None
+
+
+def export_suffix(export_format):
+    """
+    Gets the file extension ASExport adds to the filepath of an export.
+
+    Args:
+        export_format (str): one of the keys in export_pool.EXPORT_FORMATS - ead, marcxml, pdf, or labels
+
+    Returns:
+        suffix (str): the file extension, with a timestamp before it for MARCXML like ASExport.export_marcxml()
+    """
+    if export_format == "marcxml":
+        return "-" + time.strftime("%Y%m%d%H%M%S") + ".xml"
+    return {"ead": ".xml", "pdf": ".pdf", "labels": ".tsv"}[export_format]
+
+
+async def export_resource(as_client, export_format, resource_id, repo_id, client, defaults, cleanup_options=None,
+                          resource_json=None, archive=None):
+    """
+    Checks whether a resource is published, then downloads and writes it in the given format.
+
+    The resource JSON fetched for the publish check is handed to ASExport.read_results(), so each resource costs one
+    JSON request and one export request, or only the export request if resource_json is given or the lookup cache has
+    the resource's JSON at its current lock_version, see export_pool.get_cached_resource(). EAD cleanup is CPU
+    work, so it runs in a worker thread to keep the event loop free for downloads, or in a cleanup pool process if
+    there is more than one, see export_pool.get_run_cleanup_pool().
+
+    Args:
+        as_client (AsyncASClient instance): the open asynchronous client
+        export_format (str): one of the keys in export_pool.EXPORT_FORMATS - ead, marcxml, pdf, or labels
+        resource_id (int): ArchivesSpace's assigned resource identifier
+        repo_id (int): ArchivesSpace's assigned repository identifier
+        client (ASnake.client object): the ArchivesSpace ASnake client, kept on the ASExport instance
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        cleanup_options (list, optional): cleanup options passed to cleanup_eads() when exporting EADs
+        resource_json (dict, optional): search result from as_export.fetch_published_resources(), if given the
+        resource is known to be published and its JSON is not requested
+        archive (ExportArchive instance, optional): the run's archive for export_format, which raw EAD exports are
+        moved into once cleaned and other exports are added to once downloaded
+
+    Returns:
+        resource_export (ASExport instance or None): the export with its result or error, None if unpublished
+        valid (bool or None): if the EAD was cleaned, True if the XML was valid and False if not, otherwise None
+        results (str or None): cleanup results if the EAD was cleaned, otherwise None
+    """
+    section, output_key = expool.EXPORT_FORMATS[export_format]
+    resource_export = asx.ASExport(resource_id, repo_id, client, defaults[section][output_key], export_all=True)
+    cache = lcache.get_lookup_cache(defaults)
+    uri = f'/repositories/{str(repo_id)}/resources/{str(resource_id)}'
+    if resource_json is None:
+        resource_json = expool.get_cached_resource(cache, lcache.client_url(client), uri)
+        if resource_json is None:
+            start_time = time.perf_counter()
+            status, response = await as_client.get(uri)
+            resource_export.add_timing("search", time.perf_counter() - start_time)
+            if status != 200:
+                resource_export.error = "\nThe following errors were found when exporting {}:\n<Response [{}]>: {}\n" \
+                                        "".format(resource_id, status, response.decode(errors="replace"))
+                resource_export.error += "-" * 135
+                return resource_export, None, None
+            resource_json = json.loads(response)
+            cache.put_resource(lcache.client_url(client), resource_json)
+        if resource_json["publish"] is not True:
+            return None, None, None
+    resource_export.read_results([{"json": json.dumps(resource_json)}])
+    if resource_export.error is not None:
+        return resource_export, None, None
+    url, params = export_request(export_format, resource_export.resource_repo, resource_export.resource_id, defaults)
+    filepath = resource_export.filepath + export_suffix(export_format)
+    start_time = time.perf_counter()
+    status, content, resource_export.bytes_written, resource_export.sha256 = await as_client.download(
+        url, filepath, params=params)
+    resource_export.add_timing("export", time.perf_counter() - start_time)  # includes writing to disk
+    resource_export.status_code = status
+    if status != 200:
+        resource_export.error = "\nThe following errors were found when exporting {}:\n<Response [{}]>: {}\n".format(
+            resource_id, status, content.decode(errors="replace"))
+        resource_export.error += "-" * 135
+        expool.forget_resource(resource_export, defaults)
+        return resource_export, None, None
+    resource_export.bytes_per_sec = resource_export.bytes_written / max(time.perf_counter() - start_time, 1e-6)
+    resource_export.filepath = filepath
+    logger.info(f'Wrote {resource_export.bytes_written} bytes to {resource_export.filepath} at '
+                f'{resource_export.bytes_per_sec:.0f} bytes/sec')
+    if archive is not None and export_format != "ead":  # raw EADs are archived once they are cleaned
+        await asyncio.get_running_loop().run_in_executor(None, archive.add, filepath)
+        resource_export.archive = archive
+    resource_export.result = "Done"
+    cleanup_pool = expool.get_run_cleanup_pool([export_format], defaults)
+    if cleanup_pool is not None:
+        future = expool.submit_cleanup(cleanup_pool, resource_export, defaults, cleanup_options)
+        await asyncio.wrap_future(future)
+        valid, results = await asyncio.get_running_loop().run_in_executor(
+            None, expool.finish_cleanup, cleanup_pool, future, resource_export, defaults, archive)
+        return resource_export, valid, results
+    if export_format == "ead" and defaults["ead_export_default"]["_CLEAN_EADS_"] is True:
+        start_time = time.perf_counter()
+        valid, results = await asyncio.get_running_loop().run_in_executor(
+            None, clean.cleanup_eads, resource_export.filepath, cleanup_options,
+            defaults["ead_export_default"]["_OUTPUT_DIR_"], defaults["ead_export_default"]["_KEEP_RAW_"], archive,
+            clean.get_stream_min_size(defaults))
+        resource_export.add_timing("cleanup", time.perf_counter() - start_time)
+        return resource_export, valid, results
+    return resource_export, None, None
+
+
+async def export_all(export_format, resources, client, defaults, report, cleanup_options=None,
+                     max_concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, max_retries=None, archive=None):
+    """
+    Streams resources through fetch, export and write with a fixed number of asyncio workers.
+
+    Args:
+        export_format (str): one of the keys in export_pool.EXPORT_FORMATS - ead, marcxml, pdf, or labels
+        resources (list): tuples of (resource_id, repo_id, resource_json) to export, see export_resource()
+        client (ASnake.client object): an authorized ASnake client whose session token is reused
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        report (function): called with (resource_id, resource_export, valid, results) as each resource finishes
+        cleanup_options (list, optional): cleanup options passed to cleanup_eads() when exporting EADs
+        max_concurrency (int, optional): number of resources exported at the same time
+        timeout (int, optional): seconds before a single request is cancelled
+        max_retries (int, optional): number of times a failed request is retried, see AsyncASClient
+        archive (ExportArchive instance, optional): the run's archive for export_format, see export_resource()
+
+    Returns:
+        None
+    """
+    resource_queue = asyncio.Queue()
+    for resource in resources:
+        resource_queue.put_nowait(resource)
+
+    async def worker(as_client):
+        while not resource_queue.empty():
+            resource_id, repo_id, resource_json = resource_queue.get_nowait()
+            try:
+                resource_export, valid, results = await export_resource(as_client, export_format, resource_id,
+                                                                        repo_id, client, defaults, cleanup_options,
+                                                                        resource_json, archive)
+            except Exception as e:
+                logger.error(f'Error exporting {resource_id}: {e}')
+                section, output_key = expool.EXPORT_FORMATS[export_format]
+                resource_export = asx.ASExport(resource_id, repo_id, client, defaults[section][output_key],
+                                               export_all=True)
+                resource_export.error = "\nThe following errors were found when exporting {}:\n{}\n".format(
+                    resource_id, repr(e) if isinstance(e, asyncio.TimeoutError) else e)
+                resource_export.error += "-" * 135
+                valid, results = None, None
+            report(resource_id, resource_export, valid, results)
+
+    async with AsyncASClient(client, max_concurrency, timeout, max_retries) as as_client:
+        await asyncio.gather(*[worker(as_client) for _ in range(min(max_concurrency, max(1, len(resources))))])
+
+
+def run_exports(export_format, resources, client, defaults, cleanup_options=None):
+    """
+    Runs export_all() on its own event loop thread and yields each resource as soon as it finishes.
+
+    This yields the same values as export_pool.run_exports() with export_all=True, so the GUI can report either one.
+    Stage timings are written to the logs folder when the run ends, as they are there.
+
+    Args:
+        export_format (str): one of the keys in export_pool.EXPORT_FORMATS - ead, marcxml, pdf, or labels
+        resources (list): tuples of (resource_id, repo_id, resource_json) to export, see export_resource()
+        client (ASnake.client object): an authorized ASnake client whose session token is reused
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        cleanup_options (list, optional): cleanup options passed to cleanup_eads() when exporting EADs
+
+    Yields:
+        resource_id (int): the resource identifier as given in resources
+        resource_export (ASExport instance or None): see export_resource()
+        valid (bool or None): see export_resource()
+        results (str or None): see export_resource()
+    """
+    max_concurrency = defaults["performance_default"]["_ASYNC_CONCURRENCY_"]
+    timeout = defaults["performance_default"]["_REQUEST_TIMEOUT_"]
+    logger.info(f'Exporting {len(resources)} {export_format} resource(s) with asyncio, concurrency {max_concurrency}')
+    finished_exports = queue.Queue()
+    archive = exarchive.open_run_archive(defaults, export_format)
+    lcache.get_lookup_cache(defaults).observe(lcache.client_url(client), [
+        resource_json for _, _, resource_json in resources if resource_json is not None])
+
+    def run_loop():
+        try:
+            asyncio.run(export_all(export_format, resources, client, defaults,
+                                   lambda *finished: finished_exports.put(finished), cleanup_options,
+                                   max_concurrency, timeout, astransport.get_max_retries(defaults), archive))
+        except Exception as e:
+            finished_exports.put(e)
+        finally:
+            if archive is not None:
+                archive.close()
+            finished_exports.put(_RUN_FINISHED)
+
+    timings = extiming.RunTimings(export_format)
+    loop_thread = threading.Thread(target=run_loop, name=f'{export_format}_asyncio')
+    loop_thread.start()
+    try:
+        while True:
+            finished = finished_exports.get()
+            if finished is _RUN_FINISHED:
+                break
+            if isinstance(finished, Exception):
+                logger.error(f'Asyncio export run stopped: {finished}')
+                raise finished
+            resource_id, resource_export, valid, results = finished
+            if resource_export is not None:
+                timings.record(resource_export, export_format, valid)
+            yield finished
+        loop_thread.join()
+    finally:
+        timings.write_reports()
+        cache = lcache.get_lookup_cache(defaults)
+        cache.save()
+        logger.info(f'Lookup cache: {cache.stats()}')
@@ -0,0 +1,443 @@
+import argparse
+import contextlib
+import getpass
+import json
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+
+import as_export as asx
+import as_transport as astransport
+import defaults_setup as dsetup
+import export_manifest as exmanifest
+import export_pool as expool
+import reclean as rclean
+from as_logging import configure_logging, logger
+
+FORMAT_CHOICES = ["ead", "marcxml", "pdf", "labels"]
+"""list: export formats that can be given to --format, the keys in export_pool.EXPORT_FORMATS"""
+EXIT_OK = 0
+"""int: exit code when every export succeeded"""
+EXIT_EXPORT_ERRORS = 1
+"""int: exit code when at least one export, cleanup, upload or index failed"""
+EXIT_SETUP_ERROR = 2
+"""int: exit code when the program could not log in or was given bad arguments"""
+
+
+def parse_args(argv=None):
+    """
+    Reads the command-line arguments.
+
+    Args:
+        argv (list, optional): the arguments to read, sys.argv[1:] if None
+
+    Returns:
+        args (argparse.Namespace): the parsed arguments
+    """
+    parser = argparse.ArgumentParser(prog="as_cli.py",
+                                     description="Export, clean and upload ArchivesSpace resources without the GUI. "
+                                                 "Export and cleanup options are read from defaults.json.")
+    parser.add_argument("identifiers", nargs="*", help="resource identifiers to export, ex. ms1234")
+    parser.add_argument("--ids-file", help="file of resource identifiers, separated by commas or newlines")
+    parser.add_argument("--all", action="store_true", dest="export_all",
+                        help="export all published resources in each repository given by --repo")
+    parser.add_argument("--repo", action="append", type=int, dest="repo_ids", metavar="REPO_ID",
+                        help="ASpace repository id #, can be repeated for --all. Defaults to the repository saved in "
+                             "defaults.json, or searching across repositories if none is saved")
+    parser.add_argument("--format", action="append", choices=FORMAT_CHOICES, dest="formats",
+                        help="export format, can be repeated. Defaults to ead")
+    parser.add_argument("--api", help="ArchivesSpace API URL, defaults to the one saved in defaults.json")
+    parser.add_argument("--username", default=os.environ.get("ASPACE_USERNAME"),
+                        help="ArchivesSpace username, or set ASPACE_USERNAME")
+    parser.add_argument("--password", default=os.environ.get("ASPACE_PASSWORD"),
+                        help="ArchivesSpace password, or set ASPACE_PASSWORD. Prompted for if missing")
+    parser.add_argument("--workers", type=int, help="number of exports to run at the same time, defaults to "
+                                                    "_MAX_WORKERS_ in defaults.json")
+    parser.add_argument("--reclean", nargs="?", const="", metavar="SOURCE_DIR",
+                        help="clean the raw EAD exports in a folder and its archives again with the cleanup options "
+                             "in defaults.json, without exporting. Defaults to _SOURCE_DIR_ in defaults.json")
+    parser.add_argument("--force", action="store_true",
+                        help="with --reclean, also clean exports that are unchanged since they were last re-cleaned")
+    parser.add_argument("--upload", action="store_true", help="upload exported EADs to XTF")
+    parser.add_argument("--index", action="store_true", help="re-index XTF after exporting and uploading")
+    parser.add_argument("--xtf-username", default=os.environ.get("XTF_USERNAME"),
+                        help="XTF username, or set XTF_USERNAME")
+    parser.add_argument("--xtf-password", default=os.environ.get("XTF_PASSWORD"),
+                        help="XTF password, or set XTF_PASSWORD. Prompted for if missing")
+    parser.add_argument("--json", action="store_true", dest="json_output",
+                        help="write one JSON object per line to stdout instead of text")
+    args = parser.parse_args(argv)
+    if args.ids_file is not None and not os.path.isfile(args.ids_file):
+        parser.error(f'--ids-file {args.ids_file} does not exist')
+    if args.reclean is not None and args.reclean and not os.path.isdir(args.reclean):
+        parser.error(f'--reclean {args.reclean} is not a folder')
+    if args.export_all is False and not args.identifiers and args.ids_file is None and args.reclean is None and \
+            (args.upload or args.index) is False:
+        parser.error("give resource identifiers, --ids-file, --all, --reclean, --upload or --index")
+    return args
+
+
+def read_input_ids(identifiers, ids_file=None):
+    """
+    Gathers the resource identifiers given on the command line and in an identifiers file.
+
+    Args:
+        identifiers (list): resource identifiers given as arguments, each may hold several separated by commas
+        ids_file (str, optional): filepath of a file of resource identifiers, separated by commas or newlines
+
+    Returns:
+        input_ids (list): the resource identifiers in the order given, with duplicates and blanks removed
+    """
+    text = ",".join(identifiers)
+    if ids_file is not None:
+        with open(ids_file, "r") as id_file:
+            text += "," + id_file.read()
+    input_ids = [input_id.strip() for line in text.splitlines() for input_id in line.split(",")]
+    return list(dict.fromkeys(input_id for input_id in input_ids if input_id))
+
+
+def emit(record, json_output, stream=None):
+    """
+    Writes one result to stdout, as a JSON line or as text.
+
+    Args:
+        record (dict): the result, with an "event" key
+        json_output (bool): whether to write JSON lines
+        stream (file object, optional): where to write the result, sys.stdout if None
+
+    Returns:
+        None
+    """
+    stream = stream or sys.stdout
+    if json_output is True:
+        print(json.dumps(record), file=stream, flush=True)
+    elif record["event"] == "export":
+        if record["status"] == "ok":
+            print(f'{record["format"]:8} {record["id"]}: {record["file"]}', file=stream, flush=True)
+        else:
+            print(f'{record["format"] or "-":8} {record["id"]}: ERROR\n{record["error"]}', file=stream, flush=True)
+    elif record["event"] == "clean":
+        if record["status"] == "error":
+            print(f'{"clean":8} {record["id"]}: ERROR\n{record["error"]}', file=stream, flush=True)
+        elif record["status"] == "skipped":
+            print(f'{"clean":8} {record["id"]}: unchanged, {record["file"]}', file=stream, flush=True)
+        else:
+            print(f'{"clean":8} {record["id"]}: {record["file"]}', file=stream, flush=True)
+    elif record["event"] == "summary":
+        print(f'Finished {record["exported"]} export(s), {record["failed"]} failed in {record["seconds"]:.1f}s',
+              file=stream, flush=True)
+    else:
+        print(f'{record["event"]}: {record.get("output") or record.get("error")}', file=stream, flush=True)
+
+
+def login(args, defaults):
+    """
+    Logs in to ArchivesSpace with ASnake and mounts the pooled, retrying transport from as_transport.py.
+
+    Args:
+        args (argparse.Namespace): the parsed arguments with the API URL, username and password
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+    """
+    from asnake.client import ASnakeClient
+
+    as_api = args.api or defaults["as_api"]
+    if not as_api or not args.username:
+        raise ValueError("An ArchivesSpace API URL and username are required, see --api and --username")
+    password = args.password if args.password is not None else getpass.getpass("ArchivesSpace password: ")
+    client = ASnakeClient(baseurl=as_api, username=args.username, password=password)
+    client.authorize()
+    astransport.configure_client(client, defaults)
+    logger.info(f'CLI logged in to ArchivesSpace: {as_api}')
+    return client
+
+
+def ead_upload_path(resource_export, valid, defaults):
+    """
+    Gets where an exported EAD ended up, which is what gets uploaded to XTF.
+
+    Args:
+        resource_export (ASExport instance): the finished EAD export
+        valid (bool or None): the result of cleanup_eads(), None if the EAD was not cleaned
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        (str): filepath of the cleaned EAD, or of the raw export if it was not cleaned
+    """
+    if valid is True:  # cleanup_eads() wrote the EAD to the output directory
+        return str(Path(defaults["ead_export_default"]["_OUTPUT_DIR_"], Path(resource_export.filepath).name))
+    return resource_export.filepath
+
+
+def export_record(input_id, export_format, resource_export, valid, results, defaults):
+    """
+    Turns one finished export into a result record for emit().
+
+    Args:
+        input_id (str or int): the resource identifier, or the ASpace resource id # in an export all run
+        export_format (str or None): the export format, None if the resource was not found
+        resource_export (ASExport instance): the export with its result or error
+        valid (bool or None): if the EAD was cleaned, True if the XML was valid and False if not, otherwise None
+        results (str or None): cleanup results if the EAD was cleaned, otherwise None
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        record (dict): the result, with status "ok" or "error"
+    """
+    record = {"event": "export", "id": input_id, "format": export_format, "repo_id": resource_export.repo_id,
+              "resource_id": resource_export.resource_id}
+    if resource_export.error is not None:
+        record.update(status="error", error=resource_export.error.strip("-\n"))
+    elif valid is False:
+        record.update(status="error", error=results.strip("-\n"), file=resource_export.filepath)
+    else:
+        filepath = ead_upload_path(resource_export, valid, defaults) if export_format == "ead" else \
+            resource_export.filepath
+        record.update(status="ok", file=filepath, bytes=resource_export.bytes_written, sha256=resource_export.sha256,
+                      valid=valid)
+    return record
+
+
+def run_identifier_exports(input_ids, repo_id, export_formats, client, defaults, cleanup_options, max_workers=None):
+    """
+    Exports user input identifiers in every format with export_pool.run_multi_exports(), finding each resource once.
+
+    Args:
+        input_ids (list): resource identifiers to export
+        repo_id (int or None): ASpace repository id #, or None to search across repositories
+        export_formats (list): keys in export_pool.EXPORT_FORMATS to export
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        cleanup_options (list): cleanup options passed to cleanup_eads() when exporting EADs
+        max_workers (int, optional): number of exports to run at the same time, read from defaults if None
+
+    Yields:
+        record (dict): a result record for each finished export, see export_record()
+    """
+    resources = [(input_id, repo_id, None) for input_id in input_ids]
+    for input_id, export_format, resource_export, valid, results in expool.run_multi_exports(
+            export_formats, resources, client, defaults, cleanup_options=cleanup_options, max_workers=max_workers):
+        yield export_record(input_id, export_format, resource_export, valid, results, defaults)
+
+
+def run_export_all(repo_ids, export_formats, client, defaults, cleanup_options, max_workers=None):
+    """
+    Exports all published resources in each repository, one format at a time, the same way as the GUI's Export All.
+
+    The asyncio engine in as_async.py is used when _ASYNC_EXPORT_ALL_ is True in defaults.json, and resources unchanged
+    since their last export are skipped when _INCREMENTAL_EXPORT_ALL_ is True.
+
+    Args:
+        repo_ids (list): ASpace repository id #s to export all published resources from
+        export_formats (list): keys in export_pool.EXPORT_FORMATS to export
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        cleanup_options (list): cleanup options passed to cleanup_eads() when exporting EADs
+        max_workers (int, optional): number of exports to run at the same time, read from defaults if None
+
+    Yields:
+        record (dict): a result record for each finished export, see export_record()
+    """
+    all_resources = []
+    for repo_id in repo_ids:
+        all_resources.extend(asx.fetch_published_resources(client, repo_id))
+    logger.info(f'CLI found {len(all_resources)} published resource(s) in repositories {repo_ids}')
+    manifest = None
+    if defaults["performance_default"]["_INCREMENTAL_EXPORT_ALL_"] is True:
+        manifest = exmanifest.ExportManifest()
+    try:
+        for export_format in export_formats:
+            resources = all_resources
+            manifest_key = None
+            if manifest is not None:
+                manifest_key = exmanifest.export_key(export_format, client, defaults, cleanup_options)
+                resources, unchanged_count = manifest.filter_changed(manifest_key, resources, client)
+            resource_jsons = {resource_json["uri"]: resource_json for input_id, repo_id, resource_json in resources}
+            if defaults["performance_default"]["_ASYNC_EXPORT_ALL_"] is True:
+                import as_async as asasync  # aiohttp is only imported when it is used
+                finished_exports = asasync.run_exports(export_format, resources, client, defaults,
+                                                       cleanup_options=cleanup_options)
+            else:
+                finished_exports = expool.run_exports(export_format, resources, client, defaults,
+                                                      cleanup_options=cleanup_options, export_all=True,
+                                                      max_workers=max_workers)
+            for input_id, resource_export, valid, results in finished_exports:
+                if resource_export is None:  # unpublished resource skipped by export all
+                    continue
+                record = export_record(input_id, export_format, resource_export, valid, results, defaults)
+                resource_uri = f'/repositories/{resource_export.resource_repo}/resources/{resource_export.resource_id}'
+                if manifest is not None and record["status"] == "ok" and resource_uri in resource_jsons:
+                    manifest.record(manifest_key, resource_jsons[resource_uri], resource_export, record["file"])
+                yield record
+    finally:
+        if manifest is not None:
+            manifest.save()
+
+
+def run_reclean(source_dir, defaults, cleanup_options, force=False):
+    """
+    Cleans the raw EAD exports already on disk again with reclean.reclean_eads(), the same as the GUI's Re-clean Raw
+    Exports button.
+
+    Args:
+        source_dir (str): the raw EAD exports folder, or an empty string for _SOURCE_DIR_ in defaults.json
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        cleanup_options (list): cleanup options to clean the EADs with
+        force (bool, optional): whether to clean every export, even those that are unchanged
+
+    Yields:
+        record (dict): a "clean" result record for each raw export, with status "ok", "skipped" or "error"
+    """
+    for filename, valid, results in rclean.reclean_eads(defaults, cleanup_options, source_dir or None, force):
+        record = {"event": "clean", "id": filename, "format": "ead"}
+        if valid is False:
+            record.update(status="error", error=results.strip("-\n"))
+        else:
+            record.update(status="skipped" if valid is None else "ok",
+                          file=str(Path(defaults["ead_export_default"]["_OUTPUT_DIR_"], filename)))
+        yield record
+
+
+def run_xtf(xtf_files, args, defaults):
+    """
+    Uploads files to XTF and re-indexes it with xtf_upload.RemoteClient, the same commands the GUI runs.
+
+    Args:
+        xtf_files (list): filepaths to upload, or an empty list to only re-index
+        args (argparse.Namespace): the parsed arguments with the XTF credentials and upload/index flags
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        records (list): an "upload" and/or "index" result record for emit()
+    """
+    import xtf_upload as xup  # paramiko and scp are only imported when XTF is used
+
+    xtf_default = defaults["xtf_default"]
+    xtf_password = args.xtf_password if args.xtf_password is not None else getpass.getpass("XTF password: ")
+    remote = xup.RemoteClient(xtf_default["xtf_host"], args.xtf_username, xtf_password, xtf_default["xtf_remote_path"],
+                              xtf_default["xtf_indexer_path"], xtf_default["xtf_lazyindex_path"])
+    records = []
+    try:
+        connection = remote.connect_remote()
+    except Exception as e:
+        connection = e
+    if remote.scp is None:
+        logger.error(f'CLI XTF login error: {connection}')
+        return [{"event": "upload" if args.upload else "index", "status": "error", "error": str(connection)}]
+    try:
+        if args.upload and xtf_files:
+            output = remote.bulk_upload(xtf_files)
+            if xtf_default["_UPDATE_PERMISSIONS_"] is True:
+                remote.execute_commands([f'/bin/chmod 664 {xtf_default["xtf_remote_path"]}/{Path(file).name}'
+                                         for file in xtf_files])
+            records.append({"event": "upload", "status": "ok", "files": len(xtf_files), "output": output})
+        if args.index or (args.upload and xtf_files and xtf_default["_REINDEX_AUTO_"] is True):
+            commands = [f'{xtf_default["xtf_indexer_path"]} -index default']
+            if xtf_default["_UPDATE_PERMISSIONS_"] is True:
+                if args.upload and xtf_files:
+                    commands.extend(f'/bin/chmod 664 {xtf_default["xtf_lazyindex_path"]}/{Path(file).name}.lazy'
+                                    for file in xtf_files)
+                else:
+                    commands.append(f'/bin/chmod 664 {xtf_default["xtf_lazyindex_path"]}/*')
+            output = remote.execute_commands(commands)
+            records.append({"event": "index", "status": "ok", "output": output.strip()})
+    except Exception as e:
+        logger.error(f'CLI XTF error: {e}')
+        records.append({"event": "upload" if args.upload else "index", "status": "error", "error": str(e)})
+    finally:
+        remote.disconnect()
+    return records
+
+
+def main(argv=None):
+    """
+    Runs a headless batch: exports, cleanup, any re-clean of raw exports, then any XTF upload and index, reporting each
+    result as it finishes.
+
+    With --json, only the result records are written to stdout. Progress messages printed by the export and cleanup
+    code go to stderr instead, so the output can be piped straight into another program.
+
+    Args:
+        argv (list, optional): the arguments to read, sys.argv[1:] if None
+
+    Returns:
+        (int): EXIT_OK, EXIT_EXPORT_ERRORS or EXIT_SETUP_ERROR
+    """
+    args = parse_args(argv)
+    configure_logging()
+    logger.info(f'CLI started: {args.formats}, export all: {args.export_all}')
+    output = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr if args.json_output else output):
+        return run_batch(args, output)
+
+
+def run_batch(args, output):
+    """
+    Exports, cleans, uploads and indexes as the parsed arguments ask, emitting a result record for each step.
+
+    Args:
+        args (argparse.Namespace): the parsed arguments
+        output (file object): where result records are written
+
+    Returns:
+        (int): EXIT_OK, EXIT_EXPORT_ERRORS or EXIT_SETUP_ERROR
+    """
+    start_time = time.perf_counter()
+    defaults = dsetup.set_defaults_file()
+    export_formats = list(dict.fromkeys(args.formats or ["ead"]))
+    cleanup_options = [option for option, bool_val in defaults["ead_cleanup_defaults"].items() if bool_val is True]
+    input_ids = read_input_ids(args.identifiers, args.ids_file)
+    repo_ids = args.repo_ids
+    if not repo_ids and defaults["repo_default"]["_REPO_ID_"] not in ("", None):
+        repo_ids = [int(defaults["repo_default"]["_REPO_ID_"])]
+    if args.export_all is True and not repo_ids:
+        emit({"event": "setup", "status": "error", "error": "--all needs --repo or a default repository"},
+             args.json_output, output)
+        return EXIT_SETUP_ERROR
+    exported, failed, xtf_files = 0, 0, []
+    if input_ids or args.export_all is True:
+        try:
+            client = login(args, defaults)
+        except Exception as e:
+            logger.error(f'CLI login error: {e}')
+            emit({"event": "login", "status": "error", "error": str(e)}, args.json_output, output)
+            return EXIT_SETUP_ERROR
+        if args.export_all is True:
+            records = run_export_all(repo_ids, export_formats, client, defaults, cleanup_options, args.workers)
+        else:
+            records = run_identifier_exports(input_ids, repo_ids[0] if repo_ids else None, export_formats, client,
+                                             defaults, cleanup_options, args.workers)
+        for record in records:
+            if record["status"] == "ok":
+                exported += 1
+                if record["format"] == "ead":
+                    xtf_files.append(record["file"])
+            else:
+                failed += 1
+            emit(record, args.json_output, output)
+    if args.reclean is not None:
+        for record in run_reclean(args.reclean, defaults, cleanup_options, args.force):
+            if record["status"] == "ok":
+                exported += 1
+                xtf_files.append(record["file"])
+            elif record["status"] == "error":
+                failed += 1
+            emit(record, args.json_output, output)
+    if args.upload or args.index:
+        for record in run_xtf(xtf_files, args, defaults):
+            if record["status"] == "error":
+                failed += 1
+            emit(record, args.json_output, output)
+    emit({"event": "summary", "exported": exported, "failed": failed,
+          "seconds": round(time.perf_counter() - start_time, 3)}, args.json_output, output)
+    logger.info(f'CLI finished: {exported} exported, {failed} failed')
+    return EXIT_OK if failed == 0 else EXIT_EXPORT_ERRORS
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # lets the frozen executable start EAD cleanup processes, see cleanup_pool
+    sys.exit(main())
@@ -1,12 +1,153 @@
+import hashlib
 import json
+import os
 import re
+import tempfile
 import time
-
-from as_xtf_GUI import logger
 from pathlib import Path
 
+from as_logging import logger
+
 id_field_regex = re.compile(r"(^id_+\d)")
 id_combined_regex = re.compile(r'[\W_]+', re.UNICODE)
+resource_fields = ["uri", "title", "identifier", "system_mtime", "lock_version"]
+chunk_size = 64 * 1024
+resolve_batch_size = 50
+search_page_size = 25
+non_match_limit = 10
+
+
+def fetch_published_resources(client, repo_id, page_size=100):
+    """
+    Searches a repository for all of its published resources, returning only the fields needed to export them.
+
+    Unpublished resources are filtered out by ArchivesSpace, so they never cost a request of their own and the number
+    of resources returned is the number that will be exported.
+
+    Args:
+        client (ASnake.client object): a client object from ASnake.client to allow to connect to the ASpace API
+        repo_id (int): contains the number for which a repository is assigned via the ArchivesSpace instance
+        page_size (int, optional): number of search results requested at a time
+
+    Returns:
+        published_resources (list): tuples of (resource_id, repo_id, resource_json), where resource_json holds the
+        uri, title, system_mtime and lock_version of the resource and its full identifier under id_0, ready for
+        ASExport.fetch_results()
+    """
+    published_resources = []
+    search_resources = client.get_paged(f'/repositories/{str(repo_id)}/search', page_size=page_size,
+                                        params={"q": "*", "type": ['resource'], "filter_query": ['publish:true'],
+                                                "fields": resource_fields})
+    for result in search_resources:
+        resource_json = {"uri": result["uri"], "title": result.get("title", ""), "id_0": result.get("identifier", ""),
+                         "system_mtime": result.get("system_mtime"), "lock_version": result.get("lock_version")}
+        published_resources.append((int(result["uri"].split("/")[-1]), repo_id, resource_json))
+    logger.info(f'Found {len(published_resources)} published resources in repository {repo_id}')
+    return published_resources
+
+
+def fetch_component_mtimes(client, repo_id, since=None, page_size=100):
+    """
+    Finds the newest system_mtime of the archival objects in each resource of a repository.
+
+    Editing an archival object does not change its resource's system_mtime, but it does change the resource's exports.
+
+    Args:
+        client (ASnake.client object): a client object from ASnake.client to allow to connect to the ASpace API
+        repo_id (int): contains the number for which a repository is assigned via the ArchivesSpace instance
+        since (str, optional): only archival objects with a system_mtime at or after this one are searched, all of
+        them if None
+        page_size (int, optional): number of search results requested at a time
+
+    Returns:
+        component_mtimes (dict): resource URI as key and the newest system_mtime of its archival objects as value
+        newest_mtime (str or None): the newest system_mtime of any archival object found, None if none were found
+    """
+    params = {"q": "*", "type": ['archival_object'], "fields": ["resource", "system_mtime"]}
+    if since is not None:
+        params["filter_query"] = [f'system_mtime:[{since} TO *]']
+    component_mtimes = {}
+    newest_mtime = None
+    for result in client.get_paged(f'/repositories/{str(repo_id)}/search', page_size=page_size, params=params):
+        system_mtime, resource_uri = result.get("system_mtime"), result.get("resource")
+        if system_mtime is None:
+            continue
+        if resource_uri is not None and system_mtime > component_mtimes.get(resource_uri, ""):
+            component_mtimes[resource_uri] = system_mtime
+        if newest_mtime is None or system_mtime > newest_mtime:
+            newest_mtime = system_mtime
+    return component_mtimes, newest_mtime
+
+
+def fetch_newest_component_mtime(client, repo_id):
+    """
+    Finds the system_mtime of the most recently modified archival object in a repository, in a single request.
+
+    Args:
+        client (ASnake.client object): a client object from ASnake.client to allow to connect to the ASpace API
+        repo_id (int): contains the number for which a repository is assigned via the ArchivesSpace instance
+
+    Returns:
+        (str or None): the newest system_mtime, None if the repository has no archival objects
+    """
+    search_results = client.get(f'/repositories/{str(repo_id)}/search',
+                                params={"q": "*", "type": ['archival_object'], "fields": ["system_mtime"],
+                                        "sort": "system_mtime desc", "page": 1, "page_size": 1}).json()
+    results = search_results.get("results", [])
+    return results[0].get("system_mtime") if results else None
+
+
+def resolve_identifiers(client, input_ids, repo_id=None, batch_size=resolve_batch_size, page_size=100):
+    """
+    Finds the resources for many user input identifiers with a few OR'd four_part_id searches.
+
+    Identifiers are matched back to search results the same way ASExport.read_results() does, ignoring all
+    non-alphanumeric characters. Identifiers with no exact match, or with more than one, are left for
+    ASExport.fetch_results() to search for and report on.
+
+    Args:
+        client (ASnake.client object): a client object from ASnake.client to allow to connect to the ASpace API
+        input_ids (list): user input resource identifiers
+        repo_id (int, optional): contains the number for which a repository is assigned via the ArchivesSpace
+        instance, or None to search across repositories
+        batch_size (int, optional): number of identifiers combined into one search request
+        page_size (int, optional): number of search results requested at a time
+
+    Returns:
+        resolved (dict): user input identifier as key and (repo_id, resource_id, title, system_mtime, lock_version) as
+        value
+        not_found (list): user input identifiers with no exact match
+        ambiguous (dict): user input identifier as key and a list of (repo_id, resource_id, title, system_mtime,
+        lock_version) for every exact match as value
+    """
+    matches = {}
+    input_ids = list(dict.fromkeys(input_ids))
+    if repo_id is not None:
+        search_url = '/repositories/{}/search'.format(str(repo_id))
+    else:
+        search_url = '/search'
+    for batch_start in range(0, len(input_ids), batch_size):
+        batch_ids = input_ids[batch_start:batch_start + batch_size]
+        combined_ids = {}
+        for input_id in batch_ids:
+            combined_ids.setdefault(id_combined_regex.sub('', input_id), []).append(input_id)
+        quoted_ids = ['"{}"'.format(input_id.replace('\\', '\\\\').replace('"', '\\"')) for input_id in batch_ids]
+        search_resources = client.get_paged(search_url, page_size=page_size,
+                                            params={"q": "four_part_id:({})".format(" OR ".join(quoted_ids)),
+                                                    "type": ['resource'], "fields": resource_fields})
+        for result in search_resources:
+            combined_aspace_id = id_combined_regex.sub('', result.get("identifier", ""))
+            uri_components = result["uri"].split("/")
+            for input_id in combined_ids.get(combined_aspace_id, []):
+                matches.setdefault(input_id, {})[result["uri"]] = (uri_components[2], uri_components[-1],
+                                                                   result.get("title", ""), result.get("system_mtime"),
+                                                                   result.get("lock_version"))
+    resolved = {input_id: list(found.values())[0] for input_id, found in matches.items() if len(found) == 1}
+    ambiguous = {input_id: list(found.values()) for input_id, found in matches.items() if len(found) > 1}
+    not_found = [input_id for input_id in input_ids if input_id not in matches]
+    logger.info(f'Resolved {len(resolved)} of {len(input_ids)} identifiers in '
+                f'{-(-len(input_ids) // batch_size)} batch(es): {len(not_found)} not found, {len(ambiguous)} ambiguous')
+    return resolved, not_found, ambiguous
 
 
 @logger.catch
@@ -14,7 +155,7 @@ class ASExport:
     """
     Interacts with the ASpace API to search for and retrieve records.
     """
-    def __init__(self, input_id, repo_id, client, output_dir, export_all=False):
+    def __init__(self, input_id, repo_id, client, output_dir, export_all=False, stream=True):
         """
         Must contain resource identifier, repository identifier, ASnake client, and output directory.
 
@@ -23,6 +164,9 @@ class ASExport:
             repo_id (int): contains the number for which a repository is assigned via the ArchivesSpace instance
             client (ASnake.client object): a client object from ASnake.client to allow to connect to the ASpace API
             output_dir (str): filepath containing the folder a user wants files to be exported to
+            export_all (bool, optional): whether exporting all records for a repository
+            stream (bool, optional): whether to write exports to disk in chunks as they download instead of holding
+            the whole record in memory
         """
         self.input_id = input_id  #:
         """str: user generated resource identifier"""
@@ -47,36 +191,95 @@ class ASExport:
         self.result = None
         """str: value is none unless an operation completes or multiple results are returned and is then populated 
         with a string detailing the result(s)"""
+        self.search_result = None
+        """str: value is None unless fetch_results() returns multiple results and is then populated with a string
+        listing the other results"""
         self.filepath = str(Path(output_dir, str(self.filename)))
         """str: filepath where records will be exported to"""
         self.output_directory = output_dir
         """str: location of the output directory for the file"""
         self.export_all = export_all
         """bool: whether exporting all records for a repository"""
+        self.stream = stream
+        """bool: whether exports are written to disk in chunks as they download"""
+        self.bytes_written = 0
+        """int: size of the exported file in bytes, 0 until an export completes"""
+        self.bytes_per_sec = None
+        """float: download and write speed of the last export in bytes per second, None until an export completes"""
+        self.sha256 = None
+        """str: SHA-256 hex digest of the exported file, None until an export completes"""
+        self.timings = {}
+        """dict: seconds spent in each stage of the export, with a stage name from export_timing.TIMING_STAGES as key"""
+        self.status_code = None
+        """int: HTTP status code of the export request, None until one is made"""
+        self.archive = None
+        """ExportArchive instance: the run's archive the export is added to instead of the output directory, None to
+        keep it as a plain file, see export_archive.open_run_archive()"""
+
+    def add_timing(self, stage, seconds):
+        """
+        Adds time spent in a stage of the export to self.timings.
+
+        Args:
+            stage (str): one of export_timing.TIMING_STAGES - search, export, write, or cleanup
+            seconds (float): seconds spent in the stage
+
+        Returns:
+            None
+        """
+        self.timings[stage] = self.timings.get(stage, 0) + seconds
 
-    def fetch_results(self):
+    def fetch_results(self, resource_json=None):
         """
         Searches ArchivesSpace for a resource that matches the self.input_id.
 
         For an in-depth review on how this code is structured, see the wiki:
         https://github.com/uga-libraries/ASpace_Batch_Export-Cleanup-Upload/wiki/Code-Structure#fetch_results
 
+        Args:
+            resource_json (dict, optional): the resource's JSON or search result when it was already fetched, either
+            for an export all run or by resolve_identifiers(), so it is not requested from ArchivesSpace again
+
         Returns:
             None
         """
+        start_time = time.perf_counter()
         if self.export_all is False:
             combined_user_id = id_combined_regex.sub('', self.input_id)  # remove all non-alphanumeric characters
-            if self.repo_id is not None:
-                search_resources = self.client.get_paged('/repositories/{}/search'.format(str(self.repo_id)),
-                                                         params={"q": 'four_part_id:' + self.input_id,
-                                                                 "type": ['resource']})
+            if resource_json is not None:
+                search_results = [{"json": json.dumps(resource_json)}]
             else:
-                search_resources = self.client.get_paged('/search', params={"q": 'four_part_id:' + self.input_id,
-                                                                            "type": ['resource']})
-            search_results = [result for result in search_resources]
+                if self.repo_id is not None:
+                    search_url = '/repositories/{}/search'.format(str(self.repo_id))
+                else:
+                    search_url = '/search'
+                search_resources = self.client.get_paged(search_url, page_size=search_page_size,
+                                                         params={"q": 'four_part_id:' + self.input_id,
+                                                                 "type": ['resource'], "fields": resource_fields})
+                self.match_results(search_resources, combined_user_id)
+                self.add_timing("search", time.perf_counter() - start_time)
+                return
         else:
-            search_results = [{"json": json.dumps(self.client.get(f'/repositories/{str(self.repo_id)}/resources/{str(self.input_id)}').json())}]
+            if resource_json is None:
+                resource_json = self.client.get(f'/repositories/{str(self.repo_id)}/resources/{str(self.input_id)}').json()
+            search_results = [{"json": json.dumps(resource_json)}]
             combined_user_id = ""
+        self.read_results(search_results, combined_user_id)
+        self.add_timing("search", time.perf_counter() - start_time)
+
+    def read_results(self, search_results, combined_user_id=""):
+        """
+        Compares search results to the user input identifier and sets the resource URI from the matching result.
+
+        Args:
+            search_results (list): search results from ArchivesSpace, each a dict with the resource's JSON as a string
+            in its "json" key
+            combined_user_id (str): user input identifier with all non-alphanumeric characters removed, ignored when
+            exporting all records for a repository
+
+        Returns:
+            None
+        """
         if not search_results:
             self.error = "No results were found. Have you entered the correct repository and/or resource ID?\n" \
                          "Results: " + str(search_results) + \
@@ -125,6 +328,117 @@ class ASExport:
                 for ident, title in non_match_results.items():
                     self.result += "Resource ID: {:15} {}{:<5} Title: {} \n\n".format(ident, "|", "", title)
                 self.result += "-" * 135
+                self.search_result = self.result
+
+    def match_results(self, search_resources, combined_user_id):
+        """
+        Compares search results to the user input identifier as they are paged in, stopping once a match is found.
+
+        Only the uri, title and identifier fields of each result are read. After an exact match, paging stops as soon
+        as non_match_limit other results have been collected for the message listing them, so a broad identifier does
+        not page through every result. Without a match, every page is read in case the match is on a later one.
+
+        Args:
+            search_resources (iterable): search results from client.get_paged(), requested with resource_fields
+            combined_user_id (str): user input identifier with all non-alphanumeric characters removed
+
+        Returns:
+            None
+        """
+        result_count = 0
+        aspace_id = None
+        non_match_count = 0
+        non_match_results = {}
+        paging_stopped = False
+        for result in search_resources:
+            result_count += 1
+            identifier = result.get("identifier", "")
+            if id_combined_regex.sub('', identifier) == combined_user_id:
+                if aspace_id is None:  # the first match is returned, like a single search result
+                    aspace_id = identifier
+                    resource_full_uri = result["uri"].split("/")
+                    self.resource_id = resource_full_uri[-1]
+                    self.resource_repo = resource_full_uri[2]
+            elif identifier not in non_match_results:
+                non_match_count += 1
+                if len(non_match_results) < non_match_limit:
+                    non_match_results[identifier] = result.get("title", "")
+            if aspace_id is not None and len(non_match_results) >= non_match_limit:
+                paging_stopped = True
+                break  # get_paged() only requests the next page when it is iterated over
+        more_count = non_match_count - len(non_match_results)
+        if result_count == 0:
+            self.error = "No results were found. Have you entered the correct repository and/or resource ID?\n" \
+                         "Results: []" + \
+                         "\nUser Input: {}\n".format(self.input_id) + "-" * 135
+        elif aspace_id is None:
+            self.error = "{} results were found, but the resource identifier did not match. " \
+                         "Have you entered the resource id correctly?".format(result_count) + \
+                         "\nUser Input: {}".format(self.input_id) + \
+                         "\nResults: "
+            for ident, title in non_match_results.items():
+                self.error += "\n     Resource ID: {:15} {:>1}{:<5} Title: {} \n".format(ident, "|", "", title)
+            if more_count > 0:
+                self.error += "\n     ...and {} more\n".format(more_count)
+            self.error += "-" * 135
+        elif non_match_results:
+            self.result = "Returning {}...\nOther results:\n\n".format(aspace_id)
+            for ident, title in non_match_results.items():
+                self.result += "Resource ID: {:15} {}{:<5} Title: {} \n\n".format(ident, "|", "", title)
+            if paging_stopped is True:
+                self.result += "...other results not listed\n\n"
+            elif more_count > 0:
+                self.result += "...and {} more\n\n".format(more_count)
+            self.result += "-" * 135
+            self.search_result = self.result
+
+    def write_response(self, response):
+        """
+        Writes the body of an export request to self.filepath, replacing any file already there only once complete.
+
+        The body is written in chunks to a temporary file in the output directory, which is renamed to self.filepath
+        when the download finishes, or added to self.archive and removed if it is set. If the download fails, the
+        temporary file is removed, so a partly written export is never left behind. With self.stream, memory use stays the same no matter how large the record is. Time spent
+        writing to disk is added to the write stage of self.timings and time spent downloading to the export stage.
+
+        Args:
+            response (requests.Response): a successful export request, made with stream=True if self.stream is True
+
+        Returns:
+            None
+        """
+        start_time = time.perf_counter()
+        write_seconds = 0
+        self.bytes_written = 0
+        file_hash = hashlib.sha256()
+        temp_fd, temp_path = tempfile.mkstemp(suffix=".part", prefix=".", dir=self.output_directory)
+        try:
+            with os.fdopen(temp_fd, "wb") as temp_file:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    write_start = time.perf_counter()
+                    temp_file.write(chunk)
+                    file_hash.update(chunk)
+                    write_seconds += time.perf_counter() - write_start
+                    self.bytes_written += len(chunk)
+            write_start = time.perf_counter()
+            if self.archive is not None:
+                self.archive.add(temp_path, arcname=Path(self.filepath).name)
+            else:
+                os.replace(temp_path, self.filepath)
+            write_seconds += time.perf_counter() - write_start
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        finally:
+            response.close()
+        elapsed = time.perf_counter() - start_time
+        self.add_timing("write", write_seconds)
+        self.add_timing("export", elapsed - write_seconds)
+        self.bytes_per_sec = self.bytes_written / max(elapsed, 1e-6)
+        self.sha256 = file_hash.hexdigest()
+        written_to = self.filepath if self.archive is None else f'{self.filepath} in {self.archive.archive_path}'
+        logger.info(f'Wrote {self.bytes_written} bytes to {written_to} at {self.bytes_per_sec:.0f} bytes/sec')
 
     # make a request to the API for an ASpace ead
     def export_ead(self, include_unpublished=False, include_daos=True, numbered_cs=True, ead3=False):
@@ -148,18 +462,19 @@ class ASExport:
             error
         """
         try:
+            start_time = time.perf_counter()
             request_ead = self.client.get('repositories/{}/resource_descriptions/{}.xml'.format(self.resource_repo,
                                                                                                 self.resource_id),
                                           params={'include_unpublished': include_unpublished,
                                                   'include_daos': include_daos, 'numbered_cs': numbered_cs,
-                                                  'print_pdf': False, 'ead3': ead3})
+                                                  'print_pdf': False, 'ead3': ead3}, stream=self.stream)
+            self.add_timing("export", time.perf_counter() - start_time)
+            self.status_code = request_ead.status_code
             if request_ead.status_code == 200:
                 self.filepath += ".xml"
-                with open(self.filepath, "wb") as local_file:
-                    local_file.write(request_ead.content)
-                    local_file.close()
-                    self.result = "Done"
-                    return self.filepath, self.result
+                self.write_response(request_ead)
+                self.result = "Done"
+                return self.filepath, self.result
             else:
                 self.error = "\nThe following errors were found when exporting {}:\n{}: {}\n".format(self.input_id,
                                                                                                      request_ead,
@@ -190,17 +505,19 @@ class ASExport:
             error
         """
         try:
+            start_time = time.perf_counter()
             request_marcxml = self.client.get('/repositories/{}/resources/marc21/{}.xml'.format(self.resource_repo,
                                                                                                 self.resource_id),
-                                              params={'include_unpublished_marc': include_unpublished})
+                                              params={'include_unpublished_marc': include_unpublished},
+                                              stream=self.stream)
+            self.add_timing("export", time.perf_counter() - start_time)
+            self.status_code = request_marcxml.status_code
             if request_marcxml.status_code == 200:
                 #self.filepath += ".xml"
                 self.filepath += ("-" + time.strftime("%Y%m%d%H%M%S")+ ".xml")
-                with open(self.filepath, "wb") as local_file:
-                    local_file.write(request_marcxml.content)
-                    local_file.close()
-                    self.result = "Done"
-                    return self.filepath, self.result
+                self.write_response(request_marcxml)
+                self.result = "Done"
+                return self.filepath, self.result
             else:
                 self.error = "\nThe following errors were found when exporting {}:\n{}: {}\n".format(self.input_id,
                                                                                                      request_marcxml,
@@ -233,18 +550,19 @@ class ASExport:
             error
         """
         try:
+            start_time = time.perf_counter()
             request_pdf = self.client.get('repositories/{}/resource_descriptions/{}.pdf'.format(self.resource_repo,
                                                                                                 self.resource_id),
                                           params={'include_unpublished': include_unpublished,
                                                   'include_daos': include_daos, 'numbered_cs': numbered_cs,
-                                                  'print_pdf': True, 'ead3': ead3})
+                                                  'print_pdf': True, 'ead3': ead3}, stream=self.stream)
+            self.add_timing("export", time.perf_counter() - start_time)
+            self.status_code = request_pdf.status_code
             if request_pdf.status_code == 200:
                 self.filepath += ".pdf"
-                with open(self.filepath, "wb") as local_file:
-                    local_file.write(request_pdf.content)
-                    local_file.close()
-                    self.result = "Done"
-                    return self.filepath, self.result
+                self.write_response(request_pdf)
+                self.result = "Done"
+                return self.filepath, self.result
             else:
                 self.error = "\nThe following errors were found when exporting {}:\n{}: {}\n".format(self.input_id,
                                                                                                      request_pdf,
@@ -271,15 +589,17 @@ class ASExport:
             error
         """
         try:
+            start_time = time.perf_counter()
             request_labels = self.client.get('repositories/{}/resource_labels/{}.tsv'.format(self.resource_repo,
-                                                                                             self.resource_id))
+                                                                                             self.resource_id),
+                                             stream=self.stream)
+            self.add_timing("export", time.perf_counter() - start_time)
+            self.status_code = request_labels.status_code
             if request_labels.status_code == 200:
                 self.filepath += ".tsv"
-                with open(self.filepath, "wb") as local_file:
-                    local_file.write(request_labels.content)
-                    local_file.close()
-                    self.result = "Done"
-                    return self.filepath, self.result
+                self.write_response(request_labels)
+                self.result = "Done"
+                return self.filepath, self.result
             else:
                 self.error = "\nThe following errors were found when exporting {}:\n{}: {}\n".format(self.input_id,
                                                                                                      request_labels,
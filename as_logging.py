@@ -0,0 +1,27 @@
+from pathlib import Path
+
+from loguru import logger
+
+LOG_DIR = "logs"
+"""str: folder log files are written to, kept next to defaults.json"""
+LOG_FILE = "log_{time:YYYY-MM-DD}.log"
+"""str: name of each day's log file, formatted by loguru"""
+LOG_FORMAT = "{time}-{level}: {message}"
+"""str: format of each line in the log file"""
+
+
+def configure_logging(log_dir=LOG_DIR):
+    """
+    Sends log messages to the day's log file instead of stderr.
+
+    The library modules import logger from here without configuring it, so importing them never pulls in the GUI.
+    as_xtf_GUI.py and as_cli.py call this once when they start.
+
+    Args:
+        log_dir (str, optional): folder to write log files to
+
+    Returns:
+        None
+    """
+    logger.remove()
+    logger.add(str(Path(log_dir, LOG_FILE)), format=LOG_FORMAT)
@@ -0,0 +1,330 @@
+import asyncio
+import re
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
+from urllib3.util.retry import Retry
+
+from as_logging import logger
+
+RETRY_STATUSES = (429, 502, 503, 504)
+"""tuple: HTTP status codes from ArchivesSpace or its proxy that are worth retrying"""
+DEFAULT_MAX_RETRIES = 3
+"""int: number of times a GET is retried if _MAX_RETRIES_ is missing from defaults.json"""
+DEFAULT_BACKOFF = 0.5
+"""float: seconds before the first retry, doubling with each retry after it"""
+LATENCY_FACTOR = 3
+"""int: a request taking this many times longer than the running average for its route counts as the backend slowing
+down"""
+route_regex = re.compile(r"\d+")
+
+
+class AdaptiveLimiter:
+    """
+    Limits how many requests are sent to ArchivesSpace at the same time, adapting the limit to how the backend copes.
+
+    The limit grows by about one request for each full round of successful requests and is halved when a request fails
+    or takes much longer than average (additive increase, multiplicative decrease). Averages are kept per route, ex.
+    /repositories/#/resource_descriptions/#.pdf, since a PDF takes far longer than a search even on a healthy backend.
+    Each attempt at a request counts on its own, and holds its place from when it is sent until its body has been
+    read. The same limiter is shared by the worker threads, through LimitedAdapter, and by as_async.AsyncASClient.
+    """
+    def __init__(self, max_limit, min_limit=1):
+        """
+        Must contain the highest number of requests allowed at the same time.
+
+        Args:
+            max_limit (int): highest number of requests allowed at the same time, the limit starts here
+            min_limit (int, optional): lowest number of requests allowed at the same time
+        """
+        self.max_limit = max(min_limit, max_limit)
+        """int: highest number of requests allowed at the same time"""
+        self.min_limit = min_limit
+        """int: lowest number of requests allowed at the same time"""
+        self.limit = float(self.max_limit)
+        """float: number of requests currently allowed at the same time"""
+        self.in_flight = 0
+        """int: number of requests waiting on ArchivesSpace"""
+        self.average_latency = {}
+        """dict: route as key and running average of how many seconds a successful request to it takes as value"""
+        self.last_backoff = 0.0
+        """float: time.perf_counter() of the last time the limit was halved"""
+        self.condition = threading.Condition()
+        """threading.Condition object: wakes waiting requests when the limit allows them through"""
+        self.async_waiters = []
+        """list: (event loop, asyncio.Future) of each asyncio request waiting for the limit to allow it through"""
+
+    def acquire(self):
+        """
+        Waits until another request is allowed, then counts it as in flight.
+
+        Returns:
+            None
+        """
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        """
+        Waits in an event loop until another request is allowed, then counts it as in flight.
+
+        Returns:
+            None
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.condition:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self.async_waiters.append((loop, waiter))
+            await waiter
+
+    def release(self, route, latency, failed=False):
+        """
+        Counts a request as finished and adjusts the limit from how it went.
+
+        Args:
+            route (str): the URL path of the request with all numbers replaced by #
+            latency (float): seconds the request took
+            failed (bool, optional): whether the request errored or ArchivesSpace returned a server error
+
+        Returns:
+            None
+        """
+        with self.condition:
+            self.in_flight -= 1
+            average_latency = self.average_latency.get(route)
+            slow = average_latency is not None and latency > average_latency * LATENCY_FACTOR
+            started_before_backoff = time.perf_counter() - latency < self.last_backoff
+            if (failed or slow) and started_before_backoff:
+                pass  # already backed off while this request was in flight, so it does not count twice
+            elif failed or slow:
+                self.last_backoff = time.perf_counter()
+                new_limit = max(self.min_limit, self.limit / 2)
+                if int(new_limit) < int(self.limit):
+                    logger.info(f'Backing off ArchivesSpace requests to {int(new_limit)} at a time '
+                                f'({"error" if failed else f"{latency:.1f}s response"})')
+                self.limit = new_limit
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            if not failed:
+                if average_latency is None:
+                    self.average_latency[route] = latency
+                else:
+                    self.average_latency[route] = 0.8 * average_latency + 0.2 * latency
+            self.condition.notify_all()
+            async_waiters, self.async_waiters = self.async_waiters, []
+        for loop, waiter in async_waiters:
+            loop.call_soon_threadsafe(wake_waiter, waiter)
+
+
+def wake_waiter(waiter):
+    """
+    Wakes an asyncio request waiting in AdaptiveLimiter.acquire_async(), unless it was cancelled.
+
+    Args:
+        waiter (asyncio.Future): the future the request is waiting on
+
+    Returns:
+        None
+    """
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def get_route(url):
+    """
+    Gets the route an AdaptiveLimiter averages a request's latency by.
+
+    Args:
+        url (str): the full URL of the request
+
+    Returns:
+        (str): the URL path with all numbers replaced by #, ex. /repositories/#/resources/#
+    """
+    return route_regex.sub("#", urlsplit(url).path)
+
+
+def is_failure(status_code):
+    """
+    Checks whether a response shows ArchivesSpace or its proxy is struggling, which an AdaptiveLimiter backs off for.
+
+    Args:
+        status_code (int): the HTTP status code of the response
+
+    Returns:
+        (bool): True for a server error or 429 Too Many Requests
+    """
+    return status_code >= 500 or status_code == 429
+
+
+def get_backoff(attempt, retry_after=None):
+    """
+    Gets how long to wait before retrying a request.
+
+    Args:
+        attempt (int): number of the attempt that failed, starting at 0
+        retry_after (str, optional): the Retry-After header of the response, used if it is a number of seconds
+
+    Returns:
+        (float): seconds to wait, DEFAULT_BACKOFF doubled for each attempt before this one
+    """
+    if retry_after is not None and retry_after.strip().isdigit():
+        return float(retry_after)
+    return DEFAULT_BACKOFF * 2 ** attempt
+
+
+class LimitedAdapter(HTTPAdapter):
+    """
+    A requests transport adapter that sends every request through an AdaptiveLimiter.
+
+    With a limiter, GETs are retried here rather than by urllib3, so each attempt goes through the limiter on its own
+    and the backoff between attempts does not hold a place or count as a slow request.
+    """
+    def __init__(self, limiter=None, retries=0, **kwargs):
+        """
+        Takes the same keyword arguments as requests.adapters.HTTPAdapter.
+
+        Args:
+            limiter (AdaptiveLimiter instance, optional): the limiter to go through, or None to send requests freely
+            retries (int, optional): number of times a GET is retried with a limiter, see send()
+        """
+        self.limiter = limiter
+        """AdaptiveLimiter instance: the limiter requests go through, or None"""
+        self.retries = retries
+        """int: number of times a GET is retried after a connection error, timeout or one of RETRY_STATUSES"""
+        self.pool_size = kwargs.get("pool_maxsize", DEFAULT_POOLSIZE)
+        """int: number of connections kept open to ArchivesSpace, also used by as_async.AsyncASClient"""
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.limiter is None:
+            return super().send(request, **kwargs)
+        route = get_route(request.url)
+        retries = self.retries if request.method == "GET" else 0
+        for attempt in range(retries + 1):
+            self.limiter.acquire()
+            start_time = time.perf_counter()
+            try:
+                response = super().send(request, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.limiter.release(route, time.perf_counter() - start_time, failed=True)
+                if attempt == retries:
+                    raise
+                logger.info(f'Retrying {request.url} after error: {e!r}')
+                time.sleep(get_backoff(attempt))
+                continue
+            except BaseException:
+                self.limiter.release(route, time.perf_counter() - start_time, failed=True)
+                raise
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                self.release_when_read(response, route, start_time)
+                return response
+            response.close()
+            self.limiter.release(route, time.perf_counter() - start_time, failed=True)
+            logger.info(f'Retrying {request.url} after response {response.status_code}')
+            time.sleep(get_backoff(attempt, response.headers.get("Retry-After")))
+
+    def release_when_read(self, response, route, start_time):
+        """
+        Keeps a response's place in the limiter until its body has been read or it is closed, which is when urllib3
+        releases its connection, so a streamed export holds its place while it downloads.
+
+        Args:
+            response (requests.Response): the response, whose body has not been read yet
+            route (str): the route of the request, see get_route()
+            start_time (float): time.perf_counter() when the request was sent
+
+        Returns:
+            None
+        """
+        limiter = self.limiter
+        failed = is_failure(response.status_code)
+        release_conn = response.raw.release_conn
+        released = threading.Lock()
+
+        def release():
+            if released.acquire(blocking=False):
+                limiter.release(route, time.perf_counter() - start_time, failed)
+
+        def release_and_count():
+            release_conn()
+            release()
+
+        response.raw.release_conn = release_and_count
+        weakref.finalize(response, release)  # a response dropped without being read or closed
+
+
+def get_max_retries(defaults):
+    """
+    Gets the number of times a GET is retried that a user set in defaults.json, falling back on DEFAULT_MAX_RETRIES.
+
+    Args:
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        max_retries (int): number of retries, never less than 0
+    """
+    try:
+        max_retries = int(defaults["performance_default"]["_MAX_RETRIES_"])
+    except (KeyError, TypeError, ValueError):
+        max_retries = DEFAULT_MAX_RETRIES
+    return max(0, max_retries)
+
+
+def configure_client(client, defaults):
+    """
+    Mounts a pooled, retrying and rate limited transport on an ASnake client's session.
+
+    The connection pool is sized to the number of export workers so connections are kept alive and reused instead of
+    being opened for every request. Only GETs are retried, with exponential backoff, because they are safe to repeat.
+    as_async.AsyncASClient reads the limiter and pool size back from the mounted LimitedAdapter, see get_limiter().
+
+    Args:
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        limiter (AdaptiveLimiter instance or None): the limiter mounted on the client, None if _ADAPTIVE_LIMIT_ is off
+    """
+    pool_size = max(int(defaults["performance_default"]["_MAX_WORKERS_"]),
+                    int(defaults["performance_default"]["_ASYNC_CONCURRENCY_"]))
+    retries = Retry(total=get_max_retries(defaults), backoff_factor=DEFAULT_BACKOFF, status_forcelist=RETRY_STATUSES,
+                    allowed_methods=frozenset(["GET"]), raise_on_status=False, respect_retry_after_header=True)
+    limiter = None
+    if defaults["performance_default"]["_ADAPTIVE_LIMIT_"] is True:
+        limiter = AdaptiveLimiter(pool_size)
+        adapter = LimitedAdapter(limiter=limiter, retries=retries.total, pool_connections=pool_size,
+                                 pool_maxsize=pool_size)
+    else:
+        adapter = LimitedAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    client.session.mount("http://", adapter)
+    client.session.mount("https://", adapter)
+    logger.info(f'ASnake client transport: pool size {pool_size}, {retries.total} retries, adaptive limit '
+                f'{limiter is not None}')
+    return limiter
+
+
+def get_limiter(client):
+    """
+    Gets the limiter and connection pool size configure_client() mounted on an ASnake client.
+
+    Args:
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+
+    Returns:
+        limiter (AdaptiveLimiter instance or None): the client's limiter, None if it has none
+        pool_size (int or None): number of connections the client keeps open, None if configure_client() was not run
+    """
+    adapter = client.session.get_adapter(client.config["baseurl"])
+    if not isinstance(adapter, LimitedAdapter):
+        return None, None
+    return adapter.limiter, adapter.pool_size
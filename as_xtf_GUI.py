@@ -4,19 +4,27 @@ import subprocess
 import sys
 import webbrowser
 import json
+import multiprocessing
 import re
 import time
-from loguru import logger
 from pathlib import Path
 
 import PySimpleGUI as sg
 from asnake.client import ASnakeClient
 from asnake.client.web_client import ASnakeAuthError
 
-import as_export as asx
-import cleanup as clean
 import xtf_upload as xup
 import defaults_setup as dsetup
+import as_export as asx
+import as_transport as astransport
+import export_journal as exjournal
+import export_manifest as exmanifest
+import export_pool as expool
+import export_progress as exprogress
+import id_index as idx
+import reclean as rclean
+import repo_cache as rcache
+from as_logging import configure_logging, logger
 
 import requests
 import threading
@@ -27,14 +35,17 @@ EXPORT_PROGRESS_THREAD = '-EXPORT_PROGRESS-'
 MARCXML_EXPORT_THREAD = '-MARCXML_THREAD-'
 PDF_EXPORT_THREAD = '-PDF_THREAD-'
 CONTLABEL_EXPORT_THREAD = '-CONTLABEL_THREAD-'
+MULTI_EXPORT_THREAD = '-MULTI_THREAD-'
 XTF_UPLOAD_THREAD = '-XTFUP_THREAD-'
 XTF_INDEX_THREAD = '-XTFIND_THREAD-'
 XTF_DELETE_THREAD = '-XTFDEL_THREAD-'
 XTF_GETFILES_THREAD = '-XTFGET_THREAD-'
-
-logger.remove()
-logger.add(str(Path('logs', 'log_{time:YYYY-MM-DD}.log')),
-           format="{time}-{level}: {message}")
+REPOS_REFRESH_THREAD = '-REPOS_REFRESH-'
+MULTI_EXPORT_FORMATS = {"ead": ("_MULTI_EAD_", "EAD"),
+                        "marcxml": ("_MULTI_MARCXML_", "MARCXML"),
+                        "labels": ("_MULTI_LABELS_", "Container Label"),
+                        "pdf": ("_MULTI_PDF_", "PDF")}
+PRINT_EACH_LIMIT = 50  # batches with more exports than this only print errors, each result is still logged
 
 
 @logger.catch
@@ -54,12 +65,13 @@ def run_gui(defaults):
     gc.disable()
     sg.theme('LightBlue2')
     logger.info("ArchivesSpace Login popup initiated")
-    as_username, as_password, as_api, close_program_as, client, asp_version, repositories, resources, xtf_version = \
-        get_aspace_log(defaults, xtf_checkbox=True)
+    as_username, as_password, as_api, close_program_as, client, asp_version, repositories, xtf_version, \
+        repos_fetched = get_aspace_log(defaults, xtf_checkbox=True)
     logger.info(f'ArchivesSpace version: {asp_version}')
     if close_program_as is True:
         logger.info("User initiated closing program")
         sys.exit()
+    start_index_refresh(client, repositories)
     pdf_broken = ["v2.6.0", "v2.7.0", "v2.7.1"]
     if asp_version in pdf_broken:
         asp_pdf_api = True
@@ -109,6 +121,9 @@ def run_gui(defaults):
                   '---',
                   'Change PDF Export Options',
                   '---',
+                  'Change Performance Options',
+                  'Rebuild Identifier Index',
+                  '---',
                   xtf_login_menu_button,
                   xtf_opt_button,
                   ]
@@ -132,7 +147,9 @@ def run_gui(defaults):
                   [sg.Button(button_text=" Open Cleaned EAD Exports ", key="_OPEN_CLEAN_B_",
                              tooltip=' Open folder where cleaned EAD.xml files are stored '),
                    sg.Button(button_text=" Open Raw ASpace Exports ", key="_OPEN_RAW_EXPORTS_",
-                             tooltip=' Open folder where raw ASpace EAD.xml files are stored ')]
+                             tooltip=' Open folder where raw ASpace EAD.xml files are stored '),
+                   sg.Button(button_text=" Re-clean Raw Exports ", key="_RECLEAN_EADS_",
+                             tooltip=' Clean the raw ASpace EAD.xml files again with the current cleanup options ')]
                   ]
     xtf_layout = [[sg.Button(button_text=" Upload Files ", key="_UPLOAD_",
                              tooltip=' Upload select files to XTF ', disabled=False),
@@ -188,6 +205,16 @@ def run_gui(defaults):
                    sg.Button(button_text=" Open Output ", key="_OPEN_PDF_DEST_",
                              tooltip=' Open folder where PDF(s) are stored ')]
                   ]
+    multi_layout = [[sg.Button(button_text=" EXPORT ", key="_EXPORT_MULTI_",
+                               tooltip=' Export resources in each selected format ', disabled=False)],
+                    [sg.Text("Formats", font=("Roboto", 13)),
+                     sg.Text(" " * 123)],
+                    [sg.Checkbox("EAD", key="_MULTI_EAD_", default=True),
+                     sg.Checkbox("MARCXML", key="_MULTI_MARCXML_", default=False),
+                     sg.Checkbox("Container Labels", key="_MULTI_LABELS_", default=False),
+                     sg.Checkbox("PDF", key="_MULTI_PDF_", default=False)],
+                    [sg.Text("Each format is exported to the output folder set in its own options")]
+                    ]
     simple_layout_col1 = [[sg.Text("Enter Resource Identifiers here:", font=("Roboto", 12))],
                           [sg.Multiline(key="resource_id_input", size=(35, rid_box_len), focus=True,
                                         tooltip=' Enter resource identifiers here and seperate either by comma or '
@@ -197,7 +224,8 @@ def run_gui(defaults):
                           [sg.Radio("EAD", "RADIO1", key="_EXPORT_EAD_RAD_", default=True, enable_events=True),
                            sg.Radio("MARCXML", "RADIO1", key="_EXPORT_MARCXML_RAD_", enable_events=True),
                            sg.Radio("Container Labels", "RADIO1", key="_EXPORT_CONTLABS_RAD_", enable_events=True),
-                           sg.Radio("PDF", "RADIO1", key="_EXPORT_PDF_RAD_", enable_events=True)],
+                           sg.Radio("PDF", "RADIO1", key="_EXPORT_PDF_RAD_", enable_events=True),
+                           sg.Radio("Multiple", "RADIO1", key="_EXPORT_MULTI_RAD_", enable_events=True)],
                           [sg.Text("Choose your repository:", font=("Roboto", 12))],
                           [sg.DropDown([repo for repo in repositories.keys()], readonly=True,
                                        default_value=defaults["repo_default"]["_REPO_NAME_"], key="_REPO_SELECT_",
@@ -211,7 +239,9 @@ def run_gui(defaults):
                            sg.Frame("Export Container Labels", contlabel_layout, font=("Roboto", 15),
                                     key="_LABEL_LAYOUT_",
                                     visible=False),
-                           sg.Frame("Export PDF", pdf_layout, font=("Roboto", 15), key="_PDF_LAYOUT_", visible=False)],
+                           sg.Frame("Export PDF", pdf_layout, font=("Roboto", 15), key="_PDF_LAYOUT_", visible=False),
+                           sg.Frame("Export Multiple Formats", multi_layout, font=("Roboto", 15), key="_MULTI_LAYOUT_",
+                                    visible=False)],
                           [sg.Frame("XTF Commands", xtf_layout, font=("Roboto", 15), key="_XTF_LAYOUT_",
                                     visible=xtf_version)],
                           [sg.Text("Output Terminal:", font=("Roboto", 12),
@@ -221,8 +251,14 @@ def run_gui(defaults):
     layout_simple = [[sg.Menu(menu_def)],
                      [sg.Column(simple_layout_col1), sg.Column(simple_layout_col2)]
                      ]
-    window_simple = sg.Window("ArchivesSpace Batch Export-Cleanup-Upload Program", layout_simple, resizable=True)
+    window_simple = sg.Window("ArchivesSpace Batch Export-Cleanup-Upload Program", layout_simple, resizable=True,
+                              finalize=True)
     logger.info("Initiate GUI window")
+    if repos_fetched is not None and not rcache.is_fresh(repos_fetched):
+        logger.info("Refreshing cached repositories in the background")
+        repos_thread = threading.Thread(target=rcache.refresh_repositories, args=(client, as_api, window_simple,),
+                                        daemon=True)
+        repos_thread.start()
     while True:
         gc.collect()
         event_simple, values_simple = window_simple.Read()
@@ -238,6 +274,7 @@ def run_gui(defaults):
             window_simple[f'{"_MARC_LAYOUT_"}'].update(visible=False)
             window_simple[f'{"_LABEL_LAYOUT_"}'].update(visible=False)
             window_simple[f'{"_PDF_LAYOUT_"}'].update(visible=False)
+            window_simple[f'{"_MULTI_LAYOUT_"}'].update(visible=False)
         if event_simple == "_EXPORT_MARCXML_RAD_":
             logger.info("_EXPORT_MARCXML_RAD_ - MARCXML window selected")
             window_simple[f'{"_EAD_LAYOUT_"}'].update(visible=False)
@@ -245,6 +282,7 @@ def run_gui(defaults):
             window_simple[f'{"_MARC_LAYOUT_"}'].update(visible=True)
             window_simple[f'{"_LABEL_LAYOUT_"}'].update(visible=False)
             window_simple[f'{"_PDF_LAYOUT_"}'].update(visible=False)
+            window_simple[f'{"_MULTI_LAYOUT_"}'].update(visible=False)
         if event_simple == "_EXPORT_PDF_RAD_":
             logger.info("_EXPORT_PDF_RAD_ - PDF window selected")
             window_simple[f'{"_EAD_LAYOUT_"}'].update(visible=False)
@@ -252,6 +290,15 @@ def run_gui(defaults):
             window_simple[f'{"_MARC_LAYOUT_"}'].update(visible=False)
             window_simple[f'{"_LABEL_LAYOUT_"}'].update(visible=False)
             window_simple[f'{"_PDF_LAYOUT_"}'].update(visible=True)
+            window_simple[f'{"_MULTI_LAYOUT_"}'].update(visible=False)
+        if event_simple == "_EXPORT_MULTI_RAD_":
+            logger.info("_EXPORT_MULTI_RAD_ - Multiple Formats window selected")
+            window_simple[f'{"_EAD_LAYOUT_"}'].update(visible=False)
+            window_simple[f'{"_XTF_LAYOUT_"}'].update(visible=False)
+            window_simple[f'{"_MARC_LAYOUT_"}'].update(visible=False)
+            window_simple[f'{"_LABEL_LAYOUT_"}'].update(visible=False)
+            window_simple[f'{"_PDF_LAYOUT_"}'].update(visible=False)
+            window_simple[f'{"_MULTI_LAYOUT_"}'].update(visible=True)
         if event_simple == "_EXPORT_CONTLABS_RAD_":
             logger.info("_EXPORT_CONTLABS_RAD_ - Container Labels window selected")
             window_simple[f'{"_EAD_LAYOUT_"}'].update(visible=False)
@@ -259,6 +306,7 @@ def run_gui(defaults):
             window_simple[f'{"_MARC_LAYOUT_"}'].update(visible=False)
             window_simple[f'{"_LABEL_LAYOUT_"}'].update(visible=True)
             window_simple[f'{"_PDF_LAYOUT_"}'].update(visible=False)
+            window_simple[f'{"_MULTI_LAYOUT_"}'].update(visible=False)
         # ------------- REPOSITORY SECTION -------------
         if event_simple == "_REPO_DEFAULT_":
             logger.info(f'_REPO_DEFAULT_ - User saved {values_simple["_REPO_SELECT_"]} as default')
@@ -297,13 +345,13 @@ def run_gui(defaults):
                     sysadmin_popup = sg.PopupYesNo("WARNING!\nAre you an ArchivesSpace System Admin?\n")
                     if sysadmin_popup == "Yes":
                         logger.info("User selected - Search Across Repositories (Sys Admin Only)")
-                        input_ids = resources
+                        input_ids = [repo for repo in repositories.values() if repo is not None]
                         args = (input_ids, defaults, cleanup_options, repositories, client, window_simple,)
                         start_thread(get_all_eads, args, window_simple)
                         logger.info("EAD_EXPORT_THREAD started")
                 else:
                     repo_id = repositories[values_simple["_REPO_SELECT_"]]
-                    input_ids = {repo_id: resources[repo_id]}
+                    input_ids = [repo_id]
                     args = (input_ids, defaults, cleanup_options, repositories, client, window_simple,)
                     start_thread(get_all_eads, args, window_simple)
                     logger.info("EAD_EXPORT_THREAD started")
@@ -315,6 +363,11 @@ def run_gui(defaults):
             open_folder(defaults, "clean_eads", "ead_export_default", "_OUTPUT_DIR_")
         if event_simple == "_OPEN_RAW_EXPORTS_":
             open_folder(defaults, "source_eads", "ead_export_default", "_SOURCE_DIR_")
+        if event_simple == "_RECLEAN_EADS_":
+            logger.info(f'_RECLEAN_EADS_ - User initiated re-cleaning raw EAD exports: {cleanup_options}')
+            args = (defaults, cleanup_options, window_simple,)
+            start_thread(get_reclean_eads, args, window_simple)
+            logger.info("EAD_EXPORT_THREAD started")
         # ------------- MARCXML SECTION -------------
         if event_simple == "_EXPORT_MARCXML_":
             logger.info(f'_EXPORT_MARCXML_ - User initiated exporting MARCXMLs:\n{values_simple["resource_id_input"]}')
@@ -344,13 +397,13 @@ def run_gui(defaults):
                     sysadmin_popup = sg.PopupYesNo("WARNING!\nAre you an ArchivesSpace System Admin?\n")
                     if sysadmin_popup == "Yes":
                         logger.info("User selected - Search Across Repositories (Sys Admin Only)")
-                        input_ids = resources
+                        input_ids = [repo for repo in repositories.values() if repo is not None]
                         args = (input_ids, defaults, repositories, client, window_simple,)
                         start_thread(get_all_marcxml, args, window_simple)
                         logger.info("MARCXML_EXPORT_THREAD started")
                 else:
                     repo_id = repositories[values_simple["_REPO_SELECT_"]]
-                    input_ids = {repo_id: resources[repo_id]}
+                    input_ids = [repo_id]
                     args = (input_ids, defaults, repositories, client, window_simple,)
                     start_thread(get_all_marcxml, args, window_simple)
                     logger.info("MARCXML_EXPORT_THREAD started")
@@ -387,13 +440,13 @@ def run_gui(defaults):
                     sysadmin_popup = sg.PopupYesNo("WARNING!\nAre you an ArchivesSpace System Admin?\n")
                     if sysadmin_popup == "Yes":
                         logger.info("User selected - Search Across Repositories (Sys Admin Only)")
-                        input_ids = resources
+                        input_ids = [repo for repo in repositories.values() if repo is not None]
                         args = (input_ids, defaults, repositories, client, window_simple,)
                         start_thread(get_all_pdfs, args, window_simple)
                         logger.info("PDF_EXPORT_THREAD started")
                 else:
                     repo_id = repositories[values_simple["_REPO_SELECT_"]]
-                    input_ids = {repo_id: resources[repo_id]}
+                    input_ids = [repo_id]
                     args = (input_ids, defaults, repositories, client, window_simple,)
                     start_thread(get_all_pdfs, args, window_simple)
                     logger.info("PDF_EXPORT_THREAD started")
@@ -431,13 +484,13 @@ def run_gui(defaults):
                     sysadmin_popup = sg.PopupYesNo("WARNING!\nAre you an ArchivesSpace System Admin?\n")
                     if sysadmin_popup == "Yes":
                         logger.info("User selected - Search Across Repositories (Sys Admin Only)")
-                        input_ids = resources
+                        input_ids = [repo for repo in repositories.values() if repo is not None]
                         args = (input_ids, defaults, repositories, client, window_simple,)
                         start_thread(get_all_contlabels, args, window_simple)
                         logger.info("CONTLABEL_EXPORT_THREAD started")
                 else:
                     repo_id = repositories[values_simple["_REPO_SELECT_"]]
-                    input_ids = {repo_id: resources[repo_id]}
+                    input_ids = [repo_id]
                     args = (input_ids, defaults, repositories, client, window_simple,)
                     start_thread(get_all_contlabels, args, window_simple)
                     logger.info("CONTLABEL_EXPORT_THREAD started")
@@ -457,8 +510,36 @@ def run_gui(defaults):
             webbrowser.open("https://github.com/uga-libraries/ASpace_Batch_Export-Cleanup-Upload/wiki/User-Manual#conta"
                             "iner-labels-screen",
                             new=2)
+        # ------------- MULTIPLE FORMATS SECTION -------------
+        if event_simple == "_EXPORT_MULTI_":
+            logger.info(f'_EXPORT_MULTI_ - User initiated exporting multiple formats:'
+                        f'\n{values_simple["resource_id_input"]}')
+            input_ids = values_simple["resource_id_input"]
+            export_formats = [export_format for export_format, (key, export_label) in MULTI_EXPORT_FORMATS.items()
+                              if values_simple[key]]
+            if not export_formats:
+                sg.Popup("WARNING!\nPlease select at least one format")
+                logger.warning("User did not select a format")
+            elif not values_simple["_REPO_SELECT_"]:
+                sg.Popup("WARNING!\nPlease select a repository")
+                logger.warning("User did not select a repository")
+            else:
+                if values_simple["_REPO_SELECT_"] == "Search Across Repositories (Sys Admin Only)":
+                    sysadmin_popup = sg.PopupYesNo("WARNING!\nAre you an ArchivesSpace System Admin?\n")
+                    if sysadmin_popup == "Yes":
+                        logger.info("User selected - Search Across Repositories (Sys Admin Only)")
+                        args = (input_ids, export_formats, defaults, cleanup_options, repositories, client,
+                                values_simple, window_simple,)
+                        start_thread(get_multi_exports, args, window_simple)
+                        logger.info("MULTI_EXPORT_THREAD started")
+                else:
+                    args = (input_ids, export_formats, defaults, cleanup_options, repositories, client, values_simple,
+                            window_simple,)
+                    start_thread(get_multi_exports, args, window_simple)
+                    logger.info("MULTI_EXPORT_THREAD started")
         # ------------- EXPORT THREADS -------------
-        if event_simple in (EAD_EXPORT_THREAD, MARCXML_EXPORT_THREAD, PDF_EXPORT_THREAD, CONTLABEL_EXPORT_THREAD):
+        if event_simple in (EAD_EXPORT_THREAD, MARCXML_EXPORT_THREAD, PDF_EXPORT_THREAD, CONTLABEL_EXPORT_THREAD,
+                            MULTI_EXPORT_THREAD):
             window_simple[f'{"_EXPORT_EAD_"}'].update(disabled=False)
             window_simple[f'{"_EXPORT_ALLEADS_"}'].update(disabled=False)
             window_simple[f'{"_EXPORT_MARCXML_"}'].update(disabled=False)
@@ -467,6 +548,7 @@ def run_gui(defaults):
             window_simple[f'{"_EXPORT_ALLCONTLABELS_"}'].update(disabled=False)
             window_simple[f'{"_EXPORT_PDF_"}'].update(disabled=False)
             window_simple[f'{"_EXPORT_ALLPDFS_"}'].update(disabled=False)
+            window_simple[f'{"_EXPORT_MULTI_"}'].update(disabled=False)
             # The following 2 ifs - can I reference event from inside another event?
             if event_simple == MARCXML_EXPORT_THREAD:
                 if defaults["marc_export_default"]["_KEEP_RAW_"] is True:
@@ -486,9 +568,16 @@ def run_gui(defaults):
                     else:
                         filepath_pdfs = str(Path(defaults["pdf_export_default"]["_OUTPUT_DIR_"]))
                         open_file(filepath_pdfs)
+        if event_simple == REPOS_REFRESH_THREAD:
+            refreshed_repositories = {"Search Across Repositories (Sys Admin Only)": None}
+            refreshed_repositories.update(values_simple[REPOS_REFRESH_THREAD])
+            repositories.clear()
+            repositories.update(refreshed_repositories)
+            window_simple[f'{"_REPO_SELECT_"}'].update(values=[repo for repo in repositories.keys()],
+                                                       value=values_simple["_REPO_SELECT_"])
         if event_simple == EXPORT_PROGRESS_THREAD:
-            sg.one_line_progress_meter("Export progress", values_simple["-EXPORT_PROGRESS-"][0],
-                                       values_simple["-EXPORT_PROGRESS-"][1], orientation='h', no_button=True)
+            sg.one_line_progress_meter("Export progress", *values_simple["-EXPORT_PROGRESS-"], orientation='h',
+                                       no_button=True)
         # ------------- MENU OPTIONS SECTION -------------
         # ------------------- FILE -------------------
         if event_simple == "Clear Cleaned EAD Export Folder":
@@ -514,16 +603,24 @@ def run_gui(defaults):
         # ------------------- EDIT -------------------
         if event_simple == "Change ASpace Login Credentials":
             logger.info(f'User initiated changing ASpace login credentials within app')
-            as_username, as_password, as_api, close_program_as, client, asp_version, repositories, resources, \
-                xtf_version = get_aspace_log(defaults, xtf_checkbox=False, as_un=as_username, as_pw=as_password,
-                                             as_ap=as_api, as_client=client, as_res=resources, as_repos=repositories,
-                                             xtf_ver=xtf_version)
+            as_username, as_password, as_api, close_program_as, client, asp_version, repositories, xtf_version, \
+                repos_fetched = get_aspace_log(defaults, xtf_checkbox=False, as_un=as_username, as_pw=as_password,
+                                               as_ap=as_api, as_client=client, as_repos=repositories,
+                                               xtf_ver=xtf_version)
+            start_index_refresh(client, repositories)
         if event_simple == 'Change XTF Login Credentials':
             logger.info(f'User initiated changing XTF login credentials within app')
             xtf_username, xtf_password, xtf_hostname, xtf_remote_path, xtf_indexer_path, xtf_lazy_path, \
                 close_program_xtf = get_xtf_log(defaults, login=False, xtf_un=xtf_username, xtf_pw=xtf_password,
                                                 xtf_ht=xtf_hostname, xtf_rp=xtf_remote_path, xtf_ip=xtf_indexer_path,
                                                 xtf_lp=xtf_lazy_path)
+        if event_simple == "Change Performance Options":
+            get_performance_options(defaults)
+            astransport.configure_client(client, defaults)
+        if event_simple == "Rebuild Identifier Index":
+            logger.info(f'User initiated rebuilding the identifier index')
+            print("Rebuilding the identifier index in the background...\n")
+            start_index_refresh(client, repositories, full=True)
         # ------------------- HELP -------------------
         if event_simple == "About":
             logger.info(f'User initiated About menu option')
@@ -686,7 +783,7 @@ def run_gui(defaults):
 
 
 def get_aspace_log(defaults, xtf_checkbox, as_un=None, as_pw=None, as_ap=None, as_client=None, as_repos=None,
-                   as_res=None, xtf_ver=None):
+                   xtf_ver=None):
     """
     Gets a user's ArchiveSpace credentials.
 
@@ -705,7 +802,6 @@ def get_aspace_log(defaults, xtf_checkbox, as_un=None, as_pw=None, as_ap=None, a
         as_ap (str, optional): the ArchivesSpace API URL
         as_client (ASnake.client object, optional): the ArchivesSpace ASnake client for accessing and connecting to the API
         as_repos (dict, optional): contains info on all the repositories for an ArchivesSpace instance, including name as the key and id # as it's value
-        as_res (dict, optional): contains info on all the resources for an ArchivesSpace instance, including repository name as key and list of resource ids as value
         xtf_ver (bool, optional): user indicated value whether they want to display xtf features in the GUI
 
     Returns:
@@ -716,8 +812,9 @@ def get_aspace_log(defaults, xtf_checkbox, as_un=None, as_pw=None, as_ap=None, a
         client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
         asp_version (str): the current version of ArchivesSpace
         repositories (dict): contains info on all the repositories for an ArchivesSpace instance, including name as the key and id # as it's value
-        resource_ids (dict): contains info on all the resources for each repository for an ArchivesSpace instance, including repository # as the key and a list of resource #s as strings as its value
         xtf_version (bool): user indicated value whether they want to display xtf features in the GUI
+        repos_fetched (float or None): time the repositories were fetched if they came from the repository cache, in
+        seconds since the epoch, None if they were fetched from ArchivesSpace or already given in as_repos
     """
     as_username = as_un
     as_password = as_pw
@@ -728,11 +825,8 @@ def get_aspace_log(defaults, xtf_checkbox, as_un=None, as_pw=None, as_ap=None, a
         repositories = {"Search Across Repositories (Sys Admin Only)": None}
     else:
         repositories = as_repos
-    if as_res is None:
-        resource_ids = {}
-    else:
-        resource_ids = as_res
     xtf_version = xtf_ver
+    repos_fetched = None
     if xtf_checkbox is True:
         save_button_asp = " Save and Continue "
     else:
@@ -785,6 +879,7 @@ def get_aspace_log(defaults, xtf_checkbox, as_un=None, as_pw=None, as_ap=None, a
                         logger.error(f'Username and/or password failed: {error_message}')
                     else:
                         client = connect_client
+                        astransport.configure_client(client, defaults)
                         as_username = values_log["_ASPACE_UNAME_"]
                         as_password = values_log["_ASPACE_PWORD_"]
                         as_api = values_log["_ASPACE_API_"]
@@ -798,18 +893,12 @@ def get_aspace_log(defaults, xtf_checkbox, as_un=None, as_pw=None, as_ap=None, a
                             defaults["xtf_default"]["xtf_version"] = xtf_version
                             json.dump(defaults, defaults_asp)
                             defaults_asp.close()
-                        if len(repositories) == 1:  # Get repositories info
-                            repo_results = client.get('/repositories')
-                            repo_results_dec = json.loads(repo_results.content.decode())
-                            for result in repo_results_dec:
-                                uri_components = result["uri"].split("/")
-                                repositories[result["name"]] = int(uri_components[-1])
-                            for repository in repo_results.json():  # Get resource ids
-                                resources = client.get(f"{repository['uri']}/resources", params={"all_ids":
-                                                                                                 True}).json()
-                                uri_components = repository["uri"].split("/")
-                                repository_id = int(uri_components[-1])
-                                resource_ids[repository_id] = [resource_id for resource_id in resources]
+                        if len(repositories) == 1:  # Get repositories info, cached ones are refreshed by run_gui()
+                            cached_repositories, repos_fetched = rcache.load_repositories(as_api)
+                            if cached_repositories is None:
+                                cached_repositories = rcache.fetch_repositories(client)
+                                rcache.save_repositories(as_api, cached_repositories)
+                            repositories.update(cached_repositories)
                         window_asplog_active = False
                         correct_creds = True
             if event_log is None or event_log == 'Cancel':
@@ -820,7 +909,8 @@ def get_aspace_log(defaults, xtf_checkbox, as_un=None, as_pw=None, as_ap=None, a
                 close_program = True
                 break
         window_login.close()
-    return as_username, as_password, as_api, close_program, client, asp_version, repositories, resource_ids, xtf_version
+    return as_username, as_password, as_api, close_program, client, asp_version, repositories, xtf_version, \
+        repos_fetched
 
 
 def get_xtf_log(defaults, login=True, xtf_un=None, xtf_pw=None, xtf_ht=None, xtf_rp=None, xtf_ip=None, xtf_lp=None):
@@ -956,71 +1046,14 @@ def get_eads(input_ids, defaults, cleanup_options, repositories, client, values_
     Returns:
         None
     """
-    resources = []
-    export_counter = 0
     if export_all is True:
-        resources = [input_ids]
-        repo_id = values_simple
+        resources = [(input_ids, values_simple, None)]
     else:
         repo_id = repositories[values_simple["_REPO_SELECT_"]]
-        if "," in input_ids:
-            csep_resources = [user_input.strip() for user_input in input_ids.split(",")]
-            for resource in csep_resources:
-                linebreak_resources = resource.splitlines()
-                for lb_resource in linebreak_resources:
-                    resources.append(lb_resource)
-        else:
-            resources = [user_input.strip() for user_input in input_ids.splitlines()]
-    for input_id in resources:
-        if export_all is True:
-            logger.info(f'Beginning EAD export: EXPORT_ALL')
-            resource_export = asx.ASExport(input_id, repo_id, client, defaults["ead_export_default"]["_SOURCE_DIR_"],
-                                           export_all=True)
-        else:
-            logger.info(f'Beginning EAD export: {resources}')
-            resource_export = asx.ASExport(input_id, repo_id, client, defaults["ead_export_default"]["_SOURCE_DIR_"])
-        resource_export.fetch_results()
-        if resource_export.error is None:
-            if resource_export.result is not None:
-                logger.info(f'Fetched results: {resource_export.result}')
-                print(resource_export.result)
-            if export_all is False:
-                gui_window.write_event_value('-EXPORT_PROGRESS-', (export_counter, len(resources)))
-            logger.info(f'Exporting: {input_id}')
-            print("Exporting {}...".format(input_id), end='', flush=True)
-            resource_export.export_ead(include_unpublished=defaults["ead_export_default"]["_INCLUDE_UNPUB_"],
-                                       include_daos=defaults["ead_export_default"]["_INCLUDE_DAOS_"],
-                                       numbered_cs=defaults["ead_export_default"]["_NUMBERED_CS_"],
-                                       ead3=defaults["ead_export_default"]["_USE_EAD3_"])
-            if resource_export.error is None:
-                logger.info(f'EAD export complete: {resource_export.result}')
-                print(resource_export.result + "\n")
-                if defaults["ead_export_default"]["_CLEAN_EADS_"] is True:
-                    if defaults["ead_export_default"]["_KEEP_RAW_"] is True:
-                        logger.info(f'EAD cleaning up record {resource_export.filepath}')
-                        print("Cleaning up EAD record...", end='', flush=True)
-                        valid, results = clean.cleanup_eads(resource_export.filepath, cleanup_options,
-                                                            defaults["ead_export_default"]["_OUTPUT_DIR_"],
-                                                            keep_raw_exports=True)
-                        export_counter = update_export_progress('EAD cleanup complete', results, resources,
-                                                                export_counter, export_all, gui_window, valid)
-                    else:
-                        logger.info(f'EAD cleaning up record {resource_export.filepath}')
-                        print("Cleaning up EAD record...", end='', flush=True)
-                        valid, results = clean.cleanup_eads(resource_export.filepath, cleanup_options,
-                                                            defaults["ead_export_default"]["_OUTPUT_DIR_"])
-                        export_counter = update_export_progress('EAD cleanup complete', results, resources,
-                                                                export_counter, export_all, gui_window, valid)
-                else:
-                    export_counter += 1
-                    if export_all is False:
-                        gui_window.write_event_value('-EXPORT_PROGRESS-', (export_counter, len(resources)))
-            else:
-                export_counter = export_error(resource_export, 'EAD export error', export_counter, resources,
-                                              gui_window)
-        else:
-            export_counter = export_error(resource_export, 'EAD fetch results error', export_counter, resources,
-                                          gui_window)
+        resources = [(input_id, repo_id, None) for input_id in split_input_ids(input_ids)]
+    logger.info(f'Beginning EAD export: {resources}')
+    export_counter = report_exports("ead", "EAD", resources, defaults, client, gui_window,
+                                    cleanup_options=cleanup_options, export_all=export_all)
     if export_all is False:
         trailing_line = 76 - len(f'Finished {str(export_counter)} exports') - (len(str(export_counter)) - 1)
         logger.info(f'Finished EAD exports: {export_counter}')
@@ -1030,10 +1063,10 @@ def get_eads(input_ids, defaults, cleanup_options, repositories, client, values_
 
 def get_all_eads(input_ids, defaults, cleanup_options, repositories, client, gui_window):
     """
-    Iterates through resources set to Publish = True and sends them to get_eads() to fetch and export files.
+    Sends all published resources for the given repositories to report_exports().
 
     Args:
-        input_ids (dict): contains repository ASpace ID as key and all published resource IDs in a list as value.
+        input_ids (list): ASpace repository ID #s to export all published resources from
         defaults (dict): contains the data from defaults.json file, all data the user has specified as default
         cleanup_options (list): options a user wants to run against an EAD.xml file after export to clean the file.
         These include the following:
@@ -1047,22 +1080,10 @@ def get_all_eads(input_ids, defaults, cleanup_options, repositories, client, gui
     Returns:
         None
     """
-    export_all_counter = 0
-    all_resources_counter = 0
-    for resource_uris in input_ids.values():
-        all_resources_counter += len(resource_uris)
-    for repo_id, resource_uris in input_ids.items():
-        for resource_uri in resource_uris:
-            gui_window.write_event_value('-EXPORT_PROGRESS-', (export_all_counter, all_resources_counter))
-            resource_json = client.get(f'/repositories/{str(repo_id)}/resources/{str(resource_uri)}').json()
-            if resource_json["publish"] is True:
-                get_eads(resource_uri, defaults, cleanup_options, repositories, client, repo_id, gui_window,
-                         export_all=True)
-            else:
-                export_all_counter += -1
-                all_resources_counter += -1
-            export_all_counter += 1
-            gui_window.write_event_value('-EXPORT_PROGRESS-', (export_all_counter, all_resources_counter))
+    resources = get_published_resources(input_ids, client)
+    logger.info(f'Beginning EAD export: EXPORT_ALL')
+    export_all_counter = report_exports("ead", "EAD", resources, defaults, client, gui_window,
+                                        cleanup_options=cleanup_options, export_all=True, repo_ids=input_ids)
     trailing_line = 76 - len(f'Finished {str(export_all_counter)} exports') - (len(str(export_all_counter)) - 1)
     logger.info(f'Finished EAD exports: {export_all_counter}')
     print("\n" + "-" * 55 + "Finished {} exports".format(str(export_all_counter)) + "-" * trailing_line + "\n")
@@ -1098,6 +1119,11 @@ def get_ead_options(defaults):
                                       default=defaults["ead_export_default"]["_USE_EAD3_"])],
                          [sg.Checkbox("Keep raw ASpace Exports", key="_KEEP_RAW_",
                                       default=defaults["ead_export_default"]["_KEEP_RAW_"])],
+                         [sg.Checkbox("Compress kept raw exports into an archive per export", key="_ARCHIVE_RAW_",
+                                      default=defaults["ead_export_default"]["_ARCHIVE_RAW_"])],
+                         [sg.Text("Clean EADs larger than this many MB while reading them (0 for never):"),
+                          sg.Input(defaults["ead_export_default"]["_STREAM_CLEANUP_MB_"], key="_STREAM_CLEANUP_MB_",
+                                   size=(6, 1))],
                          [sg.FolderBrowse(" Set raw ASpace output folder: ",
                                           initial_folder=defaults["ead_export_default"]["_SOURCE_DIR_"]),
                           sg.InputText(default_text=defaults["ead_export_default"]["_SOURCE_DIR_"],
@@ -1129,7 +1155,16 @@ def get_ead_options(defaults):
                     sg.Popup("WARNING!\nOne of the checkboxes from the following need to be checked:"
                              "\n\nKeep raw ASpace Exports\nClean EAD records on export")
                 else:
-                    if os.path.isdir(values_eadopt["_SOURCE_DIR_"]) is False:
+                    try:
+                        stream_cleanup_mb = int(values_eadopt["_STREAM_CLEANUP_MB_"])
+                    except ValueError:
+                        stream_cleanup_mb = -1
+                    if stream_cleanup_mb < 0:
+                        logger.info(f'User input an invalid EAD _STREAM_CLEANUP_MB_: '
+                                    f'{values_eadopt["_STREAM_CLEANUP_MB_"]}')
+                        sg.popup("WARNING!\nThe size of EADs to clean while reading them must be a whole number of MB, "
+                                 "0 or more")
+                    elif os.path.isdir(values_eadopt["_SOURCE_DIR_"]) is False:
                         logger.info(f'User input an invalid EAD _SOURCE_DIR_: {values_eadopt["_SOURCE_DIR_"]}')
                         sg.popup("WARNING!\nYour input for the export output is invalid.\nPlease try another directory")
                     elif os.path.isdir(values_eadopt["_OUTPUT_DIR_"]) is False:
@@ -1144,6 +1179,8 @@ def get_ead_options(defaults):
                             defaults["ead_export_default"]["_NUMBERED_CS_"] = values_eadopt["_NUMBERED_CS_"]
                             defaults["ead_export_default"]["_USE_EAD3_"] = values_eadopt["_USE_EAD3_"]
                             defaults["ead_export_default"]["_KEEP_RAW_"] = values_eadopt["_KEEP_RAW_"]
+                            defaults["ead_export_default"]["_ARCHIVE_RAW_"] = values_eadopt["_ARCHIVE_RAW_"]
+                            defaults["ead_export_default"]["_STREAM_CLEANUP_MB_"] = stream_cleanup_mb
                             defaults["ead_export_default"]["_CLEAN_EADS_"] = values_eadopt["_CLEAN_EADS_"]
                             defaults["ead_export_default"]["_SOURCE_DIR_"] = str(Path(values_eadopt["_SOURCE_DIR_"]))
                             defaults["ead_export_default"]["_OUTPUT_DIR_"] = str(Path(values_eadopt["_OUTPUT_DIR_"]))
@@ -1248,6 +1285,39 @@ def get_cleanup_defaults(cleanup_defaults, defaults):
             return cleanup_options
 
 
+def get_reclean_eads(defaults, cleanup_options, gui_window):
+    """
+    Cleans the raw EAD exports in the raw exports folder and its archives again with reclean.reclean_eads().
+
+    Exports that are unchanged since they were last re-cleaned with the same cleanup options are skipped.
+
+    Args:
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        cleanup_options (list): options a user wants to run against an EAD.xml file after export to clean the file
+        gui_window (PySimpleGUI Object): is the GUI window for the app. See PySimpleGUI.org for more info
+
+    Returns:
+        None
+    """
+    print(f'Re-cleaning raw EAD exports in {defaults["ead_export_default"]["_SOURCE_DIR_"]}...\n')
+    clean_counter, skipped_counter = 0, 0
+    try:
+        for filename, valid, results in rclean.reclean_eads(defaults, cleanup_options):
+            if valid is None:
+                skipped_counter += 1
+                continue
+            print(f'Cleaning up {filename}...', end='', flush=True)
+            clean_counter = update_export_progress('EAD re-clean complete', results, [], clean_counter, gui_window,
+                                                   valid, post_progress=False)
+    except Exception as e:
+        logger.error(f'Error re-cleaning raw EAD exports: {e}')
+        print(f'Error re-cleaning raw EAD exports: {e}\n')
+    finished_message = f'Finished {clean_counter} re-cleans, {skipped_counter} unchanged'
+    logger.info(finished_message)
+    print("\n" + "-" * 55 + finished_message + "-" * max(1, 80 - len(finished_message)) + "\n")
+    gui_window.write_event_value('-EAD_THREAD-', (threading.current_thread().name,))
+
+
 def get_marcxml(input_ids, defaults, repositories, client, values_simple, gui_window, export_all=False):
     """
     Iterates through user input and sends them to as_export.py to fetch_results() and export_marcxml().
@@ -1267,45 +1337,14 @@ def get_marcxml(input_ids, defaults, repositories, client, values_simple, gui_wi
     Returns:
         None
     """
-    resources = []
-    export_counter = 0
     if export_all is True:
-        resources = [input_ids]
-        repo_id = values_simple
+        resources = [(input_ids, values_simple, None)]
     else:
         repo_id = repositories[values_simple["_REPO_SELECT_"]]
-        if "," in input_ids:
-            csep_resources = [user_input.strip() for user_input in input_ids.split(",")]
-            for resource in csep_resources:
-                linebreak_resources = resource.splitlines()
-                for lb_resource in linebreak_resources:
-                    resources.append(lb_resource)
-        else:
-            resources = [user_input.strip() for user_input in input_ids.splitlines()]
-    for input_id in resources:
-        if export_all is True:
-            logger.info(f'Beginning MARCXML export: EXPORT_ALL')
-            resource_export = asx.ASExport(input_id, repo_id, client,
-                                           output_dir=defaults["marc_export_default"]["_OUTPUT_DIR_"], export_all=True)
-        else:
-            logger.info(f'Beginning MARCXML export: {resources}')
-            resource_export = asx.ASExport(input_id, repo_id, client,
-                                           output_dir=defaults["marc_export_default"]["_OUTPUT_DIR_"])
-        resource_export.fetch_results()
-        if resource_export.error is None:
-            logger.info(f'Exporting: {input_id}')
-            print("Exporting {}...".format(input_id), end='', flush=True)
-            resource_export.export_marcxml(
-                include_unpublished=defaults["marc_export_default"]["_INCLUDE_UNPUB_"])
-            if resource_export.error is None:
-                export_counter = update_export_progress('MARCXML export complete', resource_export.result, resources,
-                                                        export_counter, export_all, gui_window)
-            else:
-                export_counter = export_error(resource_export, 'MARCXML export error', export_counter, resources,
-                                              gui_window)
-        else:
-            export_counter = export_error(resource_export, 'MARCXML export error', export_counter, resources,
-                                          gui_window)
+        resources = [(input_id, repo_id, None) for input_id in split_input_ids(input_ids)]
+    logger.info(f'Beginning MARCXML export: {resources}')
+    export_counter = report_exports("marcxml", "MARCXML", resources, defaults, client, gui_window,
+                                    export_all=export_all)
     if export_all is False:
         trailing_line = 76 - len(f'Finished {str(export_counter)} exports') - (len(str(export_counter)) - 1)
         logger.info(f'Finished MARCXML exports: {export_counter}')
@@ -1315,10 +1354,10 @@ def get_marcxml(input_ids, defaults, repositories, client, values_simple, gui_wi
 
 def get_all_marcxml(input_ids, defaults, repositories, client, gui_window):
     """
-    Iterates through resources set to Publish = True and sends them to get_marcxml() to fetch and export files.
+    Sends all published resources for the given repositories to report_exports().
 
     Args:
-        input_ids (dict): contains repository ASpace ID as key and all published resource IDs in a list as value.
+        input_ids (list): ASpace repository ID #s to export all published resources from
         defaults (dict): contains the data from defaults.json file, all data the user has specified as default
         repositories (dict): repositories as listed in the ArchivesSpace instance
         client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
@@ -1327,21 +1366,10 @@ def get_all_marcxml(input_ids, defaults, repositories, client, gui_window):
     Returns:
         None
     """
-    export_all_counter = 0
-    all_resources_counter = 0
-    for resource_uris in input_ids.values():
-        all_resources_counter += len(resource_uris)
-    for repo_id, resource_uris in input_ids.items():
-        for resource_uri in resource_uris:
-            gui_window.write_event_value('-EXPORT_PROGRESS-', (export_all_counter, all_resources_counter))
-            resource_json = client.get(f'/repositories/{str(repo_id)}/resources/{str(resource_uri)}').json()
-            if resource_json["publish"] is True:
-                get_marcxml(resource_uri, defaults, repositories, client, repo_id, gui_window, export_all=True)
-            else:
-                export_all_counter += -1
-                all_resources_counter += -1
-            export_all_counter += 1
-            gui_window.write_event_value('-EXPORT_PROGRESS-', (export_all_counter, all_resources_counter))
+    resources = get_published_resources(input_ids, client)
+    logger.info(f'Beginning MARCXML export: EXPORT_ALL')
+    export_all_counter = report_exports("marcxml", "MARCXML", resources, defaults, client, gui_window,
+                                        export_all=True, repo_ids=input_ids)
     trailing_line = 76 - len(f'Finished {str(export_all_counter)} exports') - (len(str(export_all_counter)) - 1)
     logger.info(f'Finished MARCXML exports: {export_all_counter}')
     print("\n" + "-" * 55 + "Finished {} exports".format(str(export_all_counter)) + "-" * trailing_line + "\n")
@@ -1376,6 +1404,8 @@ def get_marc_options(defaults):
                                 default=defaults["marc_export_default"]["_INCLUDE_UNPUB_"])],
                    [sg.Checkbox("Open output folder on export", key="_KEEP_RAW_",
                                 default=defaults["marc_export_default"]["_KEEP_RAW_"])],
+                   [sg.Checkbox("Compress exports into an archive per export", key="_ARCHIVE_RAW_",
+                                default=defaults["marc_export_default"]["_ARCHIVE_RAW_"])],
                    [sg.FolderBrowse(" Set output folder: ",
                                     initial_folder=defaults["marc_export_default"]["_OUTPUT_DIR_"]),
                     sg.InputText(default_text=defaults["marc_export_default"]["_OUTPUT_DIR_"], key="_MARC_OUT_DIR_")],
@@ -1403,6 +1433,7 @@ def get_marc_options(defaults):
                 with open("defaults.json", "w") as defaults_marc:
                     defaults["marc_export_default"]["_INCLUDE_UNPUB_"] = values_marc["_INCLUDE_UNPUB_"]
                     defaults["marc_export_default"]["_KEEP_RAW_"] = values_marc["_KEEP_RAW_"]
+                    defaults["marc_export_default"]["_ARCHIVE_RAW_"] = values_marc["_ARCHIVE_RAW_"]
                     defaults["marc_export_default"]["_OUTPUT_DIR_"] = str(Path(values_marc["_MARC_OUT_DIR_"]))
                     json.dump(defaults, defaults_marc)
                     defaults_marc.close()
@@ -1429,46 +1460,14 @@ def get_pdfs(input_ids, defaults, repositories, client, values_simple, gui_windo
     Returns:
         None
     """
-    resources = []
-    export_counter = 0
     if export_all is True:
-        resources = [input_ids]
-        repo_id = values_simple
+        resources = [(input_ids, values_simple, None)]
     else:
         repo_id = repositories[values_simple["_REPO_SELECT_"]]
-        if "," in input_ids:
-            csep_resources = [user_input.strip() for user_input in input_ids.split(",")]
-            for resource in csep_resources:
-                linebreak_resources = resource.splitlines()
-                for lb_resource in linebreak_resources:
-                    resources.append(lb_resource)
-        else:
-            resources = [user_input.strip() for user_input in input_ids.splitlines()]
-    for input_id in resources:
-        if export_all is True:
-            logger.info(f'Beginning PDF export: EXPORT_ALL')
-            resource_export = asx.ASExport(input_id, repo_id, client,
-                                           output_dir=defaults["pdf_export_default"]["_OUTPUT_DIR_"], export_all=True)
-        else:
-            logger.info(f'Beginning PDF export: {resources}')
-            resource_export = asx.ASExport(input_id, repo_id, client,
-                                           output_dir=defaults["pdf_export_default"]["_OUTPUT_DIR_"])
-        resource_export.fetch_results()
-        if resource_export.error is None:
-            logger.info(f'Exporting: {input_id}')
-            print("Exporting {}...".format(input_id), end='', flush=True)
-            resource_export.export_pdf(include_unpublished=defaults["ead_export_default"]["_INCLUDE_UNPUB_"],
-                                       include_daos=defaults["pdf_export_default"]["_INCLUDE_DAOS_"],
-                                       numbered_cs=defaults["pdf_export_default"]["_NUMBERED_CS_"],
-                                       ead3=defaults["pdf_export_default"]["_USE_EAD3_"])
-            if resource_export.error is None:
-                export_counter = update_export_progress('Export PDF complete', resource_export.result, resources,
-                                                        export_counter, export_all, gui_window)
-            else:
-                export_counter = export_error(resource_export, 'PDF export error', export_counter, resources,
-                                              gui_window)
-        else:
-            export_counter = export_error(resource_export, 'PDF export error', export_counter, resources, gui_window)
+        resources = [(input_id, repo_id, None) for input_id in split_input_ids(input_ids)]
+    logger.info(f'Beginning PDF export: {resources}')
+    export_counter = report_exports("pdf", "PDF", resources, defaults, client, gui_window,
+                                    export_all=export_all)
     if export_all is False:
         trailing_line = 76 - len(f'Finished {str(export_counter)} exports') - (len(str(export_counter)) - 1)
         logger.info(f'Finished PDF exports: {export_counter}')
@@ -1478,10 +1477,10 @@ def get_pdfs(input_ids, defaults, repositories, client, values_simple, gui_windo
 
 def get_all_pdfs(input_ids, defaults, repositories, client, gui_window):
     """
-    Iterates through resources set to Publish = True and sends them to get_pdfs() to fetch and export files.
+    Sends all published resources for the given repositories to report_exports().
 
     Args:
-        input_ids (dict): contains repository ASpace ID as key and all published resource IDs in a list as value.
+        input_ids (list): ASpace repository ID #s to export all published resources from
         defaults (dict): contains the data from defaults.json file, all data the user has specified as default
         repositories (dict): repositories as listed in the ArchivesSpace instance
         client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
@@ -1490,21 +1489,10 @@ def get_all_pdfs(input_ids, defaults, repositories, client, gui_window):
     Returns:
         None
     """
-    export_all_counter = 0
-    all_resources_counter = 0
-    for resource_uris in input_ids.values():
-        all_resources_counter += len(resource_uris)
-    for repo_id, resource_uris in input_ids.items():
-        for resource_uri in resource_uris:
-            gui_window.write_event_value('-EXPORT_PROGRESS-', (export_all_counter, all_resources_counter))
-            resource_json = client.get(f'/repositories/{str(repo_id)}/resources/{str(resource_uri)}').json()
-            if resource_json["publish"] is True:
-                get_pdfs(resource_uri, defaults, repositories, client, repo_id, gui_window, export_all=True)
-            else:
-                export_all_counter += -1
-                all_resources_counter += -1
-            export_all_counter += 1
-            gui_window.write_event_value('-EXPORT_PROGRESS-', (export_all_counter, all_resources_counter))
+    resources = get_published_resources(input_ids, client)
+    logger.info(f'Beginning PDF export: EXPORT_ALL')
+    export_all_counter = report_exports("pdf", "PDF", resources, defaults, client, gui_window,
+                                        export_all=True, repo_ids=input_ids)
     trailing_line = 76 - len(f'Finished {str(export_all_counter)} exports') - (len(str(export_all_counter)) - 1)
     logger.info(f'Finished PDF exports: {export_all_counter}')
     print("\n" + "-" * 55 + "Finished {} exports".format(str(export_all_counter)) + "-" * trailing_line + "\n")
@@ -1546,6 +1534,8 @@ def get_pdf_options(defaults):
                                default=defaults["pdf_export_default"]["_USE_EAD3_"])],
                   [sg.Checkbox("Open output folder on export", key="_KEEP_RAW_",
                                default=defaults["pdf_export_default"]["_KEEP_RAW_"])],
+                  [sg.Checkbox("Compress exports into an archive per export", key="_ARCHIVE_RAW_",
+                               default=defaults["pdf_export_default"]["_ARCHIVE_RAW_"])],
                   [sg.FolderBrowse(" Set output folder: ",
                                    initial_folder=defaults["pdf_export_default"]["_OUTPUT_DIR_"]),
                    sg.InputText(default_text=defaults["pdf_export_default"]["_OUTPUT_DIR_"], key="_OUTPUT_DIR_")],
@@ -1576,6 +1566,7 @@ def get_pdf_options(defaults):
                     defaults["pdf_export_default"]["_NUMBERED_CS_"] = values_pdf["_NUMBERED_CS_"]
                     defaults["pdf_export_default"]["_USE_EAD3_"] = values_pdf["_USE_EAD3_"]
                     defaults["pdf_export_default"]["_KEEP_RAW_"] = values_pdf["_KEEP_RAW_"]
+                    defaults["pdf_export_default"]["_ARCHIVE_RAW_"] = values_pdf["_ARCHIVE_RAW_"]
                     defaults["pdf_export_default"]["_OUTPUT_DIR_"] = str(Path(values_pdf["_OUTPUT_DIR_"]))
                     json.dump(defaults, defaults_pdf)
                     defaults_pdf.close()
@@ -1583,6 +1574,108 @@ def get_pdf_options(defaults):
         window_pdf.close()
 
 
+def get_performance_options(defaults):
+    """
+    Write the options selected to the defaults.json file.
+
+    This function opens a window in the GUI that allows a user to choose how exports are run. These options include:
+
+        1. Number of resources to export at the same time (default is 4)
+        2. Use asyncio for Export All runs (default is True)
+        3. Resources to export at the same time in asyncio Export All runs (default is 8)
+        4. Seconds before a request to ArchivesSpace is cancelled in asyncio Export All runs (default is 300)
+        5. Only export resources changed since the last Export All (default is False)
+        6. Times a failed request to ArchivesSpace is retried (default is 3)
+        7. Send fewer requests at the same time when ArchivesSpace slows down or errors (default is True)
+        8. Resume an Export All that did not finish instead of starting over (default is True)
+        9. Seconds identifier searches are cached, 0 to not cache them (default is 3600)
+        10. Keep the lookup cache between sessions in lookup_cache.json (default is False)
+        11. Number of EADs to clean at the same time, 0 for one per CPU core (default is 0)
+
+    Args:
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        None
+    """
+    window_perf_active = True
+    perf_layout = [[sg.Text("Choose Performance Options", font=("Roboto", 14))],
+                   [sg.Text("Resources to export at the same time:"),
+                    sg.Spin([workers for workers in range(1, 33)], key="_MAX_WORKERS_", size=(4, 1),
+                            initial_value=defaults["performance_default"]["_MAX_WORKERS_"])],
+                   [sg.Checkbox("Use asyncio for Export All", key="_ASYNC_EXPORT_ALL_",
+                                default=defaults["performance_default"]["_ASYNC_EXPORT_ALL_"])],
+                   [sg.Text("Resources to export at the same time with asyncio:"),
+                    sg.Spin([workers for workers in range(1, 65)], key="_ASYNC_CONCURRENCY_", size=(4, 1),
+                            initial_value=defaults["performance_default"]["_ASYNC_CONCURRENCY_"])],
+                   [sg.Text("Request timeout (seconds):"),
+                    sg.Input(defaults["performance_default"]["_REQUEST_TIMEOUT_"], key="_REQUEST_TIMEOUT_",
+                             size=(6, 1))],
+                   [sg.Checkbox("Export All only exports resources changed since the last Export All",
+                                key="_INCREMENTAL_EXPORT_ALL_",
+                                default=defaults["performance_default"]["_INCREMENTAL_EXPORT_ALL_"])],
+                   [sg.Text("Times to retry a failed request:"),
+                    sg.Spin([retries for retries in range(0, 11)], key="_MAX_RETRIES_", size=(4, 1),
+                            initial_value=defaults["performance_default"]["_MAX_RETRIES_"])],
+                   [sg.Checkbox("Send fewer requests when ArchivesSpace slows down", key="_ADAPTIVE_LIMIT_",
+                                default=defaults["performance_default"]["_ADAPTIVE_LIMIT_"])],
+                   [sg.Checkbox("Resume an Export All that did not finish", key="_RESUME_EXPORT_ALL_",
+                                default=defaults["performance_default"]["_RESUME_EXPORT_ALL_"])],
+                   [sg.Text("Seconds to cache identifier searches (0 to not cache):"),
+                    sg.Input(defaults["performance_default"]["_LOOKUP_CACHE_TTL_"], key="_LOOKUP_CACHE_TTL_",
+                             size=(6, 1))],
+                   [sg.Checkbox("Keep the lookup cache between sessions", key="_PERSIST_LOOKUP_CACHE_",
+                                default=defaults["performance_default"]["_PERSIST_LOOKUP_CACHE_"])],
+                   [sg.Text("EADs to clean at the same time (0 for one per CPU core):"),
+                    sg.Input(defaults["performance_default"]["_CLEANUP_PROCESSES_"], key="_CLEANUP_PROCESSES_",
+                             size=(6, 1))],
+                   [sg.Button(" Save Settings ", key="_SAVE_SETTINGS_PERF_", bind_return_key=True)]
+                   ]
+    window_perf = sg.Window("Performance Options", perf_layout)
+    while window_perf_active is True:
+        event_perf, values_perf = window_perf.Read()
+        logger.info(f'User initiated Performance Options')
+        if event_perf is None or event_perf == 'Cancel':
+            logger.info(f'User cancelled Performance Options')
+            window_perf_active = False
+            window_perf.close()
+        if event_perf == "_SAVE_SETTINGS_PERF_":
+            try:
+                max_workers = int(values_perf["_MAX_WORKERS_"])
+                async_concurrency = int(values_perf["_ASYNC_CONCURRENCY_"])
+                request_timeout = int(values_perf["_REQUEST_TIMEOUT_"])
+                max_retries = int(values_perf["_MAX_RETRIES_"])
+                lookup_cache_ttl = int(values_perf["_LOOKUP_CACHE_TTL_"])
+                cleanup_processes = int(values_perf["_CLEANUP_PROCESSES_"])
+                if min(max_workers, async_concurrency, request_timeout) < 1 or \
+                        min(max_retries, lookup_cache_ttl, cleanup_processes) < 0:
+                    raise ValueError(values_perf)
+            except ValueError:
+                logger.info(f'User input invalid Performance Options: {values_perf}')
+                sg.popup("WARNING!\nThe number of resources to export at the same time and the request timeout must "
+                         "be whole numbers of 1 or more, and the number of retries, seconds to cache searches and "
+                         "EADs to clean at the same time whole numbers of 0 or more")
+            else:
+                logger.info(f'User selected Performance Options: {values_perf}')
+                with open("defaults.json", "w") as defaults_perf:
+                    defaults["performance_default"]["_MAX_WORKERS_"] = max_workers
+                    defaults["performance_default"]["_ASYNC_EXPORT_ALL_"] = values_perf["_ASYNC_EXPORT_ALL_"]
+                    defaults["performance_default"]["_ASYNC_CONCURRENCY_"] = async_concurrency
+                    defaults["performance_default"]["_REQUEST_TIMEOUT_"] = request_timeout
+                    defaults["performance_default"]["_INCREMENTAL_EXPORT_ALL_"] = \
+                        values_perf["_INCREMENTAL_EXPORT_ALL_"]
+                    defaults["performance_default"]["_MAX_RETRIES_"] = max_retries
+                    defaults["performance_default"]["_ADAPTIVE_LIMIT_"] = values_perf["_ADAPTIVE_LIMIT_"]
+                    defaults["performance_default"]["_RESUME_EXPORT_ALL_"] = values_perf["_RESUME_EXPORT_ALL_"]
+                    defaults["performance_default"]["_LOOKUP_CACHE_TTL_"] = lookup_cache_ttl
+                    defaults["performance_default"]["_PERSIST_LOOKUP_CACHE_"] = values_perf["_PERSIST_LOOKUP_CACHE_"]
+                    defaults["performance_default"]["_CLEANUP_PROCESSES_"] = cleanup_processes
+                    json.dump(defaults, defaults_perf)
+                    defaults_perf.close()
+                window_perf_active = False
+        window_perf.close()
+
+
 def get_contlabels(input_ids, defaults, repositories, client, values_simple, gui_window, export_all=False):
     """
     Iterates through the user input and sends them to as_export.py to fetch_results() and export_labels().
@@ -1602,45 +1695,14 @@ def get_contlabels(input_ids, defaults, repositories, client, values_simple, gui
     Returns:
         None
     """
-    resources = []
-    export_counter = 0
     if export_all is True:
-        resources = [input_ids]
-        repo_id = values_simple
+        resources = [(input_ids, values_simple, None)]
     else:
         repo_id = repositories[values_simple["_REPO_SELECT_"]]
-        if "," in input_ids:
-            csep_resources = [user_input.strip() for user_input in input_ids.split(",")]
-            for resource in csep_resources:
-                linebreak_resources = resource.splitlines()
-                for lb_resource in linebreak_resources:
-                    resources.append(lb_resource)
-        else:
-            resources = [user_input.strip() for user_input in input_ids.splitlines()]
-    for input_id in resources:
-        if export_all is True:
-            logger.info(f'Beginning CONTLABELS export: EXPORT_ALL')
-            resource_export = asx.ASExport(input_id, repo_id, client,
-                                           output_dir=defaults["labels_export_default"]["_OUTPUT_DIR_"],
-                                           export_all=True)
-        else:
-            logger.info(f'Beginning CONTLABELS export: {resources}')
-            resource_export = asx.ASExport(input_id, repo_id, client,
-                                           output_dir=defaults["labels_export_default"]["_OUTPUT_DIR_"])
-        resource_export.fetch_results()
-        if resource_export.error is None:
-            logger.info(f'Exporting: {input_id}')
-            print("Exporting {}...".format(input_id), end='', flush=True)
-            resource_export.export_labels()
-            if resource_export.error is None:
-                export_counter = update_export_progress('Export CONTLABLES complete', resource_export.result, resources,
-                                                        export_counter, export_all, gui_window)
-            else:
-                export_counter = export_error(resource_export, 'CONTLABELS export error', export_counter, resources,
-                                              gui_window)
-        else:
-            export_counter = export_error(resource_export, 'CONTLABELS export error', export_counter, resources,
-                                          gui_window)
+        resources = [(input_id, repo_id, None) for input_id in split_input_ids(input_ids)]
+    logger.info(f'Beginning CONTLABELS export: {resources}')
+    export_counter = report_exports("labels", "CONTLABELS", resources, defaults, client, gui_window,
+                                    export_all=export_all)
     if export_all is False:
         trailing_line = 76 - len(f'Finished {str(export_counter)} exports') - (len(str(export_counter)) - 1)
         logger.info(f'Finished CONTLABELS exports: {export_counter}')
@@ -1650,10 +1712,10 @@ def get_contlabels(input_ids, defaults, repositories, client, values_simple, gui
 
 def get_all_contlabels(input_ids, defaults, repositories, client, gui_window):
     """
-        Iterates through resources set to Publish = True and sends them to get_contlabels() to fetch and export files.
+        Sends all published resources for the given repositories to report_exports().
 
         Args:
-            input_ids (dict): contains repository ASpace ID as key and all published resource IDs in a list as value.
+            input_ids (list): ASpace repository ID #s to export all published resources from
             defaults (dict): contains the data from defaults.json file, all data the user has specified as default
             repositories (dict): repositories as listed in the ArchivesSpace instance
             client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
@@ -1662,27 +1724,64 @@ def get_all_contlabels(input_ids, defaults, repositories, client, gui_window):
         Returns:
             None
         """
-    export_all_counter = 0
-    all_resources_counter = 0
-    for resource_uris in input_ids.values():
-        all_resources_counter += len(resource_uris)
-    for repo_id, resource_uris in input_ids.items():
-        for resource_uri in resource_uris:
-            gui_window.write_event_value('-EXPORT_PROGRESS-', (export_all_counter, all_resources_counter))
-            resource_json = client.get(f'/repositories/{str(repo_id)}/resources/{str(resource_uri)}').json()
-            if resource_json["publish"] is True:
-                get_contlabels(resource_uri, defaults, repositories, client, repo_id, gui_window, export_all=True)
-            else:
-                export_all_counter += -1
-                all_resources_counter += -1
-            export_all_counter += 1
-            gui_window.write_event_value('-EXPORT_PROGRESS-', (export_all_counter, all_resources_counter))
+    resources = get_published_resources(input_ids, client)
+    logger.info(f'Beginning CONTLABELS export: EXPORT_ALL')
+    export_all_counter = report_exports("labels", "CONTLABELS", resources, defaults, client, gui_window,
+                                        export_all=True, repo_ids=input_ids)
     trailing_line = 76 - len(f'Finished {str(export_all_counter)} exports') - (len(str(export_all_counter)) - 1)
     logger.info(f'Finished CONTLABELS exports: {export_all_counter}')
     print("\n" + "-" * 55 + "Finished {} exports".format(str(export_all_counter)) + "-" * trailing_line + "\n")
     gui_window.write_event_value('-CONTLABEL_THREAD-', (threading.current_thread().name,))
 
 
+def get_multi_exports(input_ids, export_formats, defaults, cleanup_options, repositories, client, values_simple,
+                      gui_window):
+    """
+    Sends the user input to export_pool.py to be found once and exported in each selected format.
+
+    Args:
+        input_ids (str): user inputs as gathered from the Resource Identifiers input box
+        export_formats (list): ead, marcxml, labels, and/or pdf - see MULTI_EXPORT_FORMATS
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        cleanup_options (list): options a user wants to run against an EAD.xml file after export to clean the file
+        repositories (dict): repositories as listed in the ArchivesSpace instance
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+        values_simple (dict): values as entered with the run_gui() function
+        gui_window (PySimpleGUI Object): is the GUI window for the app. See PySimpleGUI.org for more info
+
+    Returns:
+        None
+    """
+    repo_id = repositories[values_simple["_REPO_SELECT_"]]
+    resources = [(input_id, repo_id, None) for input_id in split_input_ids(input_ids)]
+    logger.info(f'Beginning {", ".join(export_formats)} export: {resources}')
+    export_counter = 0
+    total_exports = len(resources) * len(export_formats)
+    progress = exprogress.ProgressAggregator(
+        total_exports, lambda update: gui_window.write_event_value('-EXPORT_PROGRESS-', update))
+    progress.refresh()
+    print_each = total_exports <= PRINT_EACH_LIMIT
+    if print_each is False:
+        print(f'Exporting {total_exports} records. Only errors are printed here, every result is in the log file\n')
+    for input_id, export_format, resource_export, valid, results in expool.run_multi_exports(
+            export_formats, resources, client, defaults, cleanup_options=cleanup_options):
+        if export_format is None:  # the resource was not found, so none of its formats were exported
+            export_counter = report_export("Multiple formats", input_id, resource_export, valid, results,
+                                           export_counter, progress, print_each,
+                                           error_message="Multiple formats fetch results error",
+                                           export_count=len(export_formats))
+        else:
+            export_label = MULTI_EXPORT_FORMATS[export_format][1]
+            error_message = f'{export_label} export error' if resource_export.error is not None else None
+            export_counter = report_export(export_label, f'{export_label} {input_id}', resource_export, valid,
+                                           results, export_counter, progress, print_each, error_message)
+    progress.refresh(force=True)
+    trailing_line = 76 - len(f'Finished {str(export_counter)} exports') - (len(str(export_counter)) - 1)
+    logger.info(f'Finished multiple format exports: {export_counter}')
+    print("\n" + "-" * 55 + "Finished {} exports".format(str(export_counter)) + "-" * trailing_line + "\n")
+    gui_window.write_event_value('-MULTI_THREAD-', (threading.current_thread().name,))
+
+
 def upload_files_xtf(defaults, xtf_hostname, xtf_username, xtf_password, xtf_remote_path, xtf_index_path,
                      xtf_lazy_path, values_upl, gui_window):
     """
@@ -2053,6 +2152,23 @@ def sort_list(input_list):
     return sorted(input_list, key=alphanum_key)
 
 
+def start_index_refresh(client, repositories, full=False):
+    """
+    Refreshes the local identifier index in a background thread, so exports can find resources without searching.
+
+    Args:
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+        repositories (dict): repositories as listed in the ArchivesSpace instance
+        full (bool, optional): whether to re-index every resource instead of only those modified since the last refresh
+
+    Returns:
+        None
+    """
+    repo_ids = [repo_id for repo_id in repositories.values() if repo_id is not None]
+    index_thread = threading.Thread(target=idx.refresh_index, args=(client, repo_ids, full,), daemon=True)
+    index_thread.start()
+
+
 def start_thread(function, args, gui_window):
     """
     Starts a thread and disables buttons to prevent multiple requests/threads.
@@ -2076,6 +2192,7 @@ def start_thread(function, args, gui_window):
     gui_window[f'{"_EXPORT_ALLCONTLABELS_"}'].update(disabled=True)
     gui_window[f'{"_EXPORT_PDF_"}'].update(disabled=True)
     gui_window[f'{"_EXPORT_ALLPDFS_"}'].update(disabled=True)
+    gui_window[f'{"_EXPORT_MULTI_"}'].update(disabled=True)
 
 
 def delete_log_files():
@@ -2096,7 +2213,8 @@ def delete_log_files():
                 os.remove(logfile)
 
 
-def update_export_progress(export_message, results, resources, export_counter, export_all, gui_window, validity=None):
+def update_export_progress(export_message, results, resources, export_counter, gui_window, validity=None,
+                           print_results=True, post_progress=True):
     """
     Checks validity of XML files, otherwise updates export progress bar
 
@@ -2105,9 +2223,12 @@ def update_export_progress(export_message, results, resources, export_counter, e
         results (str): message of all cleanup functions completed if EAD, otherwise export completion result
         resources (list): resources being exported
         export_counter (int): number to keep track of exports completed
-        export_all (bool): if export_all is true, refer to export all function for counter and updating progress
         gui_window (PySimpleGUI object): the GUI window used by PySimpleGUI. Used to return an event
         validity (bool): if checking validity of EAD cleanup, checks whether XML is valid (True) or not (False)
+        print_results (bool): whether to print the results of a successful export or only log them. XML validation
+        errors are always printed
+        post_progress (bool): whether to send the progress bar an -EXPORT_PROGRESS- event, False if the caller's
+        ProgressAggregator updates it
 
     Returns
         export_counter (int): number to keep track of exports completed
@@ -2115,27 +2236,29 @@ def update_export_progress(export_message, results, resources, export_counter, e
     if validity is not None:
         if validity is True:
             logger.info(f'{export_message}: {results}')
-            print("Done")
-            print(results)
+            if print_results is True:
+                print("Done")
+                print(results)
             export_counter += 1
-            if export_all is False:
+            if post_progress is True:
                 gui_window.write_event_value('-EXPORT_PROGRESS-', (export_counter, len(resources)))
         else:
             logger.info(f'XML Validation Error: {results}')
             print("XML Validation Error\n" + results)
             export_counter += 1
-            if export_all is False:
+            if post_progress is True:
                 gui_window.write_event_value('-EXPORT_PROGRESS-', (export_counter, len(resources)))
     else:
         logger.info(f'{export_message}: {results}')
-        print(results + "\n")
+        if print_results is True:
+            print(results + "\n")
         export_counter += 1
-        if export_all is False:
+        if post_progress is True:
             gui_window.write_event_value('-EXPORT_PROGRESS-', (export_counter, len(resources)))
     return export_counter
 
 
-def export_error(resource_export, error_message, export_counter, resources, gui_window):
+def export_error(resource_export, error_message, export_counter, resources, gui_window, post_progress=True):
     """
     Prints export error message and updates progress bar
 
@@ -2145,6 +2268,8 @@ def export_error(resource_export, error_message, export_counter, resources, gui_
         export_counter (int): number to keep track of exports completed
         resources (list): resources being exported
         gui_window (PySimpleGUI object): the GUI window used by PySimpleGUI. Used to return an event
+        post_progress (bool): whether to send the progress bar an -EXPORT_PROGRESS- event, False if the caller's
+        ProgressAggregator updates it
 
     Returns
         export_counter (int): number to keep track of exports completed
@@ -2152,12 +2277,205 @@ def export_error(resource_export, error_message, export_counter, resources, gui_
     logger.info(f'{error_message}: {resource_export.error}')
     print(resource_export.error + "\n")
     export_counter += 1
-    gui_window.write_event_value('-EXPORT_PROGRESS-', (export_counter, len(resources)))
+    if post_progress is True:
+        gui_window.write_event_value('-EXPORT_PROGRESS-', (export_counter, len(resources)))
+    return export_counter
+
+
+def report_export(export_label, export_name, resource_export, valid, results, export_counter, progress, print_each,
+                  error_message=None, export_count=1):
+    """
+    Prints and logs one finished export of report_exports() or get_multi_exports() and advances their progress bar.
+
+    Args:
+        export_label (str): name of the record type used in messages and logs, ex. EAD
+        export_name (str): what the export is called in the "Exporting..." message, ex. the resource identifier
+        resource_export (ASExport instance): the finished export
+        valid (bool or None): if the EAD was cleaned, True if the XML was valid and False if not, otherwise None
+        results (str or None): cleanup results if the EAD was cleaned, otherwise None
+        export_counter (int): number to keep track of exports completed
+        progress (ProgressAggregator instance): the progress bar of the batch
+        print_each (bool): whether to print every result or only errors, see PRINT_EACH_LIMIT
+        error_message (str, optional): message the export's error is logged with, None if the export did not fail
+        export_count (int, optional): number of exports the result stands for, ex. every format of a resource that
+        was not found
+
+    Returns:
+        export_counter (int): number to keep track of exports completed
+    """
+    if error_message is not None:
+        export_counter = export_error(resource_export, error_message, export_counter, [], None, post_progress=False)
+        progress.advance(export_count, failed=True)
+        return export_counter + export_count - 1
+    print_results = print_each is True or valid is False
+    logger.info(f'Exporting: {export_name}')
+    if print_results is True:
+        print("Exporting {}...".format(export_name), end='', flush=True)
+    if valid is None:
+        export_counter = update_export_progress(f'{export_label} export complete', resource_export.result, [],
+                                                export_counter, None, print_results=print_results,
+                                                post_progress=False)
+    else:
+        logger.info(f'{export_label} export complete: {resource_export.result}')
+        logger.info(f'EAD cleaning up record {resource_export.filepath}')
+        if print_results is True:
+            print(resource_export.result + "\n")
+            print("Cleaning up EAD record...", end='', flush=True)
+        export_counter = update_export_progress('EAD cleanup complete', results, [], export_counter, None, valid,
+                                                print_results, post_progress=False)
+    progress.advance(export_count, bytes_written=resource_export.bytes_written, failed=valid is False)
+    return export_counter
+
+
+def split_input_ids(input_ids):
+    """
+    Splits the text from the Resource Identifiers input box into separate identifiers.
+
+    Args:
+        input_ids (str): user inputs as gathered from the Resource Identifiers input box, separated by commas or newlines
+
+    Returns:
+        resources (list): the user input identifiers with surrounding whitespace removed
+    """
+    resources = []
+    if "," in input_ids:
+        csep_resources = [user_input.strip() for user_input in input_ids.split(",")]
+        for resource in csep_resources:
+            linebreak_resources = resource.splitlines()
+            for lb_resource in linebreak_resources:
+                resources.append(lb_resource)
+    else:
+        resources = [user_input.strip() for user_input in input_ids.splitlines()]
+    return resources
+
+
+def get_published_resources(repo_ids, client):
+    """
+    Searches each repository for its published resources so export all runs only request what they will export.
+
+    Args:
+        repo_ids (list): ASpace repository ID #s to search
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+
+    Returns:
+        resources (list): tuples of (resource_id, repo_id, resource_json) for every published resource, see
+        as_export.fetch_published_resources()
+    """
+    resources = []
+    print("Searching for published resources...", end='', flush=True)
+    for repo_id in repo_ids:
+        resources.extend(asx.fetch_published_resources(client, repo_id))
+    print(f'{len(resources)} found\n')
+    return resources
+
+
+def report_exports(export_format, export_label, resources, defaults, client, gui_window, cleanup_options=None,
+                   export_all=False, repo_ids=None):
+    """
+    Sends resources to export_pool.py to be exported concurrently and prints each result as it finishes.
+
+    Export all runs go to as_async.py instead when _ASYNC_EXPORT_ALL_ is True in defaults.json. When
+    _INCREMENTAL_EXPORT_ALL_ is True, export all runs skip resources unchanged since their last export, as recorded in
+    export_manifest.json. When _RESUME_EXPORT_ALL_ is True, export all runs are journaled and a run that did not finish
+    is resumed, retrying only the resources that failed or were not reached.
+
+    An error that stops the run is logged and printed rather than raised, so the calling thread still sends its done
+    event, ex. -EAD_THREAD-, and the GUI's buttons are enabled again. A journaled run is left unfinished to be resumed.
+
+    Args:
+        export_format (str): ead, marcxml, pdf, or labels - see export_pool.EXPORT_FORMATS
+        export_label (str): name of the record type used in messages and logs, ex. EAD
+        resources (list): tuples of (input_id, repo_id, resource_json) to export, see export_pool.run_exports()
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+        gui_window (PySimpleGUI Object): is the GUI window for the app. See PySimpleGUI.org for more info
+        cleanup_options (list, optional): options a user wants to run against an EAD.xml file after export
+        export_all (bool, optional): whether resources contain ASpace resource id #s of all resources in a repository
+        repo_ids (list, optional): ASpace repository ID #s the user chose for an export all run, which its journal is
+        resumed by, see export_journal.ExportJournal.resume(). The repositories in resources if None
+
+    Returns:
+        export_counter (int): number of exports completed, not counting unpublished resources skipped in export all
+    """
+    export_counter = 0
+    if repo_ids is None:  # read before the manifest filters resources, which can leave a repository out
+        repo_ids = [repo_id for input_id, repo_id, resource_json in resources]
+    manifest, manifest_key = None, None
+    if export_all is True and defaults["performance_default"]["_INCREMENTAL_EXPORT_ALL_"] is True:
+        manifest = exmanifest.ExportManifest()
+        manifest_key = exmanifest.export_key(export_format, client, defaults, cleanup_options)
+        resources, unchanged_count = manifest.filter_changed(manifest_key, resources, client)
+        print(f'Skipping {unchanged_count} resource(s) unchanged since their last export\n')
+    journal = None
+    if export_all is True and defaults["performance_default"]["_RESUME_EXPORT_ALL_"] is True:
+        journal = exjournal.ExportJournal(export_format)
+        resources, done_count = journal.resume(resources, repo_ids)
+        if done_count:
+            print(f'Resuming the last {export_label} Export All, skipping {done_count} resource(s) already exported\n')
+    resource_jsons = {resource_json["uri"]: resource_json for input_id, repo_id, resource_json in resources
+                      if resource_json is not None}
+    progress = exprogress.ProgressAggregator(
+        len(resources), lambda update: gui_window.write_event_value('-EXPORT_PROGRESS-', update))
+    progress.refresh()
+    print_each = len(resources) <= PRINT_EACH_LIMIT
+    if print_each is False:
+        print(f'Exporting {len(resources)} resources. Only errors are printed here, every result is in the log file\n')
+    if export_all is True and defaults["performance_default"]["_ASYNC_EXPORT_ALL_"] is True:
+        import as_async as asasync  # aiohttp is only imported once an Export All uses it
+        finished_exports = asasync.run_exports(export_format, resources, client, defaults,
+                                               cleanup_options=cleanup_options)
+    else:
+        finished_exports = expool.run_exports(export_format, resources, client, defaults,
+                                              cleanup_options=cleanup_options, export_all=export_all)
+    try:
+        for input_id, resource_export, valid, results in finished_exports:
+            if resource_export is None:  # unpublished resource skipped by export all
+                progress.skip()
+            elif resource_export.resource_id is None or resource_export.error is not None:
+                if resource_export.resource_id is None:
+                    error_message = f'{export_label} fetch results error'
+                else:
+                    error_message = f'{export_label} export error'
+                export_counter = report_export(export_label, input_id, resource_export, valid, results,
+                                               export_counter, progress, print_each, error_message)
+                if journal is not None:
+                    journal.record_failed(resource_export.input_id, resource_export.repo_id, resource_export.error)
+            else:
+                if resource_export.search_result is not None:
+                    logger.info(f'Fetched results: {resource_export.search_result}')
+                    if print_each is True or valid is False:
+                        print(resource_export.search_result)
+                export_counter = report_export(export_label, input_id, resource_export, valid, results,
+                                               export_counter, progress, print_each)
+                resource_uri = f'/repositories/{resource_export.resource_repo}/resources/{resource_export.resource_id}'
+                if manifest is not None and valid is not False and resource_uri in resource_jsons:
+                    if valid is True:  # cleanup_eads() wrote the EAD to the output directory
+                        export_path = Path(defaults["ead_export_default"]["_OUTPUT_DIR_"],
+                                           Path(resource_export.filepath).name)
+                    else:
+                        export_path = resource_export.filepath
+                    manifest.record(manifest_key, resource_jsons[resource_uri], resource_export, export_path)
+                if journal is not None and valid is not False:
+                    journal.record_done(resource_export.input_id, resource_export.repo_id)
+                elif journal is not None:
+                    journal.record_failed(resource_export.input_id, resource_export.repo_id, results)
+    except Exception as e:
+        logger.error(f'{export_label} export run stopped: {e}')
+        print(f'{export_label} export run stopped: {e}\n')
+        journal = None  # not finished, so the next Export All resumes it
+    finally:
+        progress.refresh(force=True)
+        if manifest is not None:
+            manifest.save()
+    if journal is not None:
+        journal.finish()
     return export_counter
 
 
 # sg.theme_previewer()
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # lets the frozen executable start EAD cleanup processes, see cleanup_pool
+    configure_logging()
     logger.info(f'Version Info:\n{sg.get_versions()}')
     delete_log_files()
     run_gui(setup_files())
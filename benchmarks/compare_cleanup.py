@@ -0,0 +1,243 @@
+"""
+Checks that the fused cleanup in EADRecord.run_fused_cleanup() gives the same output as running each cleanup method on
+its own, and measures how much faster it is.
+
+Each EAD is cleaned both ways with the same cleanup options, and the cleaned XML, the results and everything printed
+are compared. EADs can be given as files or folders of exports, otherwise finding aids with the given number of
+components are generated, including the empty notes, extents and containers, barcodes, legacy ids and digital objects
+the cleanups change. With --streaming, the EADs cleaned by cleanup.stream_cleanup_ead() are also compared, after
+removing the whitespace between elements and putting namespace declarations where they are used, and streamed EADs that
+are not byte-identical are counted separately, as the formatting differences that keep streaming off by default. For
+example:
+
+    python benchmarks/compare_cleanup.py --components 50000
+    python benchmarks/compare_cleanup.py source_eads --subsets 20 --streaming
+"""
+import argparse
+import contextlib
+import difflib
+import io
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+"""pathlib.Path: the folder holding the program's modules"""
+sys.path.insert(0, str(REPO_DIR))
+
+from lxml import etree  # noqa: E402
+
+import cleanup as clean  # noqa: E402
+
+CLEANUP_OPTIONS = ["_ADD_EADID_", "_DEL_NOTES_", "_CLN_EXTENTS_", "_ADD_CERTAIN_", "_ADD_LABEL_", "_DEL_LANGTRAIL_",
+                   "_DEL_CONTAIN_", "_ADD_PHYSLOC_", "_DEL_ATIDS_", "_DEL_ARCHIDS_", "_CNT_XLINKS_", "_DEL_NMSPCS_",
+                   "_DEL_ALLNS_"]
+"""list: every cleanup option clean_suite() runs, in the order it runs them"""
+EAD_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<ead xmlns="urn:isbn:1-931666-22-9" ' \
+             'xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" ' \
+             'xsi:schemaLocation="urn:isbn:1-931666-22-9 http://www.loc.gov/ead/ead.xsd">'
+"""str: start of a generated EAD, with the <ead> declarations clean_do_dec() replaces"""
+
+
+def build_ead(components, seed=0):
+    """
+    Generates an EAD with the given number of components, each with a random mix of what the cleanups change.
+
+    Args:
+        components (int): number of <c> components in the <dsc>
+        seed (int, optional): seed of the random choices, so the same EAD can be generated again
+
+    Returns:
+        (bytes): the EAD
+    """
+    rng = random.Random(seed)
+    parts = [EAD_HEADER, '<eadheader><eadid/><filedesc><titlestmt><titleproper>Generated</titleproper></titlestmt>'
+             '</filedesc></eadheader><archdesc level="collection"><did>'
+             '<unitid type="Archivists Toolkit Database::RESOURCE">AT 1</unitid><unitid>ms 1</unitid>'
+             '<unittitle>Generated collection</unittitle><unitdate>circa 1900-1950</unitdate>'
+             '<physdesc><extent>(3 boxes)</extent><extent/></physdesc>'
+             '<langmaterial>Materials are in <language langcode="eng">English</language>.</langmaterial></did>'
+             '<scopecontent><head>Scope</head><p>Papers.</p><p/></scopecontent><dsc>']
+    for component in range(1, components + 1):
+        parts.append(f'<c id="aspace_{component}" level="file"><did><unittitle>Folder {component}</unittitle>')
+        if rng.random() < 0.6:
+            parts.append(f'<unitdate>{rng.choice(["circa 1920", "1931", "approximately 1940", "after 1950"])}'
+                         f'</unitdate>')
+        if rng.random() < 0.1:
+            parts.append(f'<unitid type="Archon Instance 1">{component}</unitid>')
+        if rng.random() < 0.05:
+            parts.append(f'<unitid type="Archivists Toolkit Database::ARCHIVAL_OBJECT">{component}</unitid>')
+        if rng.random() < 0.2:
+            parts.append(rng.choice(['<physdesc><extent>[1 folder]</extent></physdesc>',
+                                     '<physdesc><extent/></physdesc>',
+                                     '<physdesc><extent><emph>1</emph> folder</extent></physdesc>']))
+        for _ in range(rng.choice([0, 1, 1, 2])):
+            label = rng.choice([None, "Box", f'Box [3900{component:06d}]'])
+            label_attr = f' label="{label}"' if label else ""
+            parts.append(rng.choice([f'<container type="box"{label_attr}>{component}</container>',
+                                     f'<container type="folder"{label_attr}/>']))
+        if rng.random() < 0.1:
+            parts.append(f'<dao xlink:href="https://example.org/{component}" xlink:title="Image {component}" '
+                         f'xlink:type="simple"/>')
+        if rng.random() < 0.05:
+            parts.append('<langmaterial><language langcode="eng">English</language>, '
+                         '<language langcode="spa">Spanish</language>.</langmaterial>')
+        parts.append('</did>')
+        if rng.random() < 0.1:
+            parts.append(rng.choice(['<odd><p>Note.</p></odd>', '<odd><p/></odd>']))
+        parts.append('</c>')
+    parts.append('</dsc></archdesc></ead>')
+    return "".join(parts).encode("utf-8")
+
+
+def clean_once(ead_bytes, custom_clean, fused):
+    """
+    Parses and cleans an EAD the way cleanup_eads() does.
+
+    Args:
+        ead_bytes (bytes): the raw EAD
+        custom_clean (list): cleanup options
+        fused (bool): whether to run the cleanups in a single traversal
+
+    Returns:
+        clean_xml (bytes): the cleaned EAD
+        results (str): results of the cleanup
+        printed (str): everything the cleanup printed
+        seconds (float): seconds clean_suite() took
+    """
+    parser = etree.XMLParser(remove_blank_text=True, ns_clean=True)
+    ead = clean.EADRecord(etree.fromstring(ead_bytes, parser=parser))
+    printed = io.StringIO()
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(printed):
+        clean_xml, results = ead.clean_suite(ead, custom_clean, fused=fused)
+    return clean_xml, results, printed.getvalue(), time.perf_counter() - start_time
+
+
+def stream_once(ead_bytes, custom_clean):
+    """
+    Cleans an EAD with stream_cleanup_ead(), the way cleanup_eads() does for large EADs.
+
+    Args:
+        ead_bytes (bytes): the raw EAD
+        custom_clean (list): cleanup options
+
+    Returns:
+        clean_xml (bytes): the cleaned EAD
+        results (str): results of the cleanup
+        printed (str): everything the cleanup printed
+        seconds (float): seconds stream_cleanup_ead() took
+    """
+    printed = io.StringIO()
+    with tempfile.TemporaryDirectory() as work_dir:
+        raw_path, clean_path = str(Path(work_dir, "raw.xml")), str(Path(work_dir, "clean.xml"))
+        Path(raw_path).write_bytes(ead_bytes)
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(printed):
+            results = clean.stream_cleanup_ead(raw_path, custom_clean, clean_path)
+        seconds = time.perf_counter() - start_time
+        clean_xml = Path(clean_path).read_bytes()
+    return clean_xml, results, printed.getvalue(), seconds
+
+
+def canonical(xml_bytes):
+    """
+    Serializes an EAD as exclusive canonical XML without the whitespace between elements, so EADs with the same
+    content compare equal however they are indented and wherever their namespaces are declared.
+
+    Args:
+        xml_bytes (bytes): the EAD
+
+    Returns:
+        (str): the canonical EAD, one element per line
+    """
+    root = etree.fromstring(xml_bytes, parser=etree.XMLParser(remove_blank_text=True))
+    return etree.tostring(root, method="c14n", exclusive=True).decode("utf-8").replace("><", ">\n<")
+
+
+def compare(name, ead_bytes, custom_clean, streaming=False):
+    """
+    Cleans an EAD with and without the fused cleanup and reports any difference.
+
+    Args:
+        name (str): name of the EAD in the report
+        ead_bytes (bytes): the raw EAD
+        custom_clean (list): cleanup options
+        streaming (bool, optional): whether to also compare the EAD cleaned by stream_cleanup_ead()
+
+    Returns:
+        same (bool): True if the output, results and printed text were all the same
+        seconds (tuple): seconds the cleanup took one method at a time, fused, and streamed if streaming is True
+        identical (bool or None): if streaming is True, whether the streamed EAD was byte-identical, otherwise None
+    """
+    method_xml, method_results, method_printed, method_seconds = clean_once(ead_bytes, custom_clean, False)
+    fused_xml, fused_results, fused_printed, fused_seconds = clean_once(ead_bytes, custom_clean, True)
+    comparisons = [("fused XML", method_xml.decode("utf-8"), fused_xml.decode("utf-8")),
+                   ("fused results", method_results, fused_results),
+                   ("fused printed", method_printed, fused_printed)]
+    seconds = (method_seconds, fused_seconds)
+    identical = None
+    if streaming is True:
+        stream_xml, stream_results, stream_printed, stream_seconds = stream_once(ead_bytes, custom_clean)
+        comparisons += [("streamed XML", canonical(method_xml), canonical(stream_xml)),
+                        ("streamed results", method_results, stream_results),
+                        ("streamed printed", method_printed, stream_printed)]
+        seconds += (stream_seconds,)
+        identical = stream_xml == method_xml
+        if identical is False:
+            diff = difflib.unified_diff(method_xml.decode("utf-8").splitlines(),
+                                        stream_xml.decode("utf-8").splitlines(), "one at a time", "streamed",
+                                        lineterm="", n=0)
+            print(f'{name}: streamed XML is formatted differently with {" ".join(custom_clean)}')
+            print("\n".join(list(diff)[:10]))
+    same = True
+    for part, method_output, other_output in comparisons:
+        if method_output != other_output:
+            same = False
+            print(f'{name}: {part} differs with {" ".join(custom_clean)}')
+            diff = difflib.unified_diff(method_output.splitlines(), other_output.splitlines(), "one at a time",
+                                        part.split()[0], lineterm="", n=1)
+            print("\n".join(list(diff)[:40]))
+    return same, seconds, identical
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the fused cleanup with running each cleanup on its own.")
+    parser.add_argument("paths", nargs="*", help="EAD files or folders of them, EADs are generated if none are given")
+    parser.add_argument("--components", type=int, default=5000,
+                        help="components in each generated EAD, default: 5000")
+    parser.add_argument("--generated", type=int, default=3, help="EADs to generate, default: 3")
+    parser.add_argument("--subsets", type=int, default=10,
+                        help="random subsets of the cleanup options to also compare, default: 10")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated EADs and subsets, default: 0")
+    parser.add_argument("--streaming", action="store_true", help="also compare cleanup.stream_cleanup_ead()")
+    args = parser.parse_args(argv)
+    eads = []
+    for path in args.paths:
+        files = sorted(Path(path).glob("*.xml")) if Path(path).is_dir() else [Path(path)]
+        eads += [(str(file), file.read_bytes()) for file in files]
+    if not args.paths:
+        eads = [(f'generated_{seed}', build_ead(args.components, seed))
+                for seed in range(args.seed, args.seed + args.generated)]
+    rng = random.Random(args.seed)
+    option_sets = [CLEANUP_OPTIONS] + [[option] for option in CLEANUP_OPTIONS] + \
+                  [[option for option in CLEANUP_OPTIONS if rng.random() < 0.5] for _ in range(args.subsets)]
+    differences, formatting_differences = 0, 0
+    for name, ead_bytes in eads:
+        for custom_clean in option_sets:
+            same, seconds, identical = compare(name, ead_bytes, custom_clean, args.streaming)
+            differences += same is False
+            formatting_differences += identical is False
+            if custom_clean is CLEANUP_OPTIONS:
+                print(f'{name}: all options {seconds[0]:.3f}s one at a time, {seconds[1]:.3f}s fused '
+                      f'({seconds[0] / max(seconds[1], 1e-9):.1f}x)' +
+                      (f', {seconds[2]:.3f}s streamed' if args.streaming else ""))
+    print(f'Compared {len(eads)} EAD(s) with {len(option_sets)} option set(s) each, {differences} difference(s)' +
+          (f', {formatting_differences} streamed EAD(s) not byte-identical' if args.streaming else ""))
+    return 1 if differences else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Measures export throughput against the local ArchivesSpace stand-in in mock_aspace.py.
+
+Each export format is run through export_pool.run_exports() at each number of workers, exporting the same resources,
+and the resources exported per second and the p50 and p95 latency of a single resource are reported. A resource's
+latency is the time it spent in the search, export, write and cleanup stages, see export_timing.TIMING_STAGES. The
+program runs in a temporary folder, so nothing is written to the repository. For example:
+
+    python benchmarks/export_throughput.py --resources 200 --workers 1 4 8 --export-latency 0.1 --error-rate 0.02
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+"""pathlib.Path: the folder holding the program's modules"""
+sys.path.insert(0, str(REPO_DIR))
+
+from asnake.client import ASnakeClient  # noqa: E402
+
+import as_export as asx  # noqa: E402
+import as_transport as astransport  # noqa: E402
+import cleanup_pool as cpool  # noqa: E402
+import defaults_setup as dsetup  # noqa: E402
+import export_pool as expool  # noqa: E402
+import export_timing as extiming  # noqa: E402
+from as_logging import configure_logging, logger  # noqa: E402
+from mock_aspace import MockASpace  # noqa: E402
+
+FORMATS = ["ead", "marcxml", "pdf", "labels"]
+"""list: export formats measured by default, see export_pool.EXPORT_FORMATS"""
+WORKERS = [1, 4, 8, 16]
+"""list: numbers of workers measured by default"""
+
+
+def run_benchmark(export_format, resources, client, defaults, max_workers, export_all=False):
+    """
+    Exports resources once and measures the throughput and latency.
+
+    Args:
+        export_format (str): one of the keys in export_pool.EXPORT_FORMATS - ead, marcxml, pdf, or labels
+        resources (list): tuples of (input_id, repo_id, resource_json) to export, see export_pool.run_exports()
+        client (ASnake.client object): a client logged in to the mock API
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        max_workers (int): number of resources exported at the same time
+        export_all (bool, optional): whether resources are ASpace resource id #s from an export all search
+
+    Returns:
+        result (dict): the format, workers, resources exported, errors, seconds, resources_per_sec, and p50_ms and
+        p95_ms of a single resource's latency
+    """
+    latencies = []
+    errors = 0
+    start_time = time.perf_counter()
+    for input_id, resource_export, valid, results in expool.run_exports(export_format, resources, client, defaults,
+                                                                        export_all=export_all,
+                                                                        max_workers=max_workers):
+        if resource_export is None:  # unpublished resource skipped by export all
+            continue
+        if resource_export.error is not None or valid is False:
+            errors += 1
+        latencies.append(sum(resource_export.timings.values()))
+    seconds = time.perf_counter() - start_time
+    latencies.sort()
+    return {"format": export_format, "workers": max_workers, "resources": len(latencies), "errors": errors,
+            "seconds": round(seconds, 3), "resources_per_sec": round(len(latencies) / max(seconds, 1e-6), 2),
+            "p50_ms": round(extiming.percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(extiming.percentile(latencies, 95) * 1000, 1)}
+
+
+def print_results(results):
+    """
+    Prints a table of benchmark results.
+
+    Args:
+        results (list): results from run_benchmark()
+
+    Returns:
+        None
+    """
+    print(f'{"format":<9}{"workers":>8}{"resources":>11}{"errors":>8}{"res/sec":>10}{"p50 ms":>10}{"p95 ms":>10}')
+    for result in results:
+        print(f'{result["format"]:<9}{result["workers"]:>8}{result["resources"]:>11}{result["errors"]:>8}'
+              f'{result["resources_per_sec"]:>10.1f}{result["p50_ms"]:>10.1f}{result["p95_ms"]:>10.1f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure export throughput against a local mock ArchivesSpace.")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS,
+                        help=f'export formats to measure, default: {" ".join(FORMATS)}')
+    parser.add_argument("--workers", nargs="+", type=int, default=WORKERS,
+                        help=f'numbers of workers to measure, default: {" ".join(str(w) for w in WORKERS)}')
+    parser.add_argument("--resources", type=int, default=100, help="resources exported in each run, default: 100")
+    parser.add_argument("--export-all", action="store_true",
+                        help="export every published resource as Export All does, instead of searching identifiers")
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds every request waits, default: 0.01")
+    parser.add_argument("--export-latency", type=float, default=0.05,
+                        help="seconds export requests wait on top of --latency, default: 0.05")
+    parser.add_argument("--jitter", type=float, default=0.0, help="most seconds randomly added to each wait")
+    parser.add_argument("--payload-size", type=int, default=100 * 1024,
+                        help="approximate bytes of each EAD and PDF export, default: 102400")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of exports that fail, ex. 0.05")
+    parser.add_argument("--cleanup-processes", type=int, default=0,
+                        help="EADs cleaned at the same time, 0 for one per CPU core, default: 0")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir, \
+            MockASpace(resources=args.resources, latency=args.latency, export_latency=args.export_latency,
+                       jitter=args.jitter, payload_size=args.payload_size, error_rate=args.error_rate) as mock:
+        os.chdir(work_dir)
+        configure_logging()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # setup and cleanup print
+            defaults = dsetup.set_defaults_file()
+            defaults["performance_default"]["_MAX_WORKERS_"] = max(args.workers)
+            defaults["performance_default"]["_CLEANUP_PROCESSES_"] = args.cleanup_processes
+            client = ASnakeClient(baseurl=mock.url, username="benchmark", password="benchmark")
+            client.authorize()
+            astransport.configure_client(client, defaults)
+            if args.export_all is True:
+                resources = asx.fetch_published_resources(client, 2)
+            else:
+                resources = [(f'ms{resource_id}', 2, None) for resource_id in range(1, args.resources + 1)]
+            for export_format in args.formats:
+                for max_workers in args.workers:
+                    results.append(run_benchmark(export_format, resources, client, defaults, max_workers,
+                                                 args.export_all))
+        cpool.get_cleanup_pool(defaults).close()
+        logger.remove()  # closes the log file so the temporary folder can be removed
+        os.chdir(REPO_DIR)  # the temporary folder can't be removed while it is the working directory
+    print_results(results)
+    if json_path is not None:
+        with open(json_path, "w") as json_file:
+            json.dump({"settings": vars(args), "results": results}, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Measures how long it takes to import each module of the program from a cold interpreter.
+
+Each module is imported in a new Python process with -X importtime, so nothing is cached between runs, and the median
+of several runs is reported. Passing --baseline with a git revision measures the same modules in that revision too, so
+a change to startup time can be compared directly. For example:
+
+    python benchmarks/import_time.py --baseline HEAD~1
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+"""pathlib.Path: the folder holding the program's modules"""
+MODULES = ["as_export", "cleanup", "export_pool", "xtf_upload", "as_cli", "as_xtf_GUI"]
+"""list: modules measured by default, from the core library up to the GUI"""
+HEAVY_MODULES = ["PySimpleGUI", "asnake", "paramiko", "scp", "aiohttp", "lxml"]
+"""list: third-party packages reported when a module pulls them in on import"""
+
+
+def import_time(module, source_dir):
+    """
+    Imports a module in a new Python process and reads how long it took from -X importtime.
+
+    Args:
+        module (str): name of the module to import
+        source_dir (pathlib.Path or str): folder the module is imported from
+
+    Returns:
+        microseconds (int or None): cumulative import time of the module, None if it failed to import
+        loaded (list): the HEAVY_MODULES that were imported along with it
+    """
+    check = f'import sys, {module}; print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    with tempfile.TemporaryDirectory() as work_dir:  # keeps logs and defaults.json out of the repository
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", check], cwd=work_dir,
+                                 env=dict(os.environ, PYTHONPATH=str(source_dir), PYTHONDONTWRITEBYTECODE="1"),
+                                 capture_output=True, text=True)
+    if process.returncode != 0:
+        return None, []
+    microseconds = None
+    for line in process.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].rstrip() == f' {module}':  # top level entries are not indented
+            microseconds = int(fields[1])
+    loaded = [name for name in process.stdout.strip().split(",") if name]
+    return microseconds, loaded
+
+
+def measure(source_dir, modules, runs):
+    """
+    Measures each module's import time over several runs.
+
+    Args:
+        source_dir (pathlib.Path or str): folder the modules are imported from
+        modules (list): names of the modules to import
+        runs (int): number of times each module is imported
+
+    Returns:
+        results (dict): module name as key and a tuple of median milliseconds (or None) and the heavy modules it
+        loaded as value
+    """
+    results = {}
+    for module in modules:
+        timings, loaded = [], []
+        for run in range(runs):
+            microseconds, loaded = import_time(module, source_dir)
+            if microseconds is None:
+                break
+            timings.append(microseconds)
+        results[module] = (statistics.median(timings) / 1000 if timings else None, loaded)
+    return results
+
+
+def export_revision(revision, target_dir):
+    """
+    Writes the program's files at a git revision to a folder without touching the working tree.
+
+    Args:
+        revision (str): git revision to export, ex. HEAD~1 or a commit hash
+        target_dir (str): folder to write the files to
+
+    Returns:
+        None
+    """
+    archive_path = Path(target_dir, "revision.tar")
+    subprocess.run(["git", "archive", "--format=tar", "-o", str(archive_path), revision], cwd=REPO_DIR, check=True)
+    with tarfile.open(archive_path) as archive:
+        archive.extractall(target_dir)
+
+
+def print_results(results, baseline=None):
+    """
+    Prints a table of import times, with the baseline and the change from it when there is one.
+
+    Args:
+        results (dict): results from measure() for the working tree
+        baseline (dict, optional): results from measure() for the baseline revision
+
+    Returns:
+        None
+    """
+    header = f'{"module":<14}{"import ms":>11}'
+    if baseline is not None:
+        header += f'{"baseline ms":>13}{"change":>9}'
+    print(header + "  heavy modules loaded")
+    for module, (milliseconds, loaded) in results.items():
+        row = f'{module:<14}{"failed" if milliseconds is None else f"{milliseconds:.1f}":>11}'
+        if baseline is not None:
+            base_milliseconds = baseline[module][0]
+            row += f'{"failed" if base_milliseconds is None else f"{base_milliseconds:.1f}":>13}'
+            if milliseconds is not None and base_milliseconds:
+                row += f'{(milliseconds - base_milliseconds) / base_milliseconds:>+9.0%}'
+            else:
+                row += f'{"":>9}'
+        print(row + "  " + (", ".join(loaded) or "-"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import time of the program's modules.")
+    parser.add_argument("modules", nargs="*", default=MODULES, help=f'modules to import, default: {" ".join(MODULES)}')
+    parser.add_argument("--runs", type=int, default=5, help="imports per module, the median is reported")
+    parser.add_argument("--baseline", help="git revision to compare against, ex. HEAD~1")
+    args = parser.parse_args(argv)
+    results = measure(REPO_DIR, args.modules, args.runs)
+    baseline = None
+    if args.baseline is not None:
+        with tempfile.TemporaryDirectory() as baseline_dir:
+            export_revision(args.baseline, baseline_dir)
+            baseline = measure(baseline_dir, args.modules, args.runs)
+    print_results(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
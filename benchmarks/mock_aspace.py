@@ -0,0 +1,451 @@
+"""
+A local stand-in for the ArchivesSpace API, so exports can be measured without touching a real instance.
+
+It answers the endpoints the program uses - login, version, repositories, search, resources, resource_descriptions
+(.xml and .pdf), marc21 and resource_labels - for generated resources with identifiers ms1, ms2, ... in every
+repository. Latency, export sizes and error rates are configurable. It can be run on its own and pointed at from the
+GUI or as_cli.py, or started from a benchmark with MockASpace. For example:
+
+    python benchmarks/mock_aspace.py --port 8089 --resources 500 --latency 0.02 --export-latency 0.2 --error-rate 0.01
+
+Any username and password log in. Every 10th resource is unpublished.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SESSION_TOKEN = "mock-aspace-session"
+"""str: the session token every login returns"""
+SESSION_HEADER = "X-ArchivesSpace-Session"
+"""str: the header ASnake sends the session token in"""
+VERSION = "ArchivesSpace (v3.5.1)"
+"""str: body of the /version endpoint, parsed by get_aspace_log() in as_xtf_GUI.py"""
+SYSTEM_MTIME = "2024-01-01T00:00:00Z"
+"""str: last modified time of every generated resource"""
+CHUNK_SIZE = 64 * 1024
+"""int: bytes written to the socket at a time when sending an export"""
+EAD_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<ead xmlns="urn:isbn:1-931666-22-9" xmlns:xlink="http://www.w3.org/1999/xlink" \
+xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" \
+xsi:schemaLocation="urn:isbn:1-931666-22-9 http://www.loc.gov/ead/ead.xsd">
+<eadheader><eadid/><filedesc><titlestmt><titleproper>{title}</titleproper></titlestmt></filedesc></eadheader>
+<archdesc level="collection"><did><unitid>{identifier}</unitid>\
+<unitid type="Archivists Toolkit Database::RESOURCE">{resource_id}</unitid><unittitle>{title}</unittitle>\
+<unitdate>circa 1900-1950</unitdate><physdesc><extent>(5 linear feet)</extent><extent/></physdesc>\
+<langmaterial>English.</langmaterial></did><dsc>
+{components}</dsc></archdesc></ead>
+"""
+"""str: EAD returned by resource_descriptions .xml, with the parts cleanup_eads() changes"""
+EAD_COMPONENT = """<c01 id="aspace_{number}" level="file"><did><unittitle>Folder {number}</unittitle>\
+<unitdate>undated</unitdate><container type="box" label="Mixed Materials [39002042{number:06d}]">{box}</container>\
+<container type="folder">{number}</container><container type="folder"/>\
+<dao xlink:href="https://example.org/{number}" xlink:type="simple"/></did><p/></c01>
+"""
+"""str: one component of the EAD, repeated until the EAD reaches its size"""
+
+
+class MockASpace:
+    """
+    Serves generated ArchivesSpace data on a local port from a background thread.
+
+    Use it as a context manager, or call start() and stop(). Every request waits latency seconds, and export requests
+    wait export_latency more, as ArchivesSpace does while it generates an export. A share of export requests fail with
+    a 500 error, set by error_rate.
+    """
+    def __init__(self, host="127.0.0.1", port=0, repositories=1, resources=100, latency=0.0, export_latency=0.0,
+                 jitter=0.0, payload_size=100 * 1024, error_rate=0.0, seed=0):
+        """
+        Must contain nothing, every setting has a default.
+
+        Args:
+            host (str, optional): address to listen on
+            port (int, optional): port to listen on, any free port if 0
+            repositories (int, optional): number of repositories, with ids starting at 2 as in ArchivesSpace
+            resources (int, optional): number of resources in each repository
+            latency (float, optional): seconds every request waits before it is answered
+            export_latency (float, optional): seconds export requests wait on top of latency
+            jitter (float, optional): up to this many seconds are randomly added to each wait
+            payload_size (int, optional): approximate bytes of each EAD and PDF export, MARCXML and container labels
+            are a tenth of it
+            error_rate (float, optional): share of export requests answered with a 500 error, from 0 to 1
+            seed (int, optional): seed for the jitter and errors, so runs can be repeated
+        """
+        self.repositories = repositories
+        """int: number of repositories"""
+        self.resources = resources
+        """int: number of resources in each repository"""
+        self.latency = latency
+        """float: seconds every request waits"""
+        self.export_latency = export_latency
+        """float: seconds export requests wait on top of latency"""
+        self.jitter = jitter
+        """float: most seconds randomly added to each wait"""
+        self.payload_size = payload_size
+        """int: approximate bytes of each EAD and PDF export"""
+        self.error_rate = error_rate
+        """float: share of export requests answered with a 500 error"""
+        self.random = random.Random(seed)
+        """random.Random object: picks jitter and errors"""
+        self.lock = threading.Lock()
+        """threading.Lock object: keeps request threads from sharing self.random and self.requests at the same time"""
+        self.requests = {}
+        """dict: endpoint name as key and number of requests answered as value"""
+        self.server = ThreadingHTTPServer((host, port), MockASpaceHandler)
+        """http.server.ThreadingHTTPServer object: the server, answering each request on its own thread"""
+        self.server.daemon_threads = True
+        self.server.mock = self
+        self.thread = None
+        """threading.Thread object: the thread serving requests, None until started"""
+
+    @property
+    def url(self):
+        """str: base URL of the mock API, ex. http://127.0.0.1:8089"""
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """
+        Starts serving requests on a background thread.
+
+        Returns:
+            self (MockASpace instance): the started server
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock_aspace", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops serving requests and closes the port.
+
+        Returns:
+            None
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def wait(self, export=False):
+        """
+        Sleeps for the configured latency, plus export_latency for export requests, plus jitter.
+
+        Args:
+            export (bool, optional): whether the request is for an export
+
+        Returns:
+            None
+        """
+        with self.lock:
+            jitter = self.random.uniform(0, self.jitter) if self.jitter else 0.0
+        seconds = self.latency + (self.export_latency if export else 0.0) + jitter
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def fails(self):
+        """
+        Decides whether an export request fails.
+
+        Returns:
+            (bool): True for about error_rate of the calls
+        """
+        with self.lock:
+            return self.error_rate > 0 and self.random.random() < self.error_rate
+
+    def count(self, endpoint):
+        """
+        Counts a request to an endpoint.
+
+        Args:
+            endpoint (str): name of the endpoint, ex. search
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def resource(self, repo_id, resource_id):
+        """
+        Builds the JSON of a generated resource.
+
+        Args:
+            repo_id (int): repository id #
+            resource_id (int): resource id #
+
+        Returns:
+            resource (dict or None): the resource, None if it does not exist
+        """
+        if not 2 <= repo_id < 2 + self.repositories or not 1 <= resource_id <= self.resources:
+            return None
+        return {"uri": f'/repositories/{repo_id}/resources/{resource_id}', "jsonmodel_type": "resource",
+                "title": f'Papers {resource_id} of repository {repo_id}', "id_0": f'ms{resource_id}',
+                "publish": resource_id % 10 != 0, "system_mtime": SYSTEM_MTIME, "lock_version": 0,
+                "repository": {"ref": f'/repositories/{repo_id}'}}
+
+    def search(self, repo_ids, query, filter_queries):
+        """
+        Finds the generated resources matching a search, the way the program's four_part_id searches are written.
+
+        Args:
+            repo_ids (list): repository id #s searched
+            query (str): the q parameter - *, four_part_id:ms1, or four_part_id:("ms1" OR "ms2")
+            filter_queries (list): the filter_query parameters, publish:true is the only one applied
+
+        Returns:
+            results (list): the JSON of each matching resource
+        """
+        terms = None
+        if query.startswith("four_part_id:"):
+            terms = [re.sub(r'\W+', ' ', term).lower().split() for term in
+                     re.findall(r'"((?:[^"\\]|\\.)*)"', query) or [query.split(":", 1)[1]]]
+        results = []
+        for repo_id in repo_ids:
+            for resource_id in range(1, self.resources + 1):
+                resource = self.resource(repo_id, resource_id)
+                if "publish:true" in filter_queries and resource["publish"] is not True:
+                    continue
+                if terms is not None:  # like Solr, every word of a term has to be in the identifier
+                    words = re.sub(r'\W+', ' ', resource["id_0"]).lower().split()
+                    if not any(term and all(word in words for word in term) for term in terms):
+                        continue
+                results.append(resource)
+        return results
+
+    def ead(self, resource):
+        """
+        Builds the EAD export of a resource, about payload_size bytes long.
+
+        Args:
+            resource (dict): the resource's JSON
+
+        Returns:
+            (bytes): the EAD
+        """
+        resource_id = int(resource["uri"].split("/")[-1])
+        components = []
+        size = len(EAD_TEMPLATE)
+        number = 1
+        while size < self.payload_size:
+            component = EAD_COMPONENT.format(number=number, box=number // 20 + 1)
+            components.append(component)
+            size += len(component)
+            number += 1
+        return EAD_TEMPLATE.format(title=resource["title"], identifier=resource["id_0"], resource_id=resource_id,
+                                   components="".join(components)).encode()
+
+    def marcxml(self, resource):
+        """
+        Builds the MARCXML export of a resource, about a tenth of payload_size bytes long.
+
+        Args:
+            resource (dict): the resource's JSON
+
+        Returns:
+            (bytes): the MARCXML
+        """
+        record = '<?xml version="1.0" encoding="UTF-8"?>\n<collection xmlns="http://www.loc.gov/MARC21/slim">' \
+                 f'<record><datafield tag="245" ind1="1" ind2="0"><subfield code="a">{resource["title"]}</subfield>' \
+                 '</datafield>'
+        note = '<datafield tag="500" ind1=" " ind2=" "><subfield code="a">Note.</subfield></datafield>'
+        notes = max(0, (self.payload_size // 10 - len(record)) // len(note))
+        return (record + note * notes + '</record></collection>\n').encode()
+
+    def pdf(self, resource):
+        """
+        Builds a placeholder PDF export of a resource, payload_size bytes long.
+
+        Args:
+            resource (dict): the resource's JSON
+
+        Returns:
+            (bytes): the PDF
+        """
+        header = f'%PDF-1.4\n% {resource["title"]}\n'.encode()
+        return header + b"0" * max(0, self.payload_size - len(header) - 6) + b"\n%%EOF"
+
+    def labels(self, resource):
+        """
+        Builds the container labels export of a resource, about a tenth of payload_size bytes long.
+
+        Args:
+            resource (dict): the resource's JSON
+
+        Returns:
+            (bytes): the tab separated labels
+        """
+        rows = ["Repository Name\tResource Title\tResource Identifier\tTop Container Indicator"]
+        size = len(rows[0])
+        box = 1
+        while size < self.payload_size // 10:
+            rows.append(f'Repository\t{resource["title"]}\t{resource["id_0"]}\t{box}')
+            size += len(rows[-1]) + 1
+            box += 1
+        return ("\n".join(rows) + "\n").encode()
+
+
+class MockASpaceHandler(BaseHTTPRequestHandler):
+    """Answers one request to a MockASpace server."""
+    protocol_version = "HTTP/1.1"  # keeps connections alive, as ArchivesSpace behind a proxy does
+    disable_nagle_algorithm = True  # small responses would otherwise wait on delayed ACKs, adding 40ms each
+
+    def log_message(self, format, *args):
+        pass  # benchmarks would spend their time printing every request
+
+    def send_body(self, status, body, content_type="application/json"):
+        """
+        Sends a response, in chunks if it is large.
+
+        Args:
+            status (int): HTTP status code
+            body (bytes, str, dict or list): the body, dicts and lists are sent as JSON
+            content_type (str, optional): the Content-Type header
+
+        Returns:
+            None
+        """
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        for start in range(0, len(body), CHUNK_SIZE):
+            self.wfile.write(body[start:start + CHUNK_SIZE])
+
+    def do_POST(self):
+        mock = self.server.mock
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if re.fullmatch(r'/users/[^/]+/login', urlsplit(self.path).path):
+            mock.count("login")
+            mock.wait()
+            self.send_body(200, {"session": SESSION_TOKEN, "user": {"username": "mock"}})
+        else:
+            self.send_body(404, {"error": "Not found"})
+
+    def do_GET(self):
+        mock = self.server.mock
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/")
+        params = {key.replace("[]", ""): values for key, values in parse_qs(url.query).items()}
+        if path == "/version":
+            mock.count("version")
+            mock.wait()
+            return self.send_body(200, VERSION, "text/plain")
+        if self.headers.get(SESSION_HEADER) != SESSION_TOKEN:
+            return self.send_body(412, {"error": {"code": "SESSION_GONE", "description": "No session found"}})
+        if path == "/repositories":
+            mock.count("repositories")
+            mock.wait()
+            return self.send_body(200, [{"uri": f'/repositories/{repo_id}', "name": f'Repository {repo_id}',
+                                         "repo_code": f'REPO{repo_id}'}
+                                        for repo_id in range(2, 2 + mock.repositories)])
+        match = re.fullmatch(r'(?:/repositories/(\d+))?/search', path)
+        if match:
+            mock.count("search")
+            mock.wait()
+            return self.search(match.group(1), params)
+        match = re.fullmatch(r'/repositories/(\d+)/resources', path)
+        if match and [value.lower() for value in params.get("all_ids", [])] == ["true"]:
+            mock.count("resources")
+            mock.wait()
+            resource_ids = range(1, mock.resources + 1) if 2 <= int(match.group(1)) < 2 + mock.repositories else []
+            return self.send_body(200, list(resource_ids))
+        match = re.fullmatch(r'/repositories/(\d+)/resources/(\d+)', path)
+        if match:
+            mock.count("resources")
+            mock.wait()
+            resource = mock.resource(int(match.group(1)), int(match.group(2)))
+            if resource is None:
+                return self.send_body(404, {"error": "Resource not found"})
+            return self.send_body(200, resource)
+        exports = [(r'/repositories/(\d+)/resource_descriptions/(\d+)\.xml', "ead", mock.ead, "application/xml"),
+                   (r'/repositories/(\d+)/resource_descriptions/(\d+)\.pdf', "pdf", mock.pdf, "application/pdf"),
+                   (r'/repositories/(\d+)/resources/marc21/(\d+)\.xml', "marcxml", mock.marcxml, "application/xml"),
+                   (r'/repositories/(\d+)/resource_labels/(\d+)\.tsv', "labels", mock.labels,
+                    "text/tab-separated-values")]
+        for pattern, endpoint, build_export, content_type in exports:
+            match = re.fullmatch(pattern, path)
+            if match:
+                mock.count(endpoint)
+                mock.wait(export=True)
+                resource = mock.resource(int(match.group(1)), int(match.group(2)))
+                if resource is None:
+                    return self.send_body(404, {"error": "Resource not found"})
+                if mock.fails():
+                    return self.send_body(500, {"error": "Simulated server error"})
+                return self.send_body(200, build_export(resource), content_type)
+        self.send_body(404, {"error": "Not found"})
+
+    def search(self, repo_id, params):
+        """
+        Sends one page of search results.
+
+        Args:
+            repo_id (str or None): repository id # from the URL, None for a search across repositories
+            params (dict): the query parameters
+
+        Returns:
+            None
+        """
+        mock = self.server.mock
+        repo_ids = [int(repo_id)] if repo_id is not None else list(range(2, 2 + mock.repositories))
+        results = mock.search(repo_ids, params.get("q", ["*"])[0], params.get("filter_query", []))
+        if "resource" not in params.get("type", ["resource"]):  # only resources are generated, no archival objects
+            results = []
+        page = int(params.get("page", ["1"])[0])
+        page_size = int(params.get("page_size", ["10"])[0])
+        fields = params.get("fields")
+        documents = []
+        for resource in results[(page - 1) * page_size:page * page_size]:
+            document = {"uri": resource["uri"], "title": resource["title"], "identifier": resource["id_0"],
+                        "publish": resource["publish"], "system_mtime": resource["system_mtime"],
+                        "lock_version": resource["lock_version"], "primary_type": "resource",
+                        "json": json.dumps(resource)}
+            if fields:
+                document = {field: value for field, value in document.items() if field in fields}
+            documents.append(document)
+        self.send_body(200, {"first_page": 1, "last_page": max(1, -(-len(results) // page_size)), "this_page": page,
+                             "offset_first": (page - 1) * page_size + 1, "total_hits": len(results),
+                             "results": documents})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the ArchivesSpace API.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on, default: 127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089, help="port to listen on, default: 8089")
+    parser.add_argument("--repositories", type=int, default=1, help="number of repositories, default: 1")
+    parser.add_argument("--resources", type=int, default=100, help="resources in each repository, default: 100")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds every request waits, default: 0")
+    parser.add_argument("--export-latency", type=float, default=0.0,
+                        help="seconds export requests wait on top of --latency, default: 0")
+    parser.add_argument("--jitter", type=float, default=0.0, help="most seconds randomly added to each wait")
+    parser.add_argument("--payload-size", type=int, default=100 * 1024,
+                        help="approximate bytes of each EAD and PDF export, default: 102400")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of exports that fail, ex. 0.05")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the jitter and errors")
+    args = parser.parse_args(argv)
+    mock = MockASpace(args.host, args.port, args.repositories, args.resources, args.latency, args.export_latency,
+                      args.jitter, args.payload_size, args.error_rate, args.seed)
+    print(f'Mock ArchivesSpace API at {mock.url}, press Ctrl+C to stop')
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
+import copy
 import os
 import re
 import time
-
-from as_xtf_GUI import logger
 from pathlib import Path
-from lxml import etree
+
+import export_archive as exarchive
+from as_logging import logger
 
 extent_regex = re.compile(r"(^\W)")
 unitdate_regex = re.compile(r"\bunitdate\b")
@@ -12,6 +13,18 @@ barcode_regex = re.compile(r"\[(.*?)\]")
 atid_regex = re.compile(r"Archivists Toolkit Database")
 archon_regex = re.compile(r"Archon Instance")
 dao_regex = re.compile(r"(\bdao\b)")
+STREAM_MIN_MB = 0
+"""int: size in MB of raw EADs cleaned by stream_cleanup_ead() if _STREAM_CLEANUP_MB_ is missing from defaults.json, 0
+to never stream, as the streamed EAD is formatted differently from the one clean_suite() writes"""
+FRAME_TAGS = {"archdesc", "dsc", "c"} | {f'c{level:02d}' for level in range(1, 13)}
+"""set: local names of the elements stream_cleanup_ead() writes as they open and close - the collection description,
+its container list and components. Every other element under them is cleaned and written whole."""
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+"""str: first line of every cleaned EAD"""
+XLINK_NS = "{http://www.w3.org/1999/xlink}"
+"""str: start of the names of xlink attributes, ex. xlink:href in <dao>"""
+XML_NS = "{http://www.w3.org/XML/1998/namespace}"
+"""str: start of the names of xml: attributes, ex. xml:lang, which keep their prefix when namespaces are removed"""
 
 
 @logger.catch
@@ -21,6 +34,18 @@ class EADRecord:
     """
     cert_attrib = ["circa", "ca.", "c", "approximately", "probably", "c.", "between", "after"]
     extent_chars = ["(", ")", "[", "]", "{", "}"]
+    fused_steps = {"_DEL_NOTES_": (lambda tag: tag == '{urn:isbn:1-931666-22-9}p', "fuse_empty_note"),
+                   "_CLN_EXTENTS_": (lambda tag: "extent" in tag, "fuse_extent"),
+                   "_ADD_CERTAIN_": (lambda tag: unitdate_regex.search(tag) is not None, "fuse_certainty_attr"),
+                   "_ADD_LABEL_": (lambda tag: "container" in tag, "fuse_label_attr"),
+                   "_DEL_LANGTRAIL_": (lambda tag: "langmaterial" in tag, "fuse_langmaterial"),
+                   "_DEL_CONTAIN_": (lambda tag: "container" in tag, "fuse_empty_container"),
+                   "_ADD_PHYSLOC_": (lambda tag: "container" in tag, "fuse_barcode"),
+                   "_DEL_ATIDS_": (lambda tag: "unitid" in tag, "fuse_at_leftover"),
+                   "_DEL_ARCHIDS_": (lambda tag: "unitid" in tag, "fuse_archon_id"),
+                   "_CNT_XLINKS_": (lambda tag: dao_regex.search(tag) is not None, "fuse_xlink_count")}
+    """dict: custom_clean key as key and (tag matcher, EADRecord method) as value for each cleanup run_fused_cleanup()
+    applies, in the order clean_suite() runs them"""
 
     def __init__(self, file_root):
         """
@@ -38,14 +63,19 @@ class EADRecord:
         self.daos = False
         """bool: determines whether there are digital objects in a record"""
 
-    def add_eadid(self):
+    def add_eadid(self, did=None):
         """
         Takes the resource identifier as listed in ArchivesSpace and copies it to the element in the EAD.xml file.
+
+        Args:
+            did (lxml.Element object, optional): the <did> holding the identifier, the first child of the second child
+            of the root if None
+
         Returns:
             None
         """
         if self.eadid is None:
-            for child in self.root[1][0]:
+            for child in (did if did is not None else self.root[1][0]):
                 if "unitid" in str(child.tag):
                     if "type" in child.attrib:
                         if "Archivists Toolkit Database::RESOURCE" != child.attrib["type"]:
@@ -208,6 +238,7 @@ class EADRecord:
         Returns:
             None
         """
+        from lxml import etree
         count1_barcodes = 0
         count2_barcodes = 0
         for child in self.root.iter():
@@ -295,12 +326,16 @@ class EADRecord:
               f"prefaces in attributes")
         # self.results += "We found " + str(count1_xlink) + " digital objects in " + str(self.eadid) + " and there are "
         #                 + str(count2_xlink) + " xlink prefaces in attributes\n"
-        ead_string = etree.tostring(self.root, encoding="unicode", pretty_print=True,
-                                    doctype='<?xml version="1.0" encoding="UTF-8" standalone="yes"?>')
-        if "xlink" in ead_string:  # remove xlink prefixes if found in EAD.xml file
-            del_xlink_attrib = ead_string.replace('xlink:', '')
-            clean_xlinks = del_xlink_attrib.encode(encoding="UTF-8")
-            self.root = etree.fromstring(clean_xlinks)
+        self.strip_xlink_prefixes()
+
+    def strip_xlink_prefixes(self):
+        """
+        Removes xlink: prefixes from the whole EAD.xml file in place, see normalize_namespaces().
+
+        Returns:
+            None
+        """
+        normalize_namespaces(self.root, strip_xlinks=True)
 
     def clean_unused_ns(self):
         """
@@ -309,87 +344,407 @@ class EADRecord:
         Returns:
             None
         """
-        # objectify.deannotate(self.root, cleanup_namespaces=True) # doesn't work
-        for element in self.root.getiterator():
-            element.tag = etree.QName(element).localname
-        etree.cleanup_namespaces(self.root)  # https://lxml.de/api/lxml.etree-module.html#cleanup_namespaces
+        normalize_namespaces(self.root, local_names=True)  # lxml.etree.cleanup_namespaces() removes the unused ones
 
     def clean_do_dec(self):
         """
-        Replaces other namespaces not removed by clean_unused_ns() in the <ead> element with an empty <ead> element.
+        Replaces other namespaces not removed by clean_unused_ns() in the <ead> element with an empty <ead> element,
+        whatever order its declarations and attributes are in, and removes the namespaces left on other elements.
 
         Returns:
-            None
+            clean_xml (bytes): the EAD serialized with its doctype
         """
+        from lxml import etree
+        self.clean_namespaces(["_DEL_ALLNS_"])
         ead_string = etree.tostring(self.root, encoding="unicode", pretty_print=True,
                                     doctype='<?xml version="1.0" encoding="UTF-8" standalone="yes"?>')  # encoding="unicode" allows non-byte string to be made
-        if "xlink" in ead_string:
-            del_xlink_attrib = ead_string.replace('xlink:', '')
-            if del_xlink_attrib.find('audience="internal"', 0, 62) != -1:  # check if audience="internal" at beginning of <ead>
-                xml_string = del_xlink_attrib.replace(
-                    '<ead audience="internal" xmlns="urn:isbn:1-931666-22-9" xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="urn:isbn:1-931666-22-9 http://www.loc.gov/ead/ead.xsd">',
-                    '<ead>')
-            elif 'audience="internal"' in del_xlink_attrib:
-                xml_string = del_xlink_attrib.replace(
-                    '<ead xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" audience="internal" xsi:schemaLocation="urn:isbn:1-931666-22-9 http://www.loc.gov/ead/ead.xsd">',
-                    '<ead>')
-            else:
-                xml_string = del_xlink_attrib.replace(
-                    '<ead xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="urn:isbn:1-931666-22-9 http://www.loc.gov/ead/ead.xsd">',
-                    '<ead>')
-        else:
-            if 'audience="internal"' in ead_string:
-                xml_string = ead_string.replace(
-                    '<ead xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" audience="internal" xsi:schemaLocation="urn:isbn:1-931666-22-9 http://www.loc.gov/ead/ead.xsd">',
-                    '<ead>')
-            else:
-                xml_string = ead_string.replace(
-                    '<ead xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="urn:isbn:1-931666-22-9 http://www.loc.gov/ead/ead.xsd">',
-                    '<ead>')
-        clean_xml = xml_string.encode(encoding="UTF-8")
+        clean_xml = ead_string.encode(encoding="UTF-8")
         return clean_xml
 
-    def clean_suite(self, ead, custom_clean):
+    def clean_namespaces(self, custom_clean):
+        """
+        Runs the namespace cleanups selected in custom_clean - removing xlink: prefixes for count_xlinks(),
+        clean_unused_ns() and clean_do_dec() - together in a single pass of normalize_namespaces().
+
+        Args:
+            custom_clean (list): keys used to determine what cleanup methods to run
+
+        Returns:
+            None
+        """
+        if "_DEL_ALLNS_" in custom_clean:
+            self.root.attrib.clear()  # the <ead> start tag becomes an empty <ead>
+        normalize_namespaces(self.root, "_CNT_XLINKS_" in custom_clean, "_DEL_NMSPCS_" in custom_clean,
+                             "_DEL_ALLNS_" in custom_clean)
+
+    def run_fused_cleanup(self, custom_clean):
+        """
+        Runs the cleanups in fused_steps selected in custom_clean in a single traversal of the tree.
+
+        Each element is looked up in a dispatch table of its tag to the selected cleanups that match it, built the first
+        time the tag is seen, and those cleanups run on it in clean_suite() order. The result is the same as running
+        each cleanup method one after another: deleted elements stay in the tree until the traversal ends, and are
+        only hidden from the cleanups that run after the one that deleted them. A cleanup that deletes an element with
+        children stops after walking those children, as the root.iter() loops of the cleanup methods do. Trailing
+        periods are stripped from <langmaterial> once every child has been seen. Printed counts are the same as the
+        cleanup methods print, in the same order. The namespace cleanups run afterwards, in clean_namespaces().
+
+        Args:
+            custom_clean (list): keys used to determine what cleanup methods to run
+
+        Returns:
+            None
+        """
+        if self.start_fused_cleanup(custom_clean) is False:
+            return
+        self.fuse_subtree(self.root)
+        self.print_fused_counts()
+
+    def start_fused_cleanup(self, custom_clean):
+        """
+        Sets up the counts and dispatch table of the fused cleanups selected in custom_clean, for fuse_subtree().
+
+        Args:
+            custom_clean (list): keys used to determine what cleanup methods to run
+
+        Returns:
+            (bool): True if any cleanup in fused_steps was selected
+        """
+        steps = [key for key in EADRecord.fused_steps if key in custom_clean]
+        self.fused_order = steps
+        """list: custom_clean keys of the fused cleanups, in the order they run"""
+        self.fused_counts = {key: [0, 0, 0] for key in steps}
+        """dict: custom_clean key as key and the counts each fused cleanup prints as value"""
+        self.fused_dispatch = {}
+        """dict: tag as key and a list of (step index, custom_clean key, method) of the cleanups matching it as value"""
+        self.fused_stopped = set()
+        """set: step indexes that walked the children of an element they deleted and stopped, as the root.iter() loop
+        of their cleanup method does"""
+        return bool(steps)
+
+    def fuse_subtree(self, subtree):
+        """
+        Applies the fused cleanups to every element of a subtree, in one traversal. run_fused_cleanup() passes the
+        whole tree, while stream_cleanup_ead() passes each part of the EAD as it is parsed, in document order.
+
+        Args:
+            subtree (lxml.Element object): the root or a part of the EAD, whose parent is never deleted
+
+        Returns:
+            None
+        """
+        from lxml import etree
+        steps = self.fused_order
+        not_deleted = len(steps)
+        self.fused_langmaterials = []
+        self.fused_added = set()
+        deleted_by = {}  # element as key and index of the first step that deleted it or an ancestor as value
+        walking_deleted = {}  # step index as key and the element with children it deleted, whose children it walks
+        deletions = []
+        for element in list(subtree.iter(etree.Element)):  # physloc elements added while traversing are not visited
+            handlers = self.fused_dispatch.get(element.tag)
+            if handlers is None:
+                handlers = self.fused_dispatch[element.tag] = [
+                    (index, key, getattr(self, EADRecord.fused_steps[key][1])) for index, key in enumerate(steps)
+                    if EADRecord.fused_steps[key][0](element.tag)]
+            parent = element.getparent()
+            element_deleted = deleted_by.get(parent, not_deleted) if parent is not None else not_deleted
+            for index, key, handler in handlers:
+                if element_deleted < index or index in self.fused_stopped:
+                    continue
+                if index in walking_deleted:
+                    if walking_deleted[index] not in element.iterancestors():
+                        del walking_deleted[index]
+                        self.fused_stopped.add(index)
+                        continue
+                if handler(element, self.fused_counts[key]) is True:
+                    deletions.append(element)
+                    element_deleted = min(element_deleted, index)
+                    if len(element):
+                        walking_deleted[index] = element
+            if element_deleted < not_deleted:
+                deleted_by[element] = element_deleted
+        self.fused_stopped.update(walking_deleted)  # everything after the subtree is outside the deleted element
+        if "_DEL_LANGTRAIL_" in steps:
+            langtrail_index = steps.index("_DEL_LANGTRAIL_")
+            for langmaterial in self.fused_langmaterials:
+                children = [child for child in langmaterial if deleted_by.get(child, not_deleted) >= langtrail_index
+                            and child not in self.fused_added]
+                if children:
+                    children[-1].tail = None
+                    self.fused_counts["_DEL_LANGTRAIL_"][0] += 1
+        for element in deletions:
+            element.getparent().remove(element)
+
+    def print_fused_counts(self):
+        """
+        Prints what run_fused_cleanup() found and adds the results of deleted containers, the same as each cleanup
+        method does when run on its own.
+
+        Returns:
+            None
+        """
+        counts = self.fused_counts
+        if "_DEL_NOTES_" in counts:
+            print(f"Found {str(counts['_DEL_NOTES_'][0])} <p>'s in {str(self.eadid)} and removed "
+                  f"{str(counts['_DEL_NOTES_'][1])} empty notes")
+        if "_CLN_EXTENTS_" in counts:
+            print(f"Found {str(counts['_CLN_EXTENTS_'][0])} <extent>'s in {str(self.eadid)} and removed "
+                  f"{str(counts['_CLN_EXTENTS_'][1])} empty extents and corrected {str(counts['_CLN_EXTENTS_'][2])} "
+                  f"extent descriptions starting with (), [], or {{}}")
+        if "_ADD_CERTAIN_" in counts:
+            print(f"Found {str(counts['_ADD_CERTAIN_'][0])} unitdates in {str(self.eadid)} and set "
+                  f"{str(counts['_ADD_CERTAIN_'][1])} certainty attributes")
+        if "_ADD_LABEL_" in counts:
+            print(f"Found {str(counts['_ADD_LABEL_'][1])} containers in {str(self.eadid)} and set "
+                  f"{str(counts['_ADD_LABEL_'][0])} label attributes")
+        if "_DEL_LANGTRAIL_" in counts:
+            for _ in range(counts["_DEL_LANGTRAIL_"][0]):
+                print("Removed trailing period and whitespace from <langmaterial>")
+        if "_DEL_CONTAIN_" in counts:
+            self.results += "Found empty container, deleting...Removed empty container\n" * counts["_DEL_CONTAIN_"][1]
+            print(f"Found {str(counts['_DEL_CONTAIN_'][0])} <container>'s in {str(self.eadid)} and removed "
+                  f"{str(counts['_DEL_CONTAIN_'][1])} empty containers")
+        if "_ADD_PHYSLOC_" in counts:
+            print(f"Found {str(counts['_ADD_PHYSLOC_'][0])} <container labels>'s in {str(self.eadid)} and added "
+                  f"{str(counts['_ADD_PHYSLOC_'][1])} barcodes in the physloc tag")
+        if "_DEL_ATIDS_" in counts:
+            print(f"Found {str(counts['_DEL_ATIDS_'][0])} unitids in {str(self.eadid)} and removed "
+                  f"{str(counts['_DEL_ATIDS_'][1])} Archivists Toolkit legacy ids")
+        if "_DEL_ARCHIDS_" in counts:
+            print(f"Found {str(counts['_DEL_ARCHIDS_'][0])} unitids in {str(self.eadid)} and removed "
+                  f"{str(counts['_DEL_ARCHIDS_'][1])} Archon legacy ids")
+        if "_CNT_XLINKS_" in counts:
+            print(f"Found {str(counts['_CNT_XLINKS_'][0])} digital objects in {str(self.eadid)} and there are "
+                  f"{str(counts['_CNT_XLINKS_'][1])} xlink prefaces in attributes")
+
+    def fuse_empty_note(self, element, counts):
+        """
+        The delete_empty_notes() step of run_fused_cleanup(), for one <p> element.
+
+        Args:
+            element (lxml.Element object): the <p> element
+            counts (list): the step's counts - <p>'s found and empty notes removed
+
+        Returns:
+            (bool): True if the element is deleted
+        """
+        counts[0] += 1
+        if element.text is None and list(element) is None:
+            counts[1] += 1
+            return True
+        return False
+
+    def fuse_extent(self, element, counts):
+        """
+        The edit_extents() step of run_fused_cleanup(), for one <extent> element.
+
+        Args:
+            element (lxml.Element object): the <extent> element
+            counts (list): the step's counts - extents found, empty extents removed and descriptions corrected
+
+        Returns:
+            (bool): True if the element is deleted
+        """
+        counts[0] += 1
+        if element.text is not None:
+            if extent_regex.match(element.text):
+                counts[2] += 1
+            return False
+        counts[1] += 1
+        return True
+
+    def fuse_certainty_attr(self, element, counts):
+        """
+        The add_certainty_attr() step of run_fused_cleanup(), for one <unitdate> element.
+
+        Args:
+            element (lxml.Element object): the <unitdate> element
+            counts (list): the step's counts - unitdates found and certainty attributes set
+
+        Returns:
+            (bool): False, the element is never deleted
+        """
+        counts[0] += 1
+        for date in element.text.split():
+            if date in EADRecord.cert_attrib:
+                element.set("certainty", "approximate")
+                counts[1] += 1
+        return False
+
+    def fuse_label_attr(self, element, counts):
+        """
+        The add_label_attr() step of run_fused_cleanup(), for one <container> element.
+
+        Args:
+            element (lxml.Element object): the <container> element
+            counts (list): the step's counts - label attributes set and containers found
+
+        Returns:
+            (bool): False, the element is never deleted
+        """
+        if "label" not in element.attrib:
+            element.attrib["label"] = "Mixed Materials"
+            counts[0] += 1
+        counts[1] += 1
+        return False
+
+    def fuse_langmaterial(self, element, counts):
+        """
+        The strip_langmaterial() step of run_fused_cleanup(), for one <langmaterial> element. Its last child is only
+        known once the traversal has seen every child, so the element is kept for run_fused_cleanup() to strip after.
+
+        Args:
+            element (lxml.Element object): the <langmaterial> element
+            counts (list): the step's counts - trailing periods removed
+
+        Returns:
+            (bool): False, the element is never deleted
+        """
+        self.fused_langmaterials.append(element)
+        return False
+
+    def fuse_empty_container(self, element, counts):
+        """
+        The delete_empty_containers() step of run_fused_cleanup(), for one <container> element.
+
+        Args:
+            element (lxml.Element object): the <container> element
+            counts (list): the step's counts - containers found and empty containers removed
+
+        Returns:
+            (bool): True if the element is deleted
+        """
+        counts[0] += 1
+        if element.text is None:
+            counts[1] += 1  # the results for each are added once the traversal ends, see print_fused_counts()
+            return True
+        return False
+
+    def fuse_barcode(self, element, counts):
+        """
+        The update_barcode() step of run_fused_cleanup(), for one <container> element.
+
+        Args:
+            element (lxml.Element object): the <container> element
+            counts (list): the step's counts - container labels found and barcodes added
+
+        Returns:
+            (bool): False, the element is never deleted
+        """
+        from lxml import etree
+        if 'label' in element.attrib:
+            counts[0] += 1
+            match = barcode_regex.search(element.attrib["label"])
+            if match:
+                counts[1] += 1
+                barcode_tag = etree.SubElement(element.getparent(), "physloc", type="barcode")
+                barcode_tag.text = "{}".format(match.group(1))
+                self.fused_added.add(barcode_tag)
+        return False
+
+    def fuse_at_leftover(self, element, counts):
+        """
+        The remove_at_leftovers() step of run_fused_cleanup(), for one <unitid> element.
+
+        Args:
+            element (lxml.Element object): the <unitid> element
+            counts (list): the step's counts - unitids found and Archivists Toolkit ids removed
+
+        Returns:
+            (bool): True if the element is deleted
+        """
+        counts[0] += 1
+        if "type" in element.attrib and atid_regex.match(element.attrib["type"]):
+            counts[1] += 1
+            return True
+        return False
+
+    def fuse_archon_id(self, element, counts):
+        """
+        The remove_archon_ids() step of run_fused_cleanup(), for one <unitid> element.
+
+        Args:
+            element (lxml.Element object): the <unitid> element
+            counts (list): the step's counts - unitids found and Archon ids removed
+
+        Returns:
+            (bool): True if the element is deleted
+        """
+        counts[0] += 1
+        if "type" in element.attrib and archon_regex.match(element.attrib["type"]):
+            counts[1] += 1
+            return True
+        return False
+
+    def fuse_xlink_count(self, element, counts):
+        """
+        The counting step of count_xlinks() in run_fused_cleanup(), for one <dao> element. The xlink: prefixes are
+        removed by strip_xlink_prefixes() after the traversal.
+
+        Args:
+            element (lxml.Element object): the <dao> element
+            counts (list): the step's counts - digital objects found and their attributes
+
+        Returns:
+            (bool): False, the element is never deleted
+        """
+        self.daos = True
+        counts[0] += 1
+        counts[1] += len(element.attrib)
+        return False
+
+    def clean_suite(self, ead, custom_clean, fused=True):
         """
         Runs the above methods according to what the user specified in the custom_clean parameter.
 
+        The cleanups in fused_steps run together in run_fused_cleanup(), walking the tree once instead of once per
+        cleanup, and the namespace cleanups run together in clean_namespaces(). With fused set to False each method
+        runs on its own, which gives the same output and is kept to check it against, see benchmarks/compare_cleanup.py.
+
         Args:
             ead (EADRecord instance): instance of the class EADRecord
             custom_clean (list): keys used to determine what cleanup methods to run
+            fused (bool, optional): whether to run the cleanups in a single traversal
 
         Returns:
             clean_xml (bytes): if no cleanup is specified in custom_clean, bytes object with added doctype
             cleaned_root (bytes): if cleanup is specified in custom_clean, bytes object with added doctype
             self.results (str): filled with result information when methods are performed
         """
+        from lxml import etree
         cleaned_root = None
         if custom_clean:
             if "_ADD_EADID_" in custom_clean:
                 ead.add_eadid()
-            if "_DEL_NOTES_" in custom_clean:
-                ead.delete_empty_notes()
-            if "_CLN_EXTENTS_" in custom_clean:
-                ead.edit_extents()
-            if "_ADD_CERTAIN_" in custom_clean:
-                ead.add_certainty_attr()
-            if "_ADD_LABEL_" in custom_clean:
-                ead.add_label_attr()
-            if "_DEL_LANGTRAIL_" in custom_clean:
-                ead.strip_langmaterial()
-            if "_DEL_CONTAIN_" in custom_clean:
-                ead.delete_empty_containers()
-            if "_ADD_PHYSLOC_" in custom_clean:
-                ead.update_barcode()
-            if "_DEL_ATIDS_" in custom_clean:
-                ead.remove_at_leftovers()
-            if "_DEL_ARCHIDS_" in custom_clean:
-                ead.remove_archon_ids()
-            if "_CNT_XLINKS_" in custom_clean:
-                ead.count_xlinks()
-            if "_DEL_NMSPCS_" in custom_clean:
-                ead.clean_unused_ns()
-            if "_DEL_ALLNS_" in custom_clean:
-                cleaned_root = ead.clean_do_dec()
+            if fused is True:
+                ead.run_fused_cleanup(custom_clean)
+                ead.clean_namespaces(custom_clean)
+            else:
+                if "_DEL_NOTES_" in custom_clean:
+                    ead.delete_empty_notes()
+                if "_CLN_EXTENTS_" in custom_clean:
+                    ead.edit_extents()
+                if "_ADD_CERTAIN_" in custom_clean:
+                    ead.add_certainty_attr()
+                if "_ADD_LABEL_" in custom_clean:
+                    ead.add_label_attr()
+                if "_DEL_LANGTRAIL_" in custom_clean:
+                    ead.strip_langmaterial()
+                if "_DEL_CONTAIN_" in custom_clean:
+                    ead.delete_empty_containers()
+                if "_ADD_PHYSLOC_" in custom_clean:
+                    ead.update_barcode()
+                if "_DEL_ATIDS_" in custom_clean:
+                    ead.remove_at_leftovers()
+                if "_DEL_ARCHIDS_" in custom_clean:
+                    ead.remove_archon_ids()
+                if "_CNT_XLINKS_" in custom_clean:
+                    ead.count_xlinks()
+                if "_DEL_NMSPCS_" in custom_clean:
+                    ead.clean_unused_ns()
+                if "_DEL_ALLNS_" in custom_clean:
+                    cleaned_root = ead.clean_do_dec()
             if cleaned_root is None:
                 ead_string = etree.tostring(self.root, encoding="unicode", pretty_print=True,
                                             doctype='<?xml version="1.0" encoding="UTF-8" standalone="yes"?>')
@@ -404,57 +759,345 @@ class EADRecord:
             return clean_xml, self.results
 
 
-# cycle through EAD files in source directory
-@logger.catch
-def cleanup_eads(filepath, custom_clean, output_dir="clean_eads", keep_raw_exports=False):
+def normalized_attributes(element, strip_xlinks=False, remove_all=False):
     """
-    Take an EAD.xml file, parse it, clean it, and write it to output folder/directory.
+    Rewrites the attributes of an element for normalize_namespaces(), keeping them in the same order.
 
-    To learn more about the lxml package, see the documentation: https://lxml.de/
+    Args:
+        element (lxml.Element object): the element
+        strip_xlinks (bool, optional): whether xlink attributes lose their namespace
+        remove_all (bool, optional): whether every attribute but the xml: ones loses its namespace
+
+    Returns:
+        attributes (list or None): (name, value) of each attribute, None if none of them change
+    """
+    changed = False
+    attributes = []
+    names = {name for name in element.attrib.keys() if name[0] != "{"}
+    for name, value in element.attrib.items():
+        if name[0] == "{" and ((strip_xlinks is True and name.startswith(XLINK_NS)) or
+                               (remove_all is True and not name.startswith(XML_NS))):
+            local_name = name.split("}", 1)[1]
+            if local_name not in names:  # otherwise the attribute keeps its namespace rather than replace the other
+                names.add(local_name)
+                name = local_name
+                changed = True
+        attributes.append((name, value))
+    return attributes if changed is True else None
+
+
+def normalize_namespaces(element, strip_xlinks=False, local_names=False, remove_all=False):
+    """
+    Rewrites the namespaces of an element and everything in it in place, without serializing and parsing it again.
+
+    With strip_xlinks, attributes like xlink:href lose their xlink: prefix, keeping their order. With local_names, tags
+    lose their namespace and the namespace declarations left unused are removed. remove_all does both and removes the
+    namespace of every attribute but the xml: ones, so no namespace declaration is left in use. Text is left as it is.
+
+    Args:
+        element (lxml.Element object): the root or a part of the EAD
+        strip_xlinks (bool, optional): whether to remove xlink: prefixes, for _CNT_XLINKS_
+        local_names (bool, optional): whether to remove the namespace of every tag, for _DEL_NMSPCS_
+        remove_all (bool, optional): whether to remove every namespace, for _DEL_ALLNS_
+
+    Returns:
+        None
+    """
+    from lxml import etree
+    strip_xlinks = strip_xlinks or remove_all
+    local_names = local_names or remove_all
+    if local_names is True:
+        local_tags = {}  # tag as key and its local name as value
+        for node in element.iter(etree.Element):
+            tag = node.tag
+            if tag[0] == "{":
+                local_tag = local_tags.get(tag)
+                if local_tag is None:
+                    local_tag = local_tags[tag] = tag.split("}", 1)[1]
+                node.tag = local_tag
+    if strip_xlinks is True:  # XPath finds the few elements to change without visiting every one from Python
+        if remove_all is True:
+            has_attributes = f"@*[namespace-uri() != '' and namespace-uri() != '{XML_NS[1:-1]}']"
+        else:
+            has_attributes = f"@*[namespace-uri() = '{XLINK_NS[1:-1]}']"
+        for node in element.xpath(f"descendant-or-self::*[{has_attributes}]"):
+            attributes = normalized_attributes(node, strip_xlinks, remove_all)
+            if attributes is not None:
+                node.attrib.clear()
+                for name, value in attributes:
+                    node.set(name, value)
+    if local_names is True:
+        etree.cleanup_namespaces(element)  # https://lxml.de/api/lxml.etree-module.html#cleanup_namespaces
+
+
+def get_stream_min_size(defaults):
+    """
+    Gets the size of the raw EADs cleaned by stream_cleanup_ead() a user set in defaults.json, falling back on
+    STREAM_MIN_MB.
+
+    Args:
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        (int or None): size in bytes, None if EADs are never streamed
+    """
+    try:
+        stream_mb = float(defaults["ead_export_default"]["_STREAM_CLEANUP_MB_"])
+    except (KeyError, TypeError, ValueError):
+        stream_mb = STREAM_MIN_MB
+    return int(stream_mb * 1024 * 1024) if stream_mb > 0 else None
 
-    For an in-depth review on how this code is structured, see the wiki:
-    https://github.com/uga-libraries/ASpace_Batch_Export-Cleanup-Upload/wiki/Code-Structure#cleanup_eads
+
+def read_eadid_did(filepath):
+    """
+    Reads the <did> that add_eadid() copies the identifier from, the first child of the root's second child, without
+    parsing the rest of the EAD.
+
+    Args:
+        filepath (str): filepath of the raw EAD
+
+    Returns:
+        (lxml.Element object or None): the <did>, None if the EAD has no such element
+    """
+    from lxml import etree
+    with exarchive.open_raw(filepath) as raw_export:
+        root = None
+        for event, element in etree.iterparse(raw_export, events=("start", "end"), remove_blank_text=True):
+            if root is None:
+                root = element
+            elif event == "end" and len(root) > 1 and len(root[1]) > 0:
+                if root[1][0] is element or not isinstance(root[1][0].tag, str):
+                    return root[1][0]
+    return None
+
+
+def stream_cleanup_ead(filepath, custom_clean, output_path):
+    """
+    Cleans an EAD while parsing it with iterparse, writing each part to output_path with xmlfile as soon as it is
+    cleaned, so memory stays proportional to one part of a component rather than the whole EAD.
+
+    The collection description, container list and components (FRAME_TAGS) are written as they open and close. Every
+    other element under them, like the <eadheader> or a component's <did>, is cleaned with the fused cleanups of
+    EADRecord when it closes, then written and cleared. The namespace cleanups clean_namespaces() runs on the whole
+    tree are run on each part with normalize_namespaces() instead, and the <ead> is written empty for _DEL_ALLNS_.
+    The cleaned EAD has the same content as clean_suite() gives, but with cleanup options that keep namespaces their
+    declarations are repeated on each part, and whitespace between elements can differ.
+
+    Args:
+        filepath (str): filepath of the raw EAD
+        custom_clean (list): keys used to determine what cleanup methods to run
+        output_path (str): filepath the cleaned EAD is written to, replaced only once it is complete
+
+    Returns:
+        results (str): filled with result information when methods are performed
+    """
+    from lxml import etree
+    custom_clean = custom_clean or []
+    strip_xlinks = "_CNT_XLINKS_" in custom_clean or "_DEL_ALLNS_" in custom_clean
+    remove_all = "_DEL_ALLNS_" in custom_clean
+    local_names = "_DEL_NMSPCS_" in custom_clean or remove_all
+    eadid_did = read_eadid_did(filepath) if "_ADD_EADID_" in custom_clean else None
+    ead = None
+    fused = False
+    frames = []  # (element, xmlfile context) of each frame being written, innermost last
+    line_start = True  # whether the last thing written ended a line
+    part_path = output_path + ".part"
+
+    def write_indent(xf, depth):
+        nonlocal line_start
+        xf.write(("" if line_start else "\n") + "  " * depth)
+        line_start = False
+
+    def write_text(xf, text):
+        nonlocal line_start
+        if text:
+            xf.write(text)
+            line_start = False
+
+    try:
+        with exarchive.open_raw(filepath) as raw_export, open(part_path, "wb") as output_file:
+            output_file.write((XML_DECLARATION + "\n").encode("utf-8"))
+            with etree.xmlfile(output_file, encoding="UTF-8") as xf:
+                for event, element in etree.iterparse(raw_export, events=("start", "end", "comment", "pi"),
+                                                      remove_blank_text=True):
+                    parent = element.getparent()
+                    if event == "start" and not frames:  # the <ead> root
+                        if remove_all is True:  # the <ead> start tag becomes an empty <ead>, as in clean_namespaces()
+                            tag, attributes, nsmap = "ead", {}, None
+                        else:
+                            nsmap = {prefix: uri for prefix, uri in element.nsmap.items()
+                                     if not (local_names and (prefix is None or (prefix == "xlink" and strip_xlinks)))}
+                            tag = etree.QName(element).localname if local_names else element.tag
+                            attributes = dict(normalized_attributes(element, strip_xlinks) or element.attrib.items())
+                        context = xf.element(tag, attributes, nsmap=nsmap)
+                        context.__enter__()
+                        frames.append((element, context))
+                        line_start = False
+                    elif event in ("start", "comment", "pi") and frames and parent is frames[-1][0]:
+                        previous = element.getprevious()
+                        write_text(xf, parent.text if previous is None else previous.tail)
+                        while element.getprevious() is not None:  # already written, so free the memory
+                            del parent[0]
+                        if event != "start":
+                            write_indent(xf, len(frames))
+                            xf.write(element, with_tail=False)
+                        elif etree.QName(element).localname in FRAME_TAGS:
+                            write_indent(xf, len(frames))
+                            tag = etree.QName(element).localname if local_names else element.tag
+                            attributes = normalized_attributes(element, strip_xlinks, remove_all)
+                            context = xf.element(tag, dict(attributes or element.attrib.items()))
+                            context.__enter__()
+                            frames.append((element, context))
+                    elif event == "end" and frames and element is frames[-1][0]:
+                        write_text(xf, element[-1].tail if len(element) else element.text)
+                        context = frames.pop()[1]
+                        write_indent(xf, len(frames))
+                        context.__exit__(None, None, None)
+                        element.clear(keep_tail=True)
+                    elif event == "end" and frames and parent is frames[-1][0]:
+                        if ead is None:
+                            ead = EADRecord(frames[0][0])
+                            if "_ADD_EADID_" in custom_clean:
+                                ead.add_eadid(eadid_did)
+                            fused = ead.start_fused_cleanup(custom_clean)
+                        part = element
+                        if fused is True:
+                            ead.fuse_subtree(part)
+                        if local_names is True:
+                            # a copy declares only the namespaces it uses, which cleanup_namespaces() can then drop
+                            part = copy.deepcopy(part)
+                        normalize_namespaces(part, strip_xlinks, local_names, remove_all)
+                        write_indent(xf, len(frames))
+                        xf.write(part, pretty_print=True, with_tail=False)
+                        line_start = True
+                        element.clear(keep_tail=True)
+            output_file.write(b"\n")
+        os.replace(part_path, output_path)
+    except Exception:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    if ead is None:
+        return ""
+    if fused is True:
+        ead.print_fused_counts()
+    return ead.results
+
+
+def clean_ead_file(filepath, custom_clean, output_dir="clean_eads", stream_min_size=None):
+    """
+    Parses an EAD.xml file, cleans it and writes it to the output folder/directory, the CPU bound part of
+    cleanup_eads() that cleanup_pool.CleanupPool runs in other processes.
 
     Args:
         filepath (str): filepath of the EAD record to be cleaned
-        custom_clean (list): strings as passed from as_xtf_GUI.py that determines what methods will be run against the lxml element when running the clean_suite() method. The user can specify what they want cleaned in as_xtf_GUI.py, so this is how those specifications are passed.
-        output_dir (str): filepath of where the EAD record should be sent after cleaning, as specified by the user ("clean_eads" is default)
-        keep_raw_exports (bool): if a user in as_xtf_GUI.py specifies to keep the exports that come from as_export.py, this parameter will prevent the function from deleting those files in source_eads.
+        custom_clean (list): keys used to determine what cleanup methods to run, see clean_suite()
+        output_dir (str, optional): filepath of where the EAD record should be sent after cleaning
+        stream_min_size (int, optional): raw EADs of at least this many bytes are cleaned by stream_cleanup_ead()
 
     Returns:
         (bool): if True, the XML was valid. If False, the XML was not valid.
         results (str): filled with result information when methods are performed
     """
+    from lxml import etree
     filename = Path(filepath).name  # get file name + extension
-    fileparent = Path(filepath).parent
     valid_err = ""
-    parser = etree.XMLParser(remove_blank_text=True, ns_clean=True)  # clean up redundant namespace declarations
-    try:
-        tree = etree.parse(filepath, parser=parser)
-    except Exception as e:
-        valid_err += "Error: {}\n\n" \
-                     "File saved in: {}\n".format(e, Path(filepath).parent)
-        valid_err += "-" * 139
-        return False, valid_err
-    ead_root = tree.getroot()
-    ead = EADRecord(ead_root)
-    clean_ead, results = ead.clean_suite(ead, custom_clean)
-    results += "\n" + "-" * 139
     clean_ead_file_root = str(Path(output_dir, '{}'.format(filename)))
-    with open(clean_ead_file_root, "wb") as CLEANED_EAD:
-        CLEANED_EAD.write(clean_ead)
-        CLEANED_EAD.close()
+    if stream_min_size is not None and os.path.exists(filepath) and os.path.getsize(filepath) >= stream_min_size:
+        try:
+            results = stream_cleanup_ead(filepath, custom_clean, clean_ead_file_root)
+        except etree.XMLSyntaxError as e:
+            valid_err += "Error: {}\n\n" \
+                         "File saved in: {}\n".format(e, Path(filepath).parent)
+            valid_err += "-" * 139
+            return False, valid_err
+    else:
+        parser = etree.XMLParser(remove_blank_text=True, ns_clean=True)  # clean up redundant namespace declarations
+        try:
+            with exarchive.open_raw(filepath) as raw_export:
+                tree = etree.parse(raw_export, parser=parser)
+        except Exception as e:
+            valid_err += "Error: {}\n\n" \
+                         "File saved in: {}\n".format(e, Path(filepath).parent)
+            valid_err += "-" * 139
+            return False, valid_err
+        ead_root = tree.getroot()
+        ead = EADRecord(ead_root)
+        clean_ead, results = ead.clean_suite(ead, custom_clean)
+        with open(clean_ead_file_root, "wb") as CLEANED_EAD:
+            CLEANED_EAD.write(clean_ead)
+            CLEANED_EAD.close()
+    results += "\n" + "-" * 139
+    return True, results
+
+
+def finish_raw_export(filepath, results, keep_raw_exports=False, archive=None):
+    """
+    Deletes raw exports more than 2 months old next to a cleaned EAD, then deletes, archives or keeps its own raw
+    export, the part of cleanup_eads() after clean_ead_file().
+
+    Args:
+        filepath (str): filepath of the raw EAD that was cleaned
+        results (str): results returned by clean_ead_file()
+        keep_raw_exports (bool, optional): whether to keep the raw export instead of deleting it
+        archive (ExportArchive instance, optional): if keep_raw_exports is True, the run's archive the raw export is
+        moved into instead of being kept as a plain file
+
+    Returns:
+        (bool): True, the XML was valid
+        results (str): results with where the raw export was kept added
+    """
+    fileparent = Path(filepath).parent
     for file in os.listdir(fileparent):
         source_filepath = str(Path(fileparent, file))
         if not os.path.isdir(source_filepath) and Path(source_filepath).suffix == ".xml":
-            file_time = os.path.getmtime(source_filepath)
-            current_time = time.time()
-            delete_time = current_time - 5356800  # This is for 2 months.
-            if file_time <= delete_time:  # If a file is more than 2 months old, delete
-                os.remove(source_filepath)
+            try:
+                file_time = os.path.getmtime(source_filepath)
+                current_time = time.time()
+                delete_time = current_time - 5356800  # This is for 2 months.
+                if file_time <= delete_time:  # If a file is more than 2 months old, delete
+                    os.remove(source_filepath)
+            except FileNotFoundError:  # another export's cleanup running at the same time removed it first
+                continue
+    if not os.path.exists(filepath):  # read back from an archive, so there is nothing left to delete or keep
+        return True, results
     if keep_raw_exports is False:  # prevents program from rerunning cleanup on cleaned files
         os.remove(filepath)
         return True, results
+    elif archive is not None:
+        archive.add(filepath)
+        results += "\nArchived raw ASpace export in {}\n".format(archive.archive_path)
+        return True, results
     else:
         results += "\nKeeping raw ASpace exports in {}\n".format(fileparent)
         return True, results
+
+
+# cycle through EAD files in source directory
+@logger.catch
+def cleanup_eads(filepath, custom_clean, output_dir="clean_eads", keep_raw_exports=False, archive=None,
+                 stream_min_size=None):
+    """
+    Take an EAD.xml file, parse it, clean it, and write it to output folder/directory.
+
+    To learn more about the lxml package, see the documentation: https://lxml.de/
+
+    For an in-depth review on how this code is structured, see the wiki:
+    https://github.com/uga-libraries/ASpace_Batch_Export-Cleanup-Upload/wiki/Code-Structure#cleanup_eads
+
+    Args:
+        filepath (str): filepath of the EAD record to be cleaned
+        custom_clean (list): strings as passed from as_xtf_GUI.py that determines what methods will be run against the lxml element when running the clean_suite() method. The user can specify what they want cleaned in as_xtf_GUI.py, so this is how those specifications are passed.
+        output_dir (str): filepath of where the EAD record should be sent after cleaning, as specified by the user ("clean_eads" is default)
+        keep_raw_exports (bool): if a user in as_xtf_GUI.py specifies to keep the exports that come from as_export.py, this parameter will prevent the function from deleting those files in source_eads.
+        archive (ExportArchive instance, optional): if keep_raw_exports is True, the run's archive the raw export is moved into instead of being kept as a plain file. A raw export that is no longer in source_eads is read back from its archive.
+        stream_min_size (int, optional): raw EADs of at least this many bytes are cleaned while they are parsed by stream_cleanup_ead(), so memory does not grow with the size of the EAD. If None, every EAD is parsed whole.
+
+    Returns:
+        (bool): if True, the XML was valid. If False, the XML was not valid.
+        results (str): filled with result information when methods are performed
+    """
+    valid, results = clean_ead_file(filepath, custom_clean, output_dir, stream_min_size)
+    if valid is False:
+        return False, results
+    return finish_raw_export(filepath, results, keep_raw_exports, archive)
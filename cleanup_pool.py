@@ -0,0 +1,257 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import cleanup as clean
+from as_logging import configure_logging, logger
+
+DEFAULT_PROCESSES = 0
+"""int: number of EADs cleaned at the same time if _CLEANUP_PROCESSES_ is missing from defaults.json, 0 for one per CPU
+core"""
+_shared_pool = None
+"""CleanupPool instance: the pool shared by every export run in the program, see get_cleanup_pool()"""
+_shared_lock = threading.Lock()
+"""threading.Lock object: keeps two runs starting at the same time from each creating the shared pool"""
+
+
+def get_cleanup_processes(defaults):
+    """
+    Gets the number of processes EADs are cleaned in that a user set in defaults.json, falling back on
+    DEFAULT_PROCESSES.
+
+    Args:
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        processes (int): number of EADs to clean at the same time, one per CPU core if the setting is 0
+    """
+    try:
+        processes = int(defaults["performance_default"]["_CLEANUP_PROCESSES_"])
+    except (KeyError, TypeError, ValueError):
+        processes = DEFAULT_PROCESSES
+    if processes <= 0:
+        processes = os.cpu_count() or 1
+    return processes
+
+
+def clean_ead_job(working_dir, filepath, custom_clean, output_dir, stream_min_size, capture=True):
+    """
+    Runs cleanup.clean_ead_file() on one EAD, in a pool process or in the calling thread.
+
+    A pool process prints to its own console, not the GUI's, so what the cleanup prints is captured and returned for
+    CleanupPool.finish() to print.
+
+    Args:
+        working_dir (str): the caller's working directory, which relative filepaths are resolved from
+        filepath (str): filepath of the EAD record to be cleaned
+        custom_clean (list): keys used to determine what cleanup methods to run, see cleanup.EADRecord.clean_suite()
+        output_dir (str): filepath of where the EAD record should be sent after cleaning
+        stream_min_size (int or None): raw EADs of at least this many bytes are cleaned while they are parsed
+        capture (bool, optional): whether to capture what the cleanup prints, False when cleaning in the calling thread
+
+    Returns:
+        valid (bool): if True, the XML was valid. If False, the XML was not valid.
+        results (str): filled with result information when methods are performed
+        printed (str): what the cleanup printed, empty if capture is False
+        seconds (float): seconds the cleanup took
+    """
+    if os.getcwd() != working_dir:
+        os.chdir(working_dir)
+    start_time = time.perf_counter()
+    if capture is False:
+        valid, results = clean.clean_ead_file(filepath, custom_clean, output_dir, stream_min_size)
+        return valid, results, "", time.perf_counter() - start_time
+    printed = io.StringIO()
+    with contextlib.redirect_stdout(printed):
+        valid, results = clean.clean_ead_file(filepath, custom_clean, output_dir, stream_min_size)
+    return valid, results, printed.getvalue(), time.perf_counter() - start_time
+
+
+class CleanupPool:
+    """
+    Cleans EADs in a pool of processes, so cleaning many EADs uses every CPU core instead of one.
+
+    Cleaning an EAD is CPU bound lxml and Python work, which threads can't run in parallel. Each EAD is parsed, cleaned
+    and written in a pool process by cleanup.clean_ead_file(), then finish() handles the raw export in the calling
+    process, where the run's archive is open. The processes are started the first time an EAD is submitted and kept
+    until close(). With one process, EADs are cleaned in the calling thread as cleanup_eads() always has.
+    """
+    def __init__(self, processes):
+        """
+        Must contain the number of processes.
+
+        Args:
+            processes (int): number of EADs cleaned at the same time, 1 to clean them in the calling thread
+        """
+        self.processes = max(1, processes)
+        """int: number of EADs cleaned at the same time"""
+        self.executor = None
+        """concurrent.futures.ProcessPoolExecutor object: the pool processes, None until an EAD is submitted"""
+        self.lock = threading.Lock()
+        """threading.Lock object: keeps export threads submitting at the same time from each starting the pool"""
+
+    def start_executor(self):
+        """
+        Starts the pool, spawning fresh processes rather than forking the GUI and its threads.
+
+        Returns:
+            (concurrent.futures.ProcessPoolExecutor object): the pool
+        """
+        self.executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=configure_logging)
+        return self.executor
+
+    def submit(self, filepath, custom_clean, output_dir="clean_eads", stream_min_size=None):
+        """
+        Starts cleaning an EAD.
+
+        Args:
+            filepath (str): filepath of the EAD record to be cleaned
+            custom_clean (list): keys used to determine what cleanup methods to run
+            output_dir (str, optional): filepath of where the EAD record should be sent after cleaning
+            stream_min_size (int, optional): raw EADs of at least this many bytes are cleaned while they are parsed
+
+        Returns:
+            (concurrent.futures.Future object): done when the EAD is cleaned, with the result of clean_ead_job()
+        """
+        job = (os.getcwd(), filepath, custom_clean, output_dir, stream_min_size)
+        if self.processes == 1:
+            future = Future()
+            try:
+                future.set_result(clean_ead_job(*job, capture=False))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        with self.lock:
+            executor = self.executor or self.start_executor()
+            try:
+                return executor.submit(clean_ead_job, *job)
+            except BrokenProcessPool:  # a process died, ex. running out of memory, so start new ones
+                logger.error(f'EAD cleanup processes stopped, starting {self.processes} new ones')
+                return self.start_executor().submit(clean_ead_job, *job)
+
+    @staticmethod
+    def result(future):
+        """
+        Waits for an EAD submitted with submit() to be cleaned and prints what its cleanup printed, leaving its raw
+        export as it is.
+
+        Args:
+            future (concurrent.futures.Future object): returned by submit()
+
+        Returns:
+            valid (bool): if True, the XML was valid. If False, the XML was not valid.
+            results (str): filled with result information when methods are performed
+            seconds (float): seconds the cleanup took, without the time it waited for a free process
+        """
+        valid, results, printed, seconds = future.result()
+        if printed:
+            print(printed, end="")
+        return valid, results, seconds
+
+    def finish(self, future, filepath, keep_raw_exports=False, archive=None):
+        """
+        Waits for an EAD submitted with submit() to be cleaned with result(), then handles its raw export with
+        cleanup.finish_raw_export(), the same as cleanup_eads() does.
+
+        Args:
+            future (concurrent.futures.Future object): returned by submit()
+            filepath (str): filepath of the EAD record that was cleaned
+            keep_raw_exports (bool, optional): whether to keep the raw export instead of deleting it
+            archive (ExportArchive instance, optional): the run's archive the raw export is moved into if it is kept
+
+        Returns:
+            valid (bool): if True, the XML was valid. If False, the XML was not valid.
+            results (str): filled with result information when methods are performed
+            seconds (float): seconds the cleanup took, without the time it waited for a free process
+        """
+        valid, results, seconds = self.result(future)
+        if valid is False:
+            return False, results, seconds
+        start_time = time.perf_counter()
+        valid, results = clean.finish_raw_export(filepath, results, keep_raw_exports, archive)
+        return valid, results, seconds + time.perf_counter() - start_time
+
+    def clean_files(self, filepaths, custom_clean, output_dir="clean_eads", keep_raw_exports=False, archive=None,
+                    stream_min_size=None, raw_exports=True):
+        """
+        Cleans EADs over the pool and yields each one as soon as it is cleaned, in the order they finish.
+
+        At most twice as many EADs as there are processes are submitted ahead, so a long list of EADs is not all
+        queued at once and filepaths can be a generator that is only read as EADs finish. An exception raised cleaning
+        one EAD is turned into that EAD's results.
+
+        Args:
+            filepaths (list): filepaths of the EAD records to be cleaned
+            custom_clean (list): keys used to determine what cleanup methods to run
+            output_dir (str, optional): filepath of where the EAD records should be sent after cleaning
+            keep_raw_exports (bool, optional): whether to keep the raw exports instead of deleting them
+            archive (ExportArchive instance, optional): archive the raw exports are moved into if they are kept
+            stream_min_size (int, optional): raw EADs of at least this many bytes are cleaned while they are parsed
+            raw_exports (bool, optional): whether to handle the files as raw exports with finish(), False to leave
+            them as they are with result(), ex. when re-cleaning exports that are kept
+
+        Yields:
+            filepath (str): filepath of the EAD record as given in filepaths
+            valid (bool): if True, the XML was valid. If False, the XML was not valid.
+            results (str): filled with result information when methods are performed
+        """
+        filepaths = iter(filepaths)
+        pending = {}
+        while True:
+            for filepath in filepaths:
+                pending[self.submit(filepath, custom_clean, output_dir, stream_min_size)] = filepath
+                if len(pending) >= self.processes * 2:
+                    break
+            if not pending:
+                return
+            for future in wait(pending, return_when=FIRST_COMPLETED).done:
+                filepath = pending.pop(future)
+                try:
+                    if raw_exports is True:
+                        valid, results, seconds = self.finish(future, filepath, keep_raw_exports, archive)
+                    else:
+                        valid, results, seconds = self.result(future)
+                except Exception as e:
+                    logger.error(f'Error cleaning {filepath}: {e}')
+                    valid, results = False, "Error: {}\n\nFile saved in: {}\n".format(e, os.path.dirname(filepath))
+                    results += "-" * 139
+                yield filepath, valid, results
+
+    def close(self):
+        """
+        Stops the pool processes once the EADs already submitted are cleaned.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+                self.executor = None
+
+
+def get_cleanup_pool(defaults):
+    """
+    Gets the cleanup pool shared by every export run, creating it the first time and again whenever the number of
+    processes in defaults.json changes, so its processes are only started once per session.
+
+    Args:
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        (CleanupPool instance): the shared pool
+    """
+    global _shared_pool
+    processes = get_cleanup_processes(defaults)
+    with _shared_lock:
+        if _shared_pool is None or _shared_pool.processes != processes:
+            if _shared_pool is not None:
+                _shared_pool.close()
+            _shared_pool = CleanupPool(processes)
+        return _shared_pool
@@ -3,7 +3,7 @@ from cx_Freeze import setup, Executable
 
 # Dependencies are automatically detected, but it might need fine tuning.
 # "packages": ["os"] is used as example only
-build_exe_options = {"packages": ["os"], "excludes": [], "includes": ["PySimpleGUI","loguru","lxml","paramiko","scp","asnake","requests"]}
+build_exe_options = {"packages": ["os"], "excludes": [], "includes": ["PySimpleGUI","loguru","lxml","paramiko","scp","asnake","requests","aiohttp"]}
 includefiles = ["thumbnail.ico"]
 
 # base="Win32GUI" should be used only for Windows GUI app
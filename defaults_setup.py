@@ -1,15 +1,18 @@
 import json
 import os
-
-from as_xtf_GUI import logger
 from pathlib import Path
 
+from as_logging import logger
+
 
 @logger.catch
 def set_defaults_file():
     """
     Checks defaults.json file and if there is an error, creates a new defaults.json file and returns the data.
 
+    A defaults.json file from an older version keeps the user's settings, only the options it is missing are added
+    with their default values, see fill_missing_defaults().
+
     For an in-depth review on how this code is structured, see the wiki:
     https://github.com/uga-libraries/ASpace_Batch_Export-Cleanup-Upload/wiki/Code-Structure#set_default_file
 
@@ -22,56 +25,52 @@ def set_defaults_file():
     source_marcs = str(Path(os.getcwd(), "source_marcs"))
     source_pdfs = str(Path(os.getcwd(), "source_pdfs"))
     source_labels = str(Path(os.getcwd(), "source_labels"))
-    xtf_default = ["ead_export_default", "_INCLUDE_UNPUB_", "_INCLUDE_DAOS_", "_NUMBERED_CS_", "_USE_EAD3_",
-                   "_KEEP_RAW_", "_CLEAN_EADS_", "_OUTPUT_DIR_", "_SOURCE_DIR_", "marc_export_default",
-                   "pdf_export_default", "labels_export_default", "ead_cleanup_defaults", "_ADD_EADID_", "_DEL_NOTES_",
-                   "_CLN_EXTENTS_", "_ADD_CERTAIN_", "_ADD_LABEL_", "_DEL_LANGTRAIL_", "_DEL_CONTAIN_", "_ADD_PHYSLOC_",
-                   "_DEL_ATIDS_", "_DEL_ARCHIDS_", "_CNT_XLINKS_", "_DEL_NMSPCS_", "_DEL_ALLNS_", "as_api",
-                   "repo_default", "_REPO_NAME_", "_REPO_ID_", "xtf_default", "xtf_version", "xtf_host",
-                   "xtf_remote_path", "xtf_local_path", "xtf_indexer_path", "xtf_lazyindex_path", "_REINDEX_AUTO_",
-                   "_UPDATE_PERMISSIONS_"]
-    defaults_keys = []
+    defaults = {"ead_export_default": {"_INCLUDE_UNPUB_": False, "_INCLUDE_DAOS_": True, "_NUMBERED_CS_": True,
+                                       "_USE_EAD3_": False, "_KEEP_RAW_": False, "_ARCHIVE_RAW_": False,
+                                       "_STREAM_CLEANUP_MB_": 0, "_CLEAN_EADS_": True,
+                                       "_OUTPUT_DIR_": clean_eads, "_SOURCE_DIR_": source_eads},
+                "marc_export_default": {"_INCLUDE_UNPUB_": False, "_KEEP_RAW_": False, "_ARCHIVE_RAW_": False,
+                                        "_OUTPUT_DIR_": source_marcs},
+                "pdf_export_default": {"_INCLUDE_UNPUB_": False, "_INCLUDE_DAOS_": True, "_NUMBERED_CS_": True,
+                                       "_USE_EAD3_": False, "_KEEP_RAW_": False, "_ARCHIVE_RAW_": False,
+                                       "_OUTPUT_DIR_": source_pdfs},
+                "labels_export_default": {"_ARCHIVE_RAW_": False, "_OUTPUT_DIR_": source_labels},
+                "ead_cleanup_defaults": {"_ADD_EADID_": True, "_DEL_NOTES_": True, "_CLN_EXTENTS_": True,
+                                         "_ADD_CERTAIN_": True, "_ADD_LABEL_": True, "_DEL_LANGTRAIL_": True,
+                                         "_DEL_CONTAIN_": True, "_ADD_PHYSLOC_": True, "_DEL_ATIDS_": True,
+                                         "_DEL_ARCHIDS_": True, "_CNT_XLINKS_": True, "_DEL_NMSPCS_": True,
+                                         "_DEL_ALLNS_": True},
+                "as_api": "",
+                "repo_default": {"_REPO_NAME_": "", "_REPO_ID_": ""},
+                "xtf_default": {"xtf_version": True,
+                                "xtf_host": "",
+                                "xtf_remote_path": "",
+                                "xtf_local_path": clean_eads,
+                                "xtf_indexer_path": "",
+                                "xtf_lazyindex_path": "",
+                                "_REINDEX_AUTO_": True,
+                                "_UPDATE_PERMISSIONS_": True},
+                "performance_default": {"_MAX_WORKERS_": 4,
+                                        "_ASYNC_EXPORT_ALL_": True,
+                                        "_ASYNC_CONCURRENCY_": 8,
+                                        "_REQUEST_TIMEOUT_": 300,
+                                        "_INCREMENTAL_EXPORT_ALL_": False,
+                                        "_MAX_RETRIES_": 3,
+                                        "_ADAPTIVE_LIMIT_": True,
+                                        "_RESUME_EXPORT_ALL_": True,
+                                        "_LOOKUP_CACHE_TTL_": 3600,
+                                        "_PERSIST_LOOKUP_CACHE_": False,
+                                        "_CLEANUP_PROCESSES_": 0}}
     try:
         with open("defaults.json", "r") as DEFAULTS:
             json_data = json.load(DEFAULTS)
-            for key, value in json_data.items():
-                if key not in defaults_keys:
-                    defaults_keys.append(key)
-                if isinstance(value, dict):
-                    for value_key in value.keys():
-                        if value_key not in defaults_keys:
-                            defaults_keys.append(value_key)
-            for default in xtf_default:
-                if default not in defaults_keys:
-                    raise Exception
             DEFAULTS.close()
+        if not isinstance(json_data, dict):
+            raise ValueError("defaults.json does not hold a JSON object")
     except Exception as defaults_error:
         print(defaults_error)
         print("Generating new defaults file...", end='', flush=True)
         with open("defaults.json", "w") as DEFAULTS:
-            defaults = {"ead_export_default": {"_INCLUDE_UNPUB_": False, "_INCLUDE_DAOS_": True, "_NUMBERED_CS_": True,
-                                               "_USE_EAD3_": False, "_KEEP_RAW_": False, "_CLEAN_EADS_": True,
-                                               "_OUTPUT_DIR_": clean_eads, "_SOURCE_DIR_": source_eads},
-                        "marc_export_default": {"_INCLUDE_UNPUB_": False, "_KEEP_RAW_": False,
-                                                "_OUTPUT_DIR_": source_marcs},
-                        "pdf_export_default": {"_INCLUDE_UNPUB_": False, "_INCLUDE_DAOS_": True, "_NUMBERED_CS_": True,
-                                               "_USE_EAD3_": False, "_KEEP_RAW_": False, "_OUTPUT_DIR_": source_pdfs},
-                        "labels_export_default": {"_OUTPUT_DIR_": source_labels},
-                        "ead_cleanup_defaults": {"_ADD_EADID_": True, "_DEL_NOTES_": True, "_CLN_EXTENTS_": True,
-                                                 "_ADD_CERTAIN_": True, "_ADD_LABEL_": True, "_DEL_LANGTRAIL_": True,
-                                                 "_DEL_CONTAIN_": True, "_ADD_PHYSLOC_": True, "_DEL_ATIDS_": True,
-                                                 "_DEL_ARCHIDS_": True, "_CNT_XLINKS_": True, "_DEL_NMSPCS_": True,
-                                                 "_DEL_ALLNS_": True},
-                        "as_api": "",
-                        "repo_default": {"_REPO_NAME_": "", "_REPO_ID_": ""},
-                        "xtf_default": {"xtf_version": True,
-                                        "xtf_host": "",
-                                        "xtf_remote_path": "",
-                                        "xtf_local_path": clean_eads,
-                                        "xtf_indexer_path": "",
-                                        "xtf_lazyindex_path": "",
-                                        "_REINDEX_AUTO_": True,
-                                        "_UPDATE_PERMISSIONS_": True}}
             dump_defaults = json.dumps(defaults)
             DEFAULTS.write(dump_defaults)
             DEFAULTS.close()
@@ -79,9 +78,43 @@ def set_defaults_file():
         with open("defaults.json", "r") as DEFAULTS:
             json_data = json.load(DEFAULTS)
             DEFAULTS.close()
+    else:
+        missing_keys = fill_missing_defaults(json_data, defaults)
+        if missing_keys:
+            logger.info(f'Adding missing keys to defaults.json: {missing_keys}')
+            print("Adding new options to defaults file...", end='', flush=True)
+            with open("defaults.json", "w") as DEFAULTS:
+                json.dump(json_data, DEFAULTS)
+                DEFAULTS.close()
+            print("Done")
     return json_data
 
 
+def fill_missing_defaults(json_data, defaults):
+    """
+    Adds the keys missing from the user's defaults.json data with their default values, keeping every value the
+    user has set.
+
+    Args:
+        json_data (dict): the data read from defaults.json, changed in place
+        defaults (dict): the default value of every key, as written to a new defaults.json file
+
+    Returns:
+        missing_keys (list): the keys that were added, empty if none were missing
+    """
+    missing_keys = []
+    for key, value in defaults.items():
+        if key not in json_data or (isinstance(value, dict) and not isinstance(json_data[key], dict)):
+            json_data[key] = value
+            missing_keys.append(key)
+        elif isinstance(value, dict):
+            for value_key, default_value in value.items():
+                if value_key not in json_data[key]:
+                    json_data[key][value_key] = default_value
+                    missing_keys.append(value_key)
+    return missing_keys
+
+
 @logger.catch
 def create_default_folders():
     """
@@ -0,0 +1,260 @@
+import gzip
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+from as_logging import logger
+
+ARCHIVE_NAME = "{}_raw_{}.tar.gz"
+"""str: name of each run's archive of exports, formatted with the export format and the time the run started"""
+ARCHIVE_GLOB = "ead_raw_*.tar.gz"
+"""str: pattern matching every finished archive in the raw EAD exports folder"""
+INDEX_SUFFIX = ".index.json"
+"""str: added to an archive's filepath for the JSON file noting where each export starts in the archive"""
+FORMAT_DEFAULTS = {"marcxml": "marc_export_default", "pdf": "pdf_export_default", "labels": "labels_export_default"}
+"""dict: export format as key and its section in defaults.json as value, for the formats archived as they export"""
+SPOOL_SIZE = 8 * 1024 * 1024
+"""int: bytes of a raw export read back from an archive that are kept in memory before spilling to a temporary file"""
+_member_indexes = {}
+"""dict: index filepath as key and (modified time, members) as value, so open_raw() reads each index only once"""
+_index_lock = threading.Lock()
+"""threading.Lock object: keeps export threads reading raw exports back from loading the same index twice"""
+
+
+class ExportArchive:
+    """
+    A gzip compressed tarball that the exports of one run are added to, raw EADs as they are cleaned and MARCXML, PDF
+    and container label exports as they are written.
+
+    Each export is compressed as its own gzip member along with its tar header, and where it starts is noted in
+    self.members, which close() writes next to the archive, so open_raw() can read one export back without
+    decompressing every export before it. Gzip members written one after another are still a single gzip file, so the
+    archive opens as a plain tar.gz. The archive is written to a .part file and renamed when the run closes it, so an
+    archive that was cut off by the program closing is never read back. Exports are added one at a time as a stream,
+    so nothing is held in memory.
+    """
+    def __init__(self, archive_dir, export_format="ead"):
+        """
+        Must contain the folder the archive is written to. The archive file is only created once an export is added.
+
+        Args:
+            archive_dir (str): folder the archive is written to, the raw exports folder for EADs and the output folder
+                for the other formats
+            export_format (str, optional): one of ead, marcxml, pdf, or labels, the start of the archive's name
+        """
+        self.archive_path = str(Path(archive_dir, ARCHIVE_NAME.format(export_format,
+                                                                      datetime.now().strftime("%Y%m%d%H%M%S%f"))))
+        """str: filepath of the finished archive"""
+        self.archive_file = None
+        """file object: the open .part file, None until an export is added"""
+        self.members = {}
+        """dict: name of each export as key and [offset of its gzip member, tar header size, size] as value"""
+        self.count = 0
+        """int: number of exports added to the archive"""
+        self.lock = threading.Lock()
+        """threading.Lock object: keeps exports cleaned at the same time from being written into each other"""
+
+    def add(self, filepath, arcname=None):
+        """
+        Adds an export to the archive and deletes it from the folder.
+
+        Args:
+            filepath (str): filepath of the export
+            arcname (str, optional): name of the export in the archive, the name of filepath if None, ex. when
+                filepath is the temporary file an export was downloaded to
+
+        Returns:
+            None
+        """
+        arcname = arcname or Path(filepath).name
+        tar_info = tarfile.TarInfo(arcname)
+        file_stat = os.stat(filepath)
+        tar_info.size, tar_info.mtime, tar_info.mode = file_stat.st_size, int(file_stat.st_mtime), 0o644
+        header = tar_info.tobuf()
+        with self.lock:
+            if self.archive_file is None:
+                self.archive_file = open(self.archive_path + ".part", "wb")
+            offset = self.archive_file.tell()
+            with open(filepath, "rb") as export_file, \
+                    gzip.GzipFile(filename="", mode="wb", fileobj=self.archive_file, mtime=0) as member_file:
+                member_file.write(header)
+                shutil.copyfileobj(export_file, member_file)
+                member_file.write(tarfile.NUL * (-tar_info.size % tarfile.BLOCKSIZE))  # pad to a whole tar block
+            self.members[arcname] = [offset, len(header), tar_info.size]
+            self.count += 1
+        os.remove(filepath)
+
+    def close(self):
+        """
+        Finishes the archive so it can be read back.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if self.archive_file is None:
+                return
+            with gzip.GzipFile(filename="", mode="wb", fileobj=self.archive_file, mtime=0) as member_file:
+                member_file.write(tarfile.NUL * tarfile.BLOCKSIZE * 2)  # marks the end of the tarball
+            self.archive_file.close()
+            self.archive_file = None
+            write_member_index(self.archive_path + INDEX_SUFFIX, self.members)
+            os.replace(self.archive_path + ".part", self.archive_path)
+        logger.info(f'Archived {self.count} export(s) in {self.archive_path}')
+
+
+def write_member_index(index_path, members):
+    """
+    Writes where each export starts in an archive, replacing the file only once it is fully written.
+
+    Args:
+        index_path (str): filepath of the index, the archive's filepath followed by INDEX_SUFFIX
+        members (dict): name of each export as key and [offset of its gzip member, tar header size, size] as value
+
+    Returns:
+        None
+    """
+    temp_fd, temp_path = tempfile.mkstemp(suffix=".part", prefix=".", dir=os.path.dirname(index_path))
+    try:
+        with os.fdopen(temp_fd, "w") as index_file:
+            json.dump(members, index_file)
+        os.replace(temp_path, index_path)
+    except OSError as e:  # the archive can still be read, only more slowly
+        logger.error(f'Error writing the member index {index_path}: {e}')
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def read_member_index(archive_path):
+    """
+    Reads where each export starts in an archive, keeping it in memory until the index file changes.
+
+    Args:
+        archive_path (str): filepath of the archive
+
+    Returns:
+        members (dict or None): see ExportArchive.members, None if the archive has no index, ex. it was written before
+        archives were indexed
+    """
+    index_path = str(archive_path) + INDEX_SUFFIX
+    try:
+        index_mtime = os.path.getmtime(index_path)
+    except OSError:
+        return None
+    with _index_lock:
+        cached = _member_indexes.get(index_path)
+        if cached is not None and cached[0] == index_mtime:
+            return cached[1]
+        try:
+            with open(index_path, "r") as index_file:
+                members = json.load(index_file)
+        except (OSError, ValueError) as e:
+            logger.error(f'Error reading the member index {index_path}: {e}')
+            return None
+        _member_indexes[index_path] = (index_mtime, members)
+    return members
+
+
+def open_run_archive(defaults, export_format="ead"):
+    """
+    Starts an archive for a run's exports in one format if the user wants them archived.
+
+    Raw EADs are only archived if they are cleaned and the user keeps them. MARCXML, PDF and container label exports
+    are archived as they are written instead of being kept as plain files, if _ARCHIVE_RAW_ is set for their format.
+
+    Args:
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        export_format (str, optional): one of ead, marcxml, pdf, or labels
+
+    Returns:
+        archive (ExportArchive instance or None): the run's archive, None if the exports are not archived
+    """
+    if export_format != "ead":
+        format_defaults = defaults[FORMAT_DEFAULTS[export_format]]
+        if format_defaults["_ARCHIVE_RAW_"] is True:
+            return ExportArchive(format_defaults["_OUTPUT_DIR_"], export_format)
+        return None
+    ead_defaults = defaults["ead_export_default"]
+    if ead_defaults["_CLEAN_EADS_"] is True and ead_defaults["_KEEP_RAW_"] is True and \
+            ead_defaults["_ARCHIVE_RAW_"] is True:
+        return ExportArchive(ead_defaults["_SOURCE_DIR_"])
+    return None
+
+
+def open_raw(filepath):
+    """
+    Opens a raw EAD export, reading it back from the newest archive that holds it if it is not in the folder.
+
+    Archives with a member index are only opened if they hold the export, which is then read from where it starts.
+    Older archives without one are searched member by member.
+
+    Args:
+        filepath (str): filepath of the raw export, ex. source_eads/ms1234.xml
+
+    Returns:
+        (file object): the raw export opened for reading in binary
+
+    Raises:
+        FileNotFoundError: if the raw export is neither in the folder nor in any of its archives
+    """
+    if os.path.exists(filepath):
+        return open(filepath, "rb")
+    filename = Path(filepath).name
+    for archive_path in sorted(Path(filepath).parent.glob(ARCHIVE_GLOB), reverse=True):  # names sort by time
+        members = read_member_index(archive_path)
+        if members is not None and filename not in members:
+            continue
+        try:
+            if members is not None:
+                raw_export = read_member(archive_path, *members[filename])
+            else:
+                with tarfile.open(archive_path, "r:gz") as tar:
+                    member = tar.getmember(filename)
+                    raw_export = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+                    shutil.copyfileobj(tar.extractfile(member), raw_export)
+        except KeyError:
+            continue
+        except (OSError, EOFError, zlib.error, tarfile.TarError) as e:
+            logger.error(f'Error reading raw export archive {archive_path}: {e}')
+            continue
+        raw_export.seek(0)
+        logger.info(f'Read {filename} back from {archive_path}')
+        return raw_export
+    raise FileNotFoundError(f'{filepath} is not in the folder or any of its archives')
+
+
+def read_member(archive_path, offset, header_size, size):
+    """
+    Reads one export back from an archive, decompressing only its own gzip member.
+
+    Args:
+        archive_path (str): filepath of the archive
+        offset (int): where the export's gzip member starts in the archive
+        header_size (int): size of the export's tar header
+        size (int): size of the export
+
+    Returns:
+        raw_export (tempfile.SpooledTemporaryFile object): the export, positioned at its end
+
+    Raises:
+        EOFError: if the archive ends before the whole export is read
+    """
+    raw_export = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    with open(archive_path, "rb") as archive_file:
+        archive_file.seek(offset)
+        with gzip.GzipFile(fileobj=archive_file, mode="rb") as member_file:
+            member_file.read(header_size)
+            remaining = size
+            while remaining > 0:
+                chunk = member_file.read(min(remaining, 64 * 1024))
+                if not chunk:
+                    raise EOFError(f'{archive_path} ends before the export at {offset} is read')
+                raw_export.write(chunk)
+                remaining -= len(chunk)
+    return raw_export
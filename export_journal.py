@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import time
+
+from as_logging import logger
+
+JOURNAL_FILE = "export_journal_{}.jsonl"
+"""str: the export journal for each export format, kept next to defaults.json"""
+
+
+def resource_uri(resource_id, repo_id):
+    """
+    Builds the URI an export all run records a resource under.
+
+    Args:
+        resource_id (int or str): ArchivesSpace's assigned resource identifier
+        repo_id (int or str): ArchivesSpace's assigned repository identifier
+
+    Returns:
+        (str): the resource URI, ex. /repositories/2/resources/1
+    """
+    return f'/repositories/{repo_id}/resources/{resource_id}'
+
+
+class ExportJournal:
+    """
+    An append-only journal of one format's export all run, so a run that stopped partway through can be resumed.
+
+    Each line is a JSON record. A run starts with a "start" record listing every resource URI it will export, then gets
+    a "done" or "failed" record as each resource finishes, and a "finish" record at the end. A run without a "finish"
+    record did not complete and can be resumed.
+    """
+    def __init__(self, export_format, journal_path=None):
+        """
+        Must contain the export format, which picks the journal file.
+
+        Args:
+            export_format (str): one of the keys in export_pool.EXPORT_FORMATS - ead, marcxml, pdf, or labels
+            journal_path (str, optional): filepath of the journal, JOURNAL_FILE for the export format if None
+        """
+        self.export_format = export_format
+        """str: the export format the journal is for"""
+        self.journal_path = journal_path or JOURNAL_FILE.format(export_format)
+        """str: filepath of the journal"""
+        self.lock = threading.Lock()
+        """threading.Lock object: keeps records written at the same time from interleaving"""
+
+    def read(self):
+        """
+        Reads the last run recorded in the journal.
+
+        Returns:
+            run (dict or None): None if there is no journal, otherwise the repo_ids and pending URIs from the start
+            record, the sets of done and failed URIs, and whether the run finished
+        """
+        if not os.path.exists(self.journal_path):
+            return None
+        run = None
+        with open(self.journal_path, "r") as journal_file:
+            for line in journal_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:  # a line cut off by a crash
+                    continue
+                if record["event"] == "start":
+                    run = {"repo_ids": record["repo_ids"], "pending": record["pending"], "done": set(),
+                           "failed": set(), "finished": False}
+                elif run is None:
+                    continue
+                elif record["event"] == "done":
+                    run["done"].add(record["uri"])
+                    run["failed"].discard(record["uri"])
+                elif record["event"] == "failed":
+                    run["failed"].add(record["uri"])
+                elif record["event"] == "finish":
+                    run["finished"] = True
+        return run
+
+    def resume(self, resources, repo_ids):
+        """
+        Picks up an unfinished run over the same repositories, removing the resources it already exported.
+
+        Resources that failed or were never reached are kept, so they are retried. If there is no unfinished run over
+        the same repositories, a new run is started with every resource. The repositories are the ones the user chose,
+        not the ones left in resources, which may have been filtered down, ex. by the incremental export manifest.
+
+        Args:
+            resources (list): tuples of (resource_id, repo_id, resource_json) from an export all run
+            repo_ids (list): ASpace repository ID #s the user chose to export all resources from
+
+        Returns:
+            resources (list): the tuples still to export
+            done_count (int): number of resources the unfinished run already exported, 0 for a new run
+        """
+        repo_ids = sorted({str(repo_id) for repo_id in repo_ids})
+        run = self.read()
+        if run is None or run["finished"] is True or run["repo_ids"] != repo_ids:
+            self.start(resources, repo_ids)
+            return resources, 0
+        remaining = [resource for resource in resources if resource_uri(resource[0], resource[1]) not in run["done"]]
+        done_count = len(resources) - len(remaining)
+        logger.info(f'Resuming {self.export_format} export all: {done_count} done, {len(run["failed"])} failed, '
+                    f'{len(remaining)} remaining')
+        self.append({"event": "resume"})
+        return remaining, done_count
+
+    def start(self, resources, repo_ids):
+        """
+        Starts a new run, replacing the last one in the journal.
+
+        Args:
+            resources (list): tuples of (resource_id, repo_id, resource_json) the run will export
+            repo_ids (list): sorted ASpace repository ID #s the run exports from, as strings
+
+        Returns:
+            None
+        """
+        with self.lock:
+            with open(self.journal_path, "w") as journal_file:
+                journal_file.write(json.dumps({"event": "start", "time": time.time(), "repo_ids": repo_ids,
+                                               "pending": [resource_uri(resource[0], resource[1])
+                                                           for resource in resources]}) + "\n")
+
+    def append(self, record):
+        """
+        Appends a record to the journal and flushes it, so it survives the program closing unexpectedly.
+
+        Args:
+            record (dict): the record, with an "event" key
+
+        Returns:
+            None
+        """
+        with self.lock:
+            with open(self.journal_path, "a") as journal_file:
+                journal_file.write(json.dumps(record) + "\n")
+                journal_file.flush()
+
+    def record_done(self, resource_id, repo_id):
+        self.append({"event": "done", "uri": resource_uri(resource_id, repo_id)})
+
+    def record_failed(self, resource_id, repo_id, error):
+        self.append({"event": "failed", "uri": resource_uri(resource_id, repo_id), "error": str(error)})
+
+    def finish(self):
+        self.append({"event": "finish", "time": time.time()})
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import as_export as asx
+import export_archive as exarchive
+import lookup_cache as lcache
+from as_logging import logger
+
+MANIFEST_FILE = "export_manifest.json"
+"""str: the export manifest, kept next to defaults.json"""
+FORMAT_DEFAULTS = {"ead": "ead_export_default", "marcxml": "marc_export_default", "pdf": "pdf_export_default",
+                   "labels": "labels_export_default"}
+"""dict: export format as key and its section in defaults.json as value"""
+FOLDER_KEYS = {"_KEEP_RAW_", "_ARCHIVE_RAW_", "_OUTPUT_DIR_", "_SOURCE_DIR_"}
+"""set: options that only change where an export is kept, not what is exported, so they are left out of export_key()"""
+HASH_CHUNK = 1024 * 1024
+"""int: bytes of an export read at a time when hashing it"""
+
+
+class ExportManifest:
+    """
+    Records what each resource looked like when it was last exported, so an incremental export all run can skip the
+    resources that have not changed since.
+
+    Exports are recorded under an export key, see export_key(), so changing the ArchivesSpace instance or the export
+    or cleanup options exports every resource again. A resource has changed if its system_mtime or lock_version has,
+    or if any of its archival objects was modified after it was exported, which does not change the resource's own
+    system_mtime. Archival objects are searched for once per repository and run, only from the newest system_mtime
+    seen by the last run, see filter_changed().
+    """
+    def __init__(self, manifest_path=MANIFEST_FILE):
+        """
+        Loads the manifest from manifest_path, starting an empty one if it does not exist or cannot be read.
+
+        Args:
+            manifest_path (str, optional): filepath of the JSON file holding the manifest
+        """
+        self.manifest_path = manifest_path
+        """str: filepath of the JSON file holding the manifest"""
+        self.exports = {}
+        """dict: export key as key and a dict of resource URI to its last export's system_mtime, lock_version,
+        tree_mtime, sha256, filepath and archive as value"""
+        self.checked = {}
+        """dict: export key as key and a dict of repository id # to the newest archival object system_mtime seen as
+        value, where the next run's search for modified archival objects starts"""
+        self.component_mtimes = {}
+        """dict: resource URI as key and the newest system_mtime of its archival objects found by filter_changed() as
+        value"""
+        self.lock = threading.Lock()
+        """threading.Lock object: keeps exports finishing at the same time from recording over each other"""
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, "r") as manifest_file:
+                    saved = json.load(manifest_file)
+                self.exports = saved.get("exports", {})  # a manifest keyed by export format alone is started over
+                self.checked = saved.get("checked", {})
+            except (OSError, ValueError, AttributeError) as e:
+                logger.error(f'Error reading export manifest, starting a new one: {e}')
+
+    def is_current(self, export_key, resource_json):
+        """
+        Checks whether a resource is unchanged since its last export and that export is still on disk as it was.
+
+        Args:
+            export_key (str): the export's API URL, format and options, see export_key()
+            resource_json (dict): the resource's JSON or search result, with its uri, system_mtime and lock_version
+
+        Returns:
+            (bool): True if the resource does not need to be exported again
+        """
+        last_export = self.exports.get(export_key, {}).get(resource_json["uri"])
+        if last_export is None or resource_json.get("system_mtime") is None:
+            return False
+        if last_export["system_mtime"] != resource_json["system_mtime"]:
+            return False
+        if resource_json.get("lock_version") is not None and last_export.get("lock_version") is not None and \
+                last_export["lock_version"] != resource_json["lock_version"]:
+            return False
+        component_mtime = self.component_mtimes.get(resource_json["uri"])
+        if component_mtime is not None and component_mtime > (last_export.get("tree_mtime") or ""):
+            return False
+        if last_export.get("archive") is not None:  # added to an archive, see export_archive.ExportArchive
+            members = exarchive.read_member_index(last_export["archive"])
+            return members is not None and Path(last_export["filepath"]).name in members
+        if not os.path.exists(last_export["filepath"]):
+            return False
+        return last_export.get("sha256") is None or hash_export(last_export["filepath"]) == last_export["sha256"]
+
+    def check_components(self, export_key, client, repo_id):
+        """
+        Searches for the archival objects of a repository modified since the last run checked, noting the newest
+        system_mtime of each resource's archival objects in self.component_mtimes.
+
+        If no resource in the repository has been exported with export_key yet, nothing can be current, so only the
+        newest system_mtime is requested, for the next run to search from.
+
+        Args:
+            export_key (str): the export's API URL, format and options, see export_key()
+            client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+            repo_id (int): the repository's id #
+
+        Returns:
+            None
+        """
+        checked = self.checked.setdefault(export_key, {})
+        since = checked.get(str(repo_id))
+        if since is None and not any(uri.startswith(f'/repositories/{repo_id}/')
+                                     for uri in self.exports.get(export_key, {})):
+            checked[str(repo_id)] = asx.fetch_newest_component_mtime(client, repo_id)
+            return
+        component_mtimes, newest_mtime = asx.fetch_component_mtimes(client, repo_id, since=since)
+        self.component_mtimes.update(component_mtimes)
+        if newest_mtime is not None:
+            checked[str(repo_id)] = newest_mtime
+        logger.info(f'Found archival objects modified since {since} in {len(component_mtimes)} resource(s) of '
+                    f'repository {repo_id}')
+
+    def filter_changed(self, export_key, resources, client=None):
+        """
+        Removes the resources that have not changed since their last export.
+
+        Resources found to have changed are dropped from the manifest until they are exported and recorded again, so
+        they are not skipped by the next run if this one stops before exporting them.
+
+        Args:
+            export_key (str): the export's API URL, format and options, see export_key()
+            resources (list): tuples of (resource_id, repo_id, resource_json) from an export all run
+            client (ASnake.client object, optional): the ArchivesSpace ASnake client, used to search for modified
+            archival objects, which are not checked if None
+
+        Returns:
+            changed_resources (list): the tuples of resources that are new or have changed since their last export
+            unchanged_count (int): number of resources removed
+        """
+        if client is not None:
+            for repo_id in dict.fromkeys(repo_id for resource_id, repo_id, resource_json in resources):
+                self.check_components(export_key, client, repo_id)
+        changed_resources = []
+        with self.lock:
+            last_exports = self.exports.setdefault(export_key, {})
+            for resource in resources:
+                if resource[2] is None or not self.is_current(export_key, resource[2]):
+                    changed_resources.append(resource)
+                    if resource[2] is not None:
+                        last_exports.pop(resource[2]["uri"], None)
+        unchanged_count = len(resources) - len(changed_resources)
+        logger.info(f'Incremental export {export_key}: {len(changed_resources)} changed, {unchanged_count} unchanged')
+        return changed_resources, unchanged_count
+
+    def record(self, export_key, resource_json, resource_export, filepath):
+        """
+        Records a successful export.
+
+        Args:
+            export_key (str): the export's API URL, format and options, see export_key()
+            resource_json (dict): the resource's JSON or search result, with its uri, system_mtime and lock_version
+            resource_export (ASExport instance): the finished export, with the hash of the downloaded file and the
+            archive it was added to, if any
+            filepath (str): where the export ended up, ex. the cleaned EAD in the output directory
+
+        Returns:
+            None
+        """
+        archive = resource_export.archive
+        if archive is not None:  # the archive's member index shows it is still there
+            sha256 = None
+        elif str(filepath) == str(resource_export.filepath):
+            sha256 = resource_export.sha256
+        else:  # the cleaned EAD, which differs from the download
+            sha256 = hash_export(filepath)
+        tree_mtime = max(resource_json.get("system_mtime") or "", self.component_mtimes.get(resource_json["uri"], ""))
+        with self.lock:
+            self.exports.setdefault(export_key, {})[resource_json["uri"]] = {
+                "system_mtime": resource_json.get("system_mtime"),
+                "lock_version": resource_json.get("lock_version"),
+                "tree_mtime": tree_mtime or None,
+                "sha256": sha256,
+                "filepath": str(filepath),
+                "archive": archive.archive_path if archive is not None else None}
+
+    def save(self):
+        """
+        Writes the manifest to a temporary file and renames it over manifest_path, so it is never left half written.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            manifest_dir = Path(self.manifest_path).parent
+            temp_fd, temp_path = tempfile.mkstemp(suffix=".part", prefix=".", dir=manifest_dir)
+            try:
+                with os.fdopen(temp_fd, "w") as manifest_file:
+                    json.dump({"exports": self.exports, "checked": self.checked}, manifest_file)
+                os.replace(temp_path, self.manifest_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+
+def export_key(export_format, client, defaults, cleanup_options=None):
+    """
+    Gets the key exports are recorded under, so a resource is only skipped if it was last exported from the same
+    ArchivesSpace instance with the same options.
+
+    Args:
+        export_format (str): one of the keys in export_pool.EXPORT_FORMATS - ead, marcxml, pdf, or labels
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        cleanup_options (list, optional): cleanup options passed to cleanup_eads() when exporting EADs
+
+    Returns:
+        (str): the API URL, export format and a hash of the export options, and the cleanup options for EADs
+    """
+    options = {key: value for key, value in defaults[FORMAT_DEFAULTS[export_format]].items() if key not in FOLDER_KEYS}
+    if export_format == "ead":
+        options["cleanup_options"] = sorted(cleanup_options or [])
+    options_hash = hashlib.sha256(json.dumps(options, sort_keys=True).encode()).hexdigest()[:16]
+    return f'{lcache.client_url(client)} {export_format} {options_hash}'
+
+
+def hash_export(filepath):
+    """
+    Hashes an export on disk.
+
+    Args:
+        filepath (str): filepath of the export
+
+    Returns:
+        (str or None): the sha256 hex digest of the export, None if it cannot be read
+    """
+    sha256 = hashlib.sha256()
+    try:
+        with open(filepath, "rb") as export_file:
+            for chunk in iter(lambda: export_file.read(HASH_CHUNK), b""):
+                sha256.update(chunk)
+    except OSError:
+        return None
+    return sha256.hexdigest()
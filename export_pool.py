@@ -0,0 +1,531 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import as_export as asx
+import cleanup as clean
+import cleanup_pool as cpool
+import export_archive as exarchive
+import export_timing as extiming
+import id_index
+import lookup_cache as lcache
+from as_logging import logger
+
+EXPORT_FORMATS = {"ead": ("ead_export_default", "_SOURCE_DIR_"),
+                  "marcxml": ("marc_export_default", "_OUTPUT_DIR_"),
+                  "pdf": ("pdf_export_default", "_OUTPUT_DIR_"),
+                  "labels": ("labels_export_default", "_OUTPUT_DIR_")}
+"""dict: export format as key and the defaults.json section and key holding its output directory as value"""
+DEFAULT_MAX_WORKERS = 4
+"""int: number of resources exported at the same time if performance_default is missing from defaults.json"""
+
+
+def get_max_workers(defaults):
+    """
+    Gets the number of export workers a user set in defaults.json, falling back on DEFAULT_MAX_WORKERS.
+
+    Args:
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        max_workers (int): number of resources to export at the same time, never less than 1
+    """
+    try:
+        max_workers = int(defaults["performance_default"]["_MAX_WORKERS_"])
+    except (KeyError, TypeError, ValueError):
+        max_workers = DEFAULT_MAX_WORKERS
+    return max(1, max_workers)
+
+
+def resolve_resources(resources, client, index_path=None, cache=None):
+    """
+    Fills in the resource JSON of user input identifiers found in the lookup cache or the local identifier index, or
+    failing that by as_export.resolve_identifiers() in a few batched searches, so fetch_results() only has to search
+    for the rest. Cached lookups of resources the identifier index shows have changed since are searched for again.
+
+    Args:
+        resources (list): tuples of (input_id, repo_id, resource_json) to export
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+        index_path (str, optional): filepath of the identifier index, the client's from id_index.get_index_path() if
+        None, skipped if it has not been built
+        cache (LookupCache instance, optional): cache of earlier resolutions, which new ones are added to
+
+    Returns:
+        resources (list): the same tuples in the same order, with resource_json set for every resolved identifier
+    """
+    repo_input_ids = {}
+    for input_id, repo_id, resource_json in resources:
+        if resource_json is None:
+            repo_input_ids.setdefault(repo_id, []).append(input_id)
+    index_path = index_path or id_index.get_index_path(lcache.client_url(client))
+    identifier_index = id_index.IdentifierIndex(index_path) if os.path.exists(index_path) else None
+    baseurl = lcache.client_url(client) if cache is not None else None
+    current_version = identifier_index.version if identifier_index is not None else None
+    resolved_resources = {}
+    for repo_id, input_ids in repo_input_ids.items():
+        if cache is not None:
+            uncached_ids = []
+            for input_id in input_ids:
+                resource_json = cache.get_search(baseurl, repo_id, input_id, current_version=current_version)
+                if resource_json is not None:
+                    resolved_resources[(input_id, repo_id)] = resource_json
+                else:
+                    uncached_ids.append(input_id)
+            if len(uncached_ids) < len(input_ids):
+                logger.info(f'Resolved {len(input_ids) - len(uncached_ids)} identifier(s) from the lookup cache')
+            input_ids = uncached_ids
+            if not input_ids:
+                continue
+        resolved, not_found, ambiguous = {}, [], {}
+        if identifier_index is not None:
+            resolved, not_found, ambiguous = identifier_index.resolve(input_ids, repo_id=repo_id)
+            input_ids = not_found + list(ambiguous)  # misses fall back to searching ArchivesSpace
+            logger.info(f'Resolved {len(resolved)} identifier(s) from the identifier index')
+        if input_ids:
+            try:
+                search_resolved, not_found, ambiguous = asx.resolve_identifiers(client, input_ids, repo_id=repo_id)
+                resolved.update(search_resolved)
+            except Exception as e:
+                logger.error(f'Error resolving identifiers in batch, searching for each individually: {e}')
+        for input_id, (resource_repo, resource_id, title, system_mtime, lock_version) in resolved.items():
+            # input_id matched the resource's identifier once non-alphanumeric characters were removed
+            resolved_resources[(input_id, repo_id)] = {"uri": f'/repositories/{resource_repo}/resources/{resource_id}',
+                                                       "title": title, "id_0": input_id, "system_mtime": system_mtime,
+                                                       "lock_version": lock_version}
+            if cache is not None:
+                cache.put_search(baseurl, repo_id, input_id, resolved_resources[(input_id, repo_id)])
+        if not_found or ambiguous:
+            logger.info(f'Searching individually for identifiers not resolved in batch: {not_found}, '
+                        f'{list(ambiguous)}')
+    return [(input_id, repo_id, resource_json or resolved_resources.get((input_id, repo_id)))
+            for input_id, repo_id, resource_json in resources]
+
+
+def get_cached_resource(cache, baseurl, uri):
+    """
+    Looks up a resource's JSON in the lookup cache for the publish check of an export all run.
+
+    If the identifier index has the resource, the cached JSON is only used at the lock_version the index last saw, so
+    a record saved since it was cached is requested again.
+
+    Args:
+        cache (LookupCache instance): the lookup cache
+        baseurl (str): the ArchivesSpace API URL
+        uri (str): the resource URI, ex. /repositories/2/resources/1
+
+    Returns:
+        resource_json (dict or None): the cached JSON with the resource's publish status, None if it is not cached
+    """
+    identifier_index = id_index.open_index(baseurl)
+    version = identifier_index.version(uri) if identifier_index is not None else None
+    resource_json = cache.get_resource(baseurl, uri, lock_version=version.get("lock_version") if version else None)
+    if resource_json is None or "publish" not in resource_json:  # cached from a search, which does not say
+        return None
+    return resource_json
+
+
+def export_resource(export_format, input_id, repo_id, client, defaults, cleanup_options=None, export_all=False,
+                    resource_json=None, archive=None, cleanup_pool=None):
+    """
+    Runs fetch_results() and the export method matching export_format for a single resource.
+
+    This is the unit of work handed to each worker thread by run_exports(). Nothing in it prints to the GUI, so results
+    can be reported in whatever order the workers finish. If a resource resolved from the lookup cache or the
+    identifier index is no longer in ArchivesSpace, see forget_resource(), its identifier is resolved again by searching
+    and the export is retried once.
+
+    Args:
+        export_format (str): one of the keys in EXPORT_FORMATS - ead, marcxml, pdf, or labels
+        input_id (str or int): user input resource identifier, or the ASpace resource id # when export_all is True
+        repo_id (int): ASpace repository id # or None to search across repositories
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        cleanup_options (list, optional): cleanup options passed to cleanup_eads() when exporting EADs
+        export_all (bool, optional): whether input_id is an ASpace resource id # from an export all run
+        resource_json (dict, optional): the resource's JSON or search result from an export all run, if it is already
+        known the resource is published and neither is requested again
+        archive (ExportArchive instance, optional): the run's archive for export_format, see write_export()
+        cleanup_pool (CleanupPool instance, optional): the run's cleanup pool, see write_export()
+
+    Returns:
+        resource_export (ASExport instance or None): the export with its result or error, None if the resource is
+        unpublished and export_all is True
+        valid (bool or None): if the EAD was cleaned, True if the XML was valid and False if not, otherwise None
+        results (str or None): cleanup results if the EAD was cleaned, otherwise None
+    """
+    section, output_key = EXPORT_FORMATS[export_format]
+    if export_all is True and resource_json is None:
+        cache, uri = lcache.get_lookup_cache(defaults), f'/repositories/{str(repo_id)}/resources/{str(input_id)}'
+        resource_json = get_cached_resource(cache, lcache.client_url(client), uri)
+        if resource_json is None:
+            resource_json = client.get(uri).json()
+            cache.put_resource(lcache.client_url(client), resource_json)
+        if resource_json["publish"] is not True:
+            return None, None, None
+    resource_export = asx.ASExport(input_id, repo_id, client, defaults[section][output_key], export_all=export_all)
+    resource_export.fetch_results(resource_json=resource_json)  # reuse the JSON from the publish check
+    if resource_export.error is not None:
+        return resource_export, None, None
+    resource_export, valid, results = write_export(export_format, resource_export, defaults, cleanup_options, archive,
+                                                   cleanup_pool)
+    if export_all is False and resource_json is not None and resource_export.status_code == 404:
+        logger.info(f'{input_id} resolved to a resource that is no longer in ArchivesSpace, resolving it again')
+        resource_json = resolve_resources([(input_id, repo_id, None)], client,
+                                          cache=lcache.get_lookup_cache(defaults))[0][2]
+        resource_export = asx.ASExport(input_id, repo_id, client, defaults[section][output_key])
+        resource_export.fetch_results(resource_json=resource_json)  # searches individually if it is still not found
+        if resource_export.error is not None:
+            return resource_export, None, None
+        return write_export(export_format, resource_export, defaults, cleanup_options, archive, cleanup_pool)
+    return resource_export, valid, results
+
+
+def write_export(export_format, resource_export, defaults, cleanup_options=None, archive=None, cleanup_pool=None):
+    """
+    Runs the export method matching export_format on a resource that fetch_results() has already found.
+
+    Args:
+        export_format (str): one of the keys in EXPORT_FORMATS - ead, marcxml, pdf, or labels
+        resource_export (ASExport instance): the export with resource_id and resource_repo set by fetch_results()
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        cleanup_options (list, optional): cleanup options passed to cleanup_eads() when exporting EADs
+        archive (ExportArchive instance, optional): the run's archive for export_format, which raw EAD exports are
+        moved into once cleaned and other exports are written to, see export_archive.open_run_archive()
+        cleanup_pool (CleanupPool instance, optional): if given, EADs are not cleaned here but left for the caller to
+        clean in the pool's processes with submit_cleanup(), see get_run_cleanup_pool()
+
+    Returns:
+        resource_export (ASExport instance): the export with its result or error
+        valid (bool or None): if the EAD was cleaned, True if the XML was valid and False if not, otherwise None
+        results (str or None): cleanup results if the EAD was cleaned, otherwise None
+    """
+    if export_format != "ead":
+        resource_export.archive = archive
+    if export_format == "ead":
+        resource_export.export_ead(include_unpublished=defaults["ead_export_default"]["_INCLUDE_UNPUB_"],
+                                   include_daos=defaults["ead_export_default"]["_INCLUDE_DAOS_"],
+                                   numbered_cs=defaults["ead_export_default"]["_NUMBERED_CS_"],
+                                   ead3=defaults["ead_export_default"]["_USE_EAD3_"])
+        if cleanup_pool is None and needs_cleanup(export_format, resource_export, defaults):
+            start_time = time.perf_counter()
+            valid, results = clean.cleanup_eads(resource_export.filepath, cleanup_options,
+                                                defaults["ead_export_default"]["_OUTPUT_DIR_"],
+                                                keep_raw_exports=defaults["ead_export_default"]["_KEEP_RAW_"],
+                                                archive=archive, stream_min_size=clean.get_stream_min_size(defaults))
+            resource_export.add_timing("cleanup", time.perf_counter() - start_time)
+            return resource_export, valid, results
+    elif export_format == "marcxml":
+        resource_export.export_marcxml(include_unpublished=defaults["marc_export_default"]["_INCLUDE_UNPUB_"])
+    elif export_format == "pdf":
+        resource_export.export_pdf(include_unpublished=defaults["pdf_export_default"]["_INCLUDE_UNPUB_"],
+                                   include_daos=defaults["pdf_export_default"]["_INCLUDE_DAOS_"],
+                                   numbered_cs=defaults["pdf_export_default"]["_NUMBERED_CS_"],
+                                   ead3=defaults["pdf_export_default"]["_USE_EAD3_"])
+    else:
+        resource_export.export_labels()
+    if resource_export.error is not None and resource_export.resource_id is not None:
+        forget_resource(resource_export, defaults)
+    return resource_export, None, None
+
+
+def forget_resource(resource_export, defaults):
+    """
+    Drops a resource whose export failed from the lookup cache, as the cached lookup may point to a resource that has
+    since changed or been deleted, and from the identifier index if ArchivesSpace answered 404 Not Found.
+
+    Args:
+        resource_export (ASExport instance): the failed export, with resource_id, resource_repo and status_code set
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        None
+    """
+    baseurl = lcache.client_url(resource_export.client)
+    uri = f'/repositories/{resource_export.resource_repo}/resources/{resource_export.resource_id}'
+    lcache.get_lookup_cache(defaults).invalidate(baseurl, uri)
+    if resource_export.status_code == 404:
+        identifier_index = id_index.open_index(baseurl)
+        if identifier_index is not None:
+            identifier_index.remove(uri)
+            logger.info(f'Dropped {uri} from the identifier index, ArchivesSpace no longer has it')
+
+
+def needs_cleanup(export_format, resource_export, defaults):
+    """
+    Checks whether an export is an EAD that was written without errors and should be cleaned.
+
+    Args:
+        export_format (str): one of the keys in EXPORT_FORMATS - ead, marcxml, pdf, or labels
+        resource_export (ASExport instance or None): the export
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        (bool): True if the EAD should be cleaned
+    """
+    return export_format == "ead" and resource_export is not None and resource_export.error is None and \
+        defaults["ead_export_default"]["_CLEAN_EADS_"] is True
+
+
+def get_run_cleanup_pool(export_formats, defaults):
+    """
+    Gets the pool of processes a run cleans its EADs in, if EADs are exported and cleaned in more than one process.
+
+    Args:
+        export_formats (list): keys in EXPORT_FORMATS exported in the run
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        (CleanupPool instance or None): the shared cleanup pool, None if EADs are cleaned by the export threads
+    """
+    if "ead" not in export_formats or defaults["ead_export_default"]["_CLEAN_EADS_"] is not True:
+        return None
+    cleanup_pool = cpool.get_cleanup_pool(defaults)
+    return cleanup_pool if cleanup_pool.processes > 1 else None
+
+
+def submit_cleanup(cleanup_pool, resource_export, defaults, cleanup_options=None):
+    """
+    Starts cleaning an EAD written by write_export() with a cleanup pool in one of its processes.
+
+    Args:
+        cleanup_pool (CleanupPool instance): the run's cleanup pool
+        resource_export (ASExport instance): the export of the EAD
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        cleanup_options (list, optional): cleanup options passed to cleanup_eads() when exporting EADs
+
+    Returns:
+        (concurrent.futures.Future object): pass to finish_cleanup() once it is done
+    """
+    return cleanup_pool.submit(resource_export.filepath, cleanup_options,
+                               defaults["ead_export_default"]["_OUTPUT_DIR_"], clean.get_stream_min_size(defaults))
+
+
+def finish_cleanup(cleanup_pool, future, resource_export, defaults, archive=None):
+    """
+    Waits for a cleanup started by submit_cleanup() and handles the raw export, timing the cleanup on the export.
+
+    Args:
+        cleanup_pool (CleanupPool instance): the run's cleanup pool
+        future (concurrent.futures.Future object): returned by submit_cleanup()
+        resource_export (ASExport instance): the export of the EAD
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        archive (ExportArchive instance, optional): the run's archive raw EAD exports are moved into once cleaned
+
+    Returns:
+        valid (bool): True if the XML was valid and False if not
+        results (str): cleanup results
+    """
+    valid, results, seconds = cleanup_pool.finish(future, resource_export.filepath,
+                                                  defaults["ead_export_default"]["_KEEP_RAW_"], archive)
+    resource_export.add_timing("cleanup", seconds)
+    return valid, results
+
+
+def run_exports(export_format, resources, client, defaults, cleanup_options=None, export_all=False,
+                max_workers=None):
+    """
+    Exports resources over a bounded pool of worker threads and yields each one as soon as it finishes.
+
+    User input identifiers are first resolved in batches with resolve_resources(). An exception raised while exporting
+    one resource is caught and turned into that resource's error, so one bad record never stops the rest of the batch.
+    EADs are cleaned in the processes of a cleanup pool if there is more than one, so the worker threads go on
+    exporting while they are cleaned, see get_run_cleanup_pool(). The stage timings of every export are written to
+    the logs folder when the run ends, see export_timing.RunTimings.
+
+    Args:
+        export_format (str): one of the keys in EXPORT_FORMATS - ead, marcxml, pdf, or labels
+        resources (list): tuples of (input_id, repo_id, resource_json) to export, resource_json is None unless it
+        was found by as_export.fetch_published_resources()
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        cleanup_options (list, optional): cleanup options passed to cleanup_eads() when exporting EADs
+        export_all (bool, optional): whether resources contain ASpace resource id #s from an export all run
+        max_workers (int, optional): number of resources to export at the same time, read from defaults if None
+
+    Yields:
+        input_id (str or int): the resource identifier as given in resources
+        resource_export (ASExport instance or None): see export_resource()
+        valid (bool or None): see export_resource()
+        results (str or None): see export_resource()
+    """
+    timings = extiming.RunTimings(export_format)
+    cache = lcache.get_lookup_cache(defaults)
+    if export_all is False:
+        start_time = time.perf_counter()
+        resources = resolve_resources(resources, client, cache=cache)
+        timings.run_stages["resolve"] = round(time.perf_counter() - start_time, 6)
+    else:  # the published resources searched for an Export All show which cached lookups are out of date
+        cache.observe(lcache.client_url(client), [resource_json for _, _, resource_json in resources
+                                                  if resource_json is not None])
+    if max_workers is None:
+        max_workers = get_max_workers(defaults)
+    max_workers = min(max_workers, max(1, len(resources)))
+    logger.info(f'Exporting {len(resources)} {export_format} resource(s) with {max_workers} worker(s)')
+    archive = exarchive.open_run_archive(defaults, export_format)
+    cleanup_pool = get_run_cleanup_pool([export_format], defaults)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{export_format}_export') as executor:
+            pending = {executor.submit(export_resource, export_format, input_id, repo_id, client, defaults,
+                                       cleanup_options, export_all, resource_json, archive, cleanup_pool):
+                       (input_id, repo_id, None) for input_id, repo_id, resource_json in resources}
+            while pending:
+                for future in wait(pending, return_when=FIRST_COMPLETED).done:
+                    input_id, repo_id, cleaned_export = pending.pop(future)  # cleaned_export is set for cleanups
+                    try:
+                        if cleaned_export is None:
+                            resource_export, valid, results = future.result()
+                        else:
+                            resource_export = cleaned_export
+                            valid, results = finish_cleanup(cleanup_pool, future, resource_export, defaults, archive)
+                    except Exception as e:
+                        logger.error(f'Error exporting {input_id}: {e}')
+                        section, output_key = EXPORT_FORMATS[export_format]
+                        resource_export = asx.ASExport(input_id, repo_id, client, defaults[section][output_key],
+                                                       export_all=export_all)
+                        resource_export.error = "\nThe following errors were found when exporting {}:\n{}\n".format(
+                            input_id, e)
+                        resource_export.error += "-" * 135
+                        valid, results = None, None
+                    if cleaned_export is None and cleanup_pool is not None and \
+                            needs_cleanup(export_format, resource_export, defaults):
+                        pending[submit_cleanup(cleanup_pool, resource_export, defaults, cleanup_options)] = \
+                            (input_id, repo_id, resource_export)
+                        continue
+                    if resource_export is not None:
+                        timings.record(resource_export, export_format, valid)
+                    yield input_id, resource_export, valid, results
+    finally:
+        if archive is not None:
+            archive.close()
+        timings.write_reports()
+        cache.save()
+        logger.info(f'Lookup cache: {cache.stats()}')
+
+
+def copy_export(resource_export, export_format, defaults):
+    """
+    Copies a resource found by fetch_results() into a new ASExport writing to another export format's output directory,
+    so the resource does not have to be searched for again.
+
+    Args:
+        resource_export (ASExport instance): the export with resource_id and resource_repo set by fetch_results()
+        export_format (str): one of the keys in EXPORT_FORMATS - ead, marcxml, pdf, or labels
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        format_export (ASExport instance): a new export of the same resource, ready for write_export()
+    """
+    section, output_key = EXPORT_FORMATS[export_format]
+    format_export = asx.ASExport(resource_export.input_id, resource_export.repo_id, resource_export.client,
+                                 defaults[section][output_key], export_all=resource_export.export_all,
+                                 stream=resource_export.stream)
+    format_export.resource_id = resource_export.resource_id
+    format_export.resource_repo = resource_export.resource_repo
+    format_export.result = resource_export.result
+    format_export.search_result = resource_export.search_result
+    format_export.filepath = str(Path(defaults[section][output_key], Path(resource_export.filepath).name))
+    return format_export
+
+
+def run_multi_exports(export_formats, resources, client, defaults, cleanup_options=None, max_workers=None):
+    """
+    Exports resources in several formats at once, finding each resource only once for all of them.
+
+    User input identifiers are resolved in batches with resolve_resources(), then fetch_results() runs once per
+    resource and every selected format is exported from that result over the same pool of worker threads. EADs are
+    cleaned in the processes of a cleanup pool if there is more than one, as in run_exports(). The stage
+    timings of every export are written to the logs folder when the run ends, see export_timing.RunTimings.
+
+    Args:
+        export_formats (list): keys in EXPORT_FORMATS to export - ead, marcxml, pdf, and/or labels
+        resources (list): tuples of (input_id, repo_id, resource_json) to export
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        cleanup_options (list, optional): cleanup options passed to cleanup_eads() when exporting EADs
+        max_workers (int, optional): number of exports to run at the same time, read from defaults if None
+
+    Yields:
+        input_id (str): the resource identifier as given in resources
+        export_format (str or None): the export format, None if the resource could not be found, in which case it is
+        yielded once for all formats
+        resource_export (ASExport instance): the export with its result or error
+        valid (bool or None): if the EAD was cleaned, True if the XML was valid and False if not, otherwise None
+        results (str or None): cleanup results if the EAD was cleaned, otherwise None
+    """
+    timings = extiming.RunTimings("_".join(export_formats))
+    cache = lcache.get_lookup_cache(defaults)
+    start_time = time.perf_counter()
+    resources = resolve_resources(resources, client, cache=cache)
+    timings.run_stages["resolve"] = round(time.perf_counter() - start_time, 6)
+    if max_workers is None:
+        max_workers = get_max_workers(defaults)
+    max_workers = min(max_workers, max(1, len(resources) * len(export_formats)))
+    logger.info(f'Exporting {len(resources)} resource(s) as {", ".join(export_formats)} with {max_workers} '
+                f'worker(s)')
+    first_section, first_key = EXPORT_FORMATS[export_formats[0]]
+
+    def fetch_resource(input_id, repo_id, resource_json):
+        resource_export = asx.ASExport(input_id, repo_id, client, defaults[first_section][first_key])
+        resource_export.fetch_results(resource_json=resource_json)
+        return resource_export
+
+    def failed_export(input_id, repo_id, export_format, e):
+        logger.error(f'Error exporting {input_id}: {e}')
+        section, output_key = EXPORT_FORMATS[export_format or export_formats[0]]
+        resource_export = asx.ASExport(input_id, repo_id, client, defaults[section][output_key])
+        resource_export.error = "\nThe following errors were found when exporting {}:\n{}\n".format(input_id, e)
+        resource_export.error += "-" * 135
+        return resource_export
+
+    archives = {export_format: exarchive.open_run_archive(defaults, export_format) for export_format in export_formats}
+    cleanup_pool = get_run_cleanup_pool(export_formats, defaults)
+    cleaning = {}  # cleanup future as key and the export of the EAD being cleaned as value
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='multi_export') as executor:
+            pending = {executor.submit(fetch_resource, input_id, repo_id, resource_json): (input_id, repo_id, None)
+                       for input_id, repo_id, resource_json in resources}
+            while pending:
+                done = wait(pending, return_when=FIRST_COMPLETED).done
+                for future in done:
+                    input_id, repo_id, export_format = pending.pop(future)
+                    if export_format is None:  # the resource was found, so each format's export can start
+                        try:
+                            resource_export = future.result()
+                        except Exception as e:
+                            yield input_id, None, failed_export(input_id, repo_id, None, e), None, None
+                            continue
+                        timings.record(resource_export)  # the search, shared by each format's export
+                        if resource_export.error is not None:
+                            yield input_id, None, resource_export, None, None
+                            continue
+                        for fmt in export_formats:
+                            pending[executor.submit(write_export, fmt, copy_export(resource_export, fmt, defaults),
+                                                    defaults, cleanup_options, archives[fmt], cleanup_pool)] = \
+                                (input_id, repo_id, fmt)
+                        continue
+                    cleaned_export = cleaning.pop(future, None)
+                    try:
+                        if cleaned_export is None:
+                            resource_export, valid, results = future.result()
+                        else:
+                            resource_export = cleaned_export
+                            valid, results = finish_cleanup(cleanup_pool, future, resource_export, defaults,
+                                                            archives[export_format])
+                    except Exception as e:
+                        resource_export, valid, results = failed_export(input_id, repo_id, export_format, e), None, None
+                    if cleaned_export is None and cleanup_pool is not None and \
+                            needs_cleanup(export_format, resource_export, defaults):
+                        future = submit_cleanup(cleanup_pool, resource_export, defaults, cleanup_options)
+                        pending[future] = (input_id, repo_id, export_format)
+                        cleaning[future] = resource_export
+                        continue
+                    timings.record(resource_export, export_format, valid)
+                    yield input_id, export_format, resource_export, valid, results
+    finally:
+        for archive in archives.values():
+            if archive is not None:
+                archive.close()
+        timings.write_reports()
+        cache.save()
+        logger.info(f'Lookup cache: {cache.stats()}')
@@ -0,0 +1,146 @@
+import time
+
+REFRESH_INTERVAL = 0.25
+"""float: fewest seconds between progress updates sent to the GUI, so large batches don't flood its event queue"""
+
+
+def format_size(size):
+    """
+    Formats a number of bytes for display, ex. 1.5 MB.
+
+    Args:
+        size (int or float): number of bytes
+
+    Returns:
+        (str): the size in the largest unit it is at least 1 of
+    """
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return f'{size:.0f} {unit}' if unit == "B" else f'{size:.1f} {unit}'
+        size /= 1024
+
+
+def format_duration(seconds):
+    """
+    Formats a number of seconds for display, ex. 1h 02m or 3m 05s.
+
+    Args:
+        seconds (int or float): number of seconds
+
+    Returns:
+        (str): the duration in hours and minutes, minutes and seconds, or seconds
+    """
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f'{hours}h {minutes:02d}m'
+    if minutes:
+        return f'{minutes}m {seconds:02d}s'
+    return f'{seconds}s'
+
+
+class ProgressAggregator:
+    """
+    Counts finished exports and sends the GUI at most one progress update per REFRESH_INTERVAL.
+
+    Each update is a tuple of (completed, total, rates), where rates is a line of text with the exports per second,
+    bytes per second and estimated time left, so the progress bar can show them instead of each export printing them.
+    The first and last updates are always sent.
+    """
+    def __init__(self, total, send, interval=REFRESH_INTERVAL):
+        """
+        Must contain the number of exports in the batch and the function progress updates are sent with.
+
+        Args:
+            total (int): number of exports in the batch
+            send (function): called with each (completed, total, rates) update, ex. a lambda calling
+            gui_window.write_event_value('-EXPORT_PROGRESS-', update)
+            interval (float, optional): fewest seconds between updates
+        """
+        self.total = total
+        """int: number of exports in the batch"""
+        self.send = send
+        """function: called with each (completed, total, rates) update"""
+        self.interval = interval
+        """float: fewest seconds between updates"""
+        self.completed = 0
+        """int: number of exports finished, including failures"""
+        self.failed = 0
+        """int: number of exports that failed"""
+        self.bytes_written = 0
+        """int: bytes written by the finished exports"""
+        self.start_time = time.perf_counter()
+        """float: time.perf_counter() when the batch started"""
+        self.last_sent = None
+        """float: time.perf_counter() when the last update was sent, None if none has been"""
+
+    def advance(self, count=1, bytes_written=0, failed=False):
+        """
+        Counts finished exports and sends an update if the last one was sent long enough ago.
+
+        Args:
+            count (int, optional): number of exports that finished
+            bytes_written (int, optional): bytes the exports wrote to disk
+            failed (bool, optional): whether the exports failed
+
+        Returns:
+            None
+        """
+        self.completed += count
+        self.bytes_written += bytes_written or 0
+        if failed is True:
+            self.failed += count
+        self.refresh()
+
+    def skip(self, count=1):
+        """
+        Removes exports from the batch that turned out to have nothing to export, ex. unpublished resources.
+
+        Args:
+            count (int, optional): number of exports removed
+
+        Returns:
+            None
+        """
+        self.total -= count
+        self.refresh()
+
+    def refresh(self, force=False):
+        """
+        Sends an update if it is the first or last one, or the last one was sent at least interval seconds ago.
+
+        Args:
+            force (bool, optional): send the update no matter when the last one was sent
+
+        Returns:
+            None
+        """
+        now = time.perf_counter()
+        if force is True or self.last_sent is None or self.completed >= self.total or \
+                now - self.last_sent >= self.interval:
+            self.last_sent = now
+            self.send((self.completed, self.total, self.rates(now)))
+
+    def rates(self, now=None):
+        """
+        Builds the line of throughput and time left shown under the progress bar.
+
+        Args:
+            now (float, optional): time.perf_counter() to measure to, the current time if None
+
+        Returns:
+            (str): ex. 4.2 exports/sec | 1.3 MB/sec | about 2m 10s left
+        """
+        elapsed = max((now or time.perf_counter()) - self.start_time, 1e-6)
+        items_per_sec = self.completed / elapsed
+        rates = [f'{items_per_sec:.1f} exports/sec', f'{format_size(self.bytes_written / elapsed)}/sec']
+        remaining = self.total - self.completed
+        if remaining <= 0:
+            rates.append(f'finished in {format_duration(elapsed)}')
+        elif items_per_sec > 0:
+            rates.append(f'about {format_duration(remaining / items_per_sec)} left')
+        else:
+            rates.append("estimating time left")
+        if self.failed:
+            rates.append(f'{self.failed} failed')
+        return " | ".join(rates)
@@ -0,0 +1,180 @@
+import csv
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from as_logging import LOG_DIR, logger
+
+TIMING_STAGES = ["search", "export", "write", "cleanup"]
+"""list: stages of an export timed on ASExport.timings - finding the resource, ArchivesSpace generating and sending the
+export, writing it to disk, and cleaning an EAD"""
+PERCENTILES = [50, 90, 95, 99]
+"""list: percentiles of each stage's seconds reported for a run"""
+REPORT_NAME = "timings_{}_{}"
+"""str: name of a run's JSON and CSV reports, formatted with the run name and the time the run started"""
+PROMETHEUS_FILE = "export_timings_{}.prom"
+"""str: Prometheus textfile replaced at the end of each run, formatted with the run name"""
+METRIC_PREFIX = "aspace_export"
+"""str: prefix of every metric in the Prometheus textfile"""
+CSV_FIELDS = ["resource", "format", "stage", "seconds", "bytes", "status"]
+"""list: columns of the CSV report, one row per stage of each export"""
+
+
+def percentile(values, percent):
+    """
+    Finds a percentile of a list of numbers, interpolating between the two closest values.
+
+    Args:
+        values (list): the numbers, sorted from smallest to largest
+        percent (int or float): the percentile to find, from 0 to 100
+
+    Returns:
+        (float): the percentile, 0.0 if values is empty
+    """
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class RunTimings:
+    """
+    Collects the stage timings of every export in a run and writes them as reports in the logs folder when it ends.
+
+    Each finished ASExport adds one span per stage it went through, with the resource, its size and whether it
+    succeeded. The run writes a JSON report with the percentiles of each stage and every span, a CSV of the spans, and
+    a Prometheus textfile with the percentiles that a node_exporter textfile collector can read.
+    """
+    def __init__(self, run_name, log_dir=LOG_DIR):
+        """
+        Must contain the name of the run, used in the report filenames.
+
+        Args:
+            run_name (str): name of the run, ex. the export format or formats
+            log_dir (str, optional): folder the reports are written to
+        """
+        self.run_name = run_name
+        """str: name of the run, used in the report filenames and Prometheus labels"""
+        self.log_dir = log_dir
+        """str: folder the reports are written to"""
+        self.started = datetime.now()
+        """datetime.datetime object: when the run started"""
+        self.spans = []
+        """list: dicts with each CSV_FIELDS value of every stage timed in the run"""
+        self.run_stages = {}
+        """dict: seconds spent in stages covering the whole run rather than one resource, ex. resolving identifiers in
+        batches, with the stage name as key"""
+        self.lock = threading.Lock()
+        """threading.Lock object: keeps exports finishing at the same time from interleaving their spans"""
+
+    def record(self, resource_export, export_format=None, valid=None):
+        """
+        Adds the stage timings of a finished export to the run.
+
+        Args:
+            resource_export (ASExport instance): the finished export, with its timings
+            export_format (str, optional): the format exported, None if the export stopped before a format was chosen
+            valid (bool, optional): the result of cleanup_eads() if the export was cleaned
+
+        Returns:
+            None
+        """
+        if resource_export.error is not None:
+            status = "error"
+        elif valid is False:
+            status = "invalid"
+        else:
+            status = "ok"
+        with self.lock:
+            for stage in TIMING_STAGES:
+                if stage in resource_export.timings:
+                    self.spans.append({"resource": resource_export.input_id, "format": export_format or "",
+                                       "stage": stage, "seconds": round(resource_export.timings[stage], 6),
+                                       "bytes": resource_export.bytes_written, "status": status})
+
+    def summary(self):
+        """
+        Aggregates the run's spans into the count, total, percentiles and maximum seconds of each stage.
+
+        Returns:
+            summary (dict): stage name as key and a dict of count, total, p50, p90, p95, p99 and max as value, for
+            each stage timed in the run
+        """
+        summary = {}
+        with self.lock:
+            spans = list(self.spans)
+        for stage in TIMING_STAGES:
+            seconds = sorted(span["seconds"] for span in spans if span["stage"] == stage)
+            if not seconds:
+                continue
+            summary[stage] = {"count": len(seconds), "total": round(sum(seconds), 6)}
+            for percent in PERCENTILES:
+                summary[stage][f'p{percent}'] = round(percentile(seconds, percent), 6)
+            summary[stage]["max"] = seconds[-1]
+        return summary
+
+    def write_reports(self):
+        """
+        Writes the run's JSON and CSV reports and replaces its Prometheus textfile, if anything was timed.
+
+        Returns:
+            report_path (str or None): filepath of the JSON report, None if nothing was timed or it could not be written
+        """
+        if not self.spans and not self.run_stages:
+            return None
+        summary = self.summary()
+        report_name = REPORT_NAME.format(self.run_name, self.started.strftime("%Y%m%d%H%M%S"))
+        report_path = str(Path(self.log_dir, report_name + ".json"))
+        try:
+            os.makedirs(self.log_dir, exist_ok=True)
+            with open(report_path, "w") as report_file:
+                json.dump({"run": self.run_name, "started": self.started.isoformat(timespec="seconds"),
+                           "finished": datetime.now().isoformat(timespec="seconds"), "run_stages": self.run_stages,
+                           "stages": summary, "spans": self.spans}, report_file, indent=2)
+            with open(Path(self.log_dir, report_name + ".csv"), "w", newline="") as csv_file:
+                writer = csv.DictWriter(csv_file, fieldnames=CSV_FIELDS)
+                writer.writeheader()
+                writer.writerows(self.spans)
+            self.write_prometheus(summary)
+        except OSError as e:
+            logger.error(f'Error writing export timing reports: {e}')
+            return None
+        logger.info(f'Export stage timings for {self.run_name}: {self.run_stages} {summary}')
+        return report_path
+
+    def write_prometheus(self, summary):
+        """
+        Writes the stage percentiles as a Prometheus summary, replacing the file only once it is complete.
+
+        Args:
+            summary (dict): the run's summary from summary()
+
+        Returns:
+            None
+        """
+        metric = f'{METRIC_PREFIX}_stage_seconds'
+        lines = [f'# HELP {metric} Seconds spent in each stage of the last run\'s exports.',
+                 f'# TYPE {metric} summary']
+        for stage, stats in summary.items():
+            labels = f'run="{self.run_name}",stage="{stage}"'
+            for percent in PERCENTILES:
+                lines.append(f'{metric}{{{labels},quantile="{percent / 100}"}} {stats[f"p{percent}"]}')
+            lines.append(f'{metric}_sum{{{labels}}} {stats["total"]}')
+            lines.append(f'{metric}_count{{{labels}}} {stats["count"]}')
+        if self.run_stages:
+            lines += [f'# HELP {METRIC_PREFIX}_run_stage_seconds Seconds spent in stages covering the whole last run.',
+                      f'# TYPE {METRIC_PREFIX}_run_stage_seconds gauge']
+            for stage, seconds in self.run_stages.items():
+                lines.append(f'{METRIC_PREFIX}_run_stage_seconds{{run="{self.run_name}",stage="{stage}"}} {seconds}')
+        lines += [f'# HELP {METRIC_PREFIX}_last_run_timestamp_seconds When the last run finished.',
+                  f'# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge',
+                  f'{METRIC_PREFIX}_last_run_timestamp_seconds{{run="{self.run_name}"}} '
+                  f'{datetime.now().timestamp():.0f}']
+        prometheus_path = str(Path(self.log_dir, PROMETHEUS_FILE.format(self.run_name)))
+        with open(prometheus_path + ".part", "w") as prometheus_file:
+            prometheus_file.write("\n".join(lines) + "\n")
+        os.replace(prometheus_path + ".part", prometheus_path)
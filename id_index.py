@@ -0,0 +1,252 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+import as_export as asx
+import lookup_cache as lcache
+from as_logging import logger
+
+INDEX_FILE = "id_index_{}.db"
+"""str: the identifier index of each ArchivesSpace instance, kept next to defaults.json, formatted with a hash of its
+API URL"""
+index_fields = ["uri", "title", "identifier", "publish", "system_mtime", "lock_version"]
+"""list: search result fields stored in the identifier index"""
+_refresh_lock = threading.Lock()
+"""threading.Lock object: keeps two refreshes from writing to the index at the same time"""
+
+
+class IdentifierIndex:
+    """
+    A local SQLite index of the published resource identifiers of one ArchivesSpace instance, so ASExport does not need
+    the search API to find a resource. Each instance has its own index file, see get_index_path().
+
+    Identifiers are stored normalized the same way as in ASExport.read_results(), with all non-alphanumeric characters
+    removed. Each method opens its own connection, so the index can be used from export worker threads.
+    """
+    def __init__(self, index_path):
+        """
+        Must contain the path to the SQLite file, which is created if it does not exist.
+
+        Args:
+            index_path (str): filepath of the SQLite file holding the index, see get_index_path()
+        """
+        self.index_path = index_path
+        """str: filepath of the SQLite file holding the index"""
+        with self.connect() as index_db:
+            index_db.execute("CREATE TABLE IF NOT EXISTS resources (uri TEXT PRIMARY KEY, repo_id INTEGER, "
+                             "resource_id INTEGER, combined_id TEXT, identifier TEXT, title TEXT, publish INTEGER, "
+                             "system_mtime TEXT, lock_version INTEGER)")
+            columns = [column[1] for column in index_db.execute("PRAGMA table_info(resources)")]
+            if "lock_version" not in columns:  # indexes built before lock_version was stored
+                index_db.execute("ALTER TABLE resources ADD COLUMN lock_version INTEGER")
+            index_db.execute("CREATE INDEX IF NOT EXISTS resources_combined_id ON resources (combined_id)")
+            index_db.execute("CREATE TABLE IF NOT EXISTS repositories (repo_id INTEGER PRIMARY KEY, "
+                             "last_mtime TEXT)")
+
+    def connect(self):
+        """
+        Opens a connection to the index.
+
+        Returns:
+            index_db (sqlite3.Connection): a connection that commits when used as a context manager
+        """
+        return sqlite3.connect(self.index_path, timeout=30)
+
+    def refresh(self, client, repo_id, full=False, page_size=100):
+        """
+        Adds resources created or modified in a repository since the last refresh to the index, and drops the ones that
+        were unpublished or deleted.
+
+        Only resources with a system_mtime at or after the newest one already indexed are requested, and those that
+        are no longer published are dropped. Deleting a resource leaves nothing to search for, so an incremental
+        refresh also requests the ids of every resource in the repository, a single request, and drops the indexed
+        resources that are not among them. A full refresh clears the repository first.
+
+        Args:
+            client (ASnake.client object): a client object from ASnake.client to allow to connect to the ASpace API
+            repo_id (int): contains the number for which a repository is assigned via the ArchivesSpace instance
+            full (bool, optional): whether to re-index every resource in the repository
+            page_size (int, optional): number of search results requested at a time
+
+        Returns:
+            indexed (int): number of resources added or updated
+        """
+        incremental = full is False and self.has_repository(repo_id)
+        params = {"q": "*", "type": ['resource'], "fields": index_fields}
+        with self.connect() as index_db:
+            last_mtime = index_db.execute("SELECT last_mtime FROM repositories WHERE repo_id = ?",
+                                          (repo_id,)).fetchone()
+        if last_mtime is not None and last_mtime[0] and full is False:
+            params["filter_query"] = [f'system_mtime:[{last_mtime[0]} TO *]']
+        rows, unpublished_uris = [], []
+        newest_mtime = last_mtime[0] if last_mtime is not None and full is False else None
+        for result in client.get_paged(f'/repositories/{str(repo_id)}/search', page_size=page_size, params=params):
+            identifier = result.get("identifier", "")
+            system_mtime = result.get("system_mtime")
+            if system_mtime is not None and (newest_mtime is None or system_mtime > newest_mtime):
+                newest_mtime = system_mtime
+            if result.get("publish") is False:
+                unpublished_uris.append((result["uri"],))
+                continue
+            rows.append((result["uri"], repo_id, int(result["uri"].split("/")[-1]),
+                         asx.id_combined_regex.sub('', identifier), identifier, result.get("title", ""),
+                         int(result.get("publish", False) is True), system_mtime, result.get("lock_version")))
+        resource_ids = None
+        if incremental is True:
+            resource_ids = set(client.get(f'/repositories/{str(repo_id)}/resources', params={"all_ids": True}).json())
+        with self.connect() as index_db:
+            if full is True:
+                index_db.execute("DELETE FROM resources WHERE repo_id = ?", (repo_id,))
+            index_db.executemany("DELETE FROM resources WHERE uri = ?", unpublished_uris)
+            if resource_ids is not None:
+                indexed_uris = index_db.execute("SELECT uri, resource_id FROM resources WHERE repo_id = ?", (repo_id,))
+                deleted_uris = [(uri,) for uri, resource_id in indexed_uris if resource_id not in resource_ids]
+                index_db.executemany("DELETE FROM resources WHERE uri = ?", deleted_uris)
+                if deleted_uris:
+                    logger.info(f'Dropped {len(deleted_uris)} deleted resource(s) from the identifier index')
+            index_db.executemany("INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            index_db.execute("INSERT OR REPLACE INTO repositories VALUES (?, ?)", (repo_id, newest_mtime))
+        return len(rows)
+
+    def has_repository(self, repo_id):
+        """
+        Checks whether a repository has been indexed before.
+
+        Args:
+            repo_id (int): the repository's id #
+
+        Returns:
+            (bool): True if the repository has been refreshed at least once
+        """
+        with self.connect() as index_db:
+            return index_db.execute("SELECT 1 FROM repositories WHERE repo_id = ?", (repo_id,)).fetchone() is not None
+
+    def remove(self, uri):
+        """
+        Drops a resource from the index, ex. when exporting it shows it was deleted from ArchivesSpace.
+
+        Args:
+            uri (str): the resource URI, ex. /repositories/2/resources/1
+
+        Returns:
+            None
+        """
+        with self.connect() as index_db:
+            index_db.execute("DELETE FROM resources WHERE uri = ?", (uri,))
+
+    def lookup(self, input_id, repo_id=None):
+        """
+        Finds every indexed resource whose identifier matches the user input identifier.
+
+        Args:
+            input_id (str): user input resource identifier
+            repo_id (int, optional): repository to look in, or None to look across repositories
+
+        Returns:
+            matches (list): a (repo_id, resource_id, title, system_mtime, lock_version) tuple for each matching resource
+        """
+        combined_id = asx.id_combined_regex.sub('', input_id)
+        with self.connect() as index_db:
+            if repo_id is None:
+                matches = index_db.execute("SELECT repo_id, resource_id, title, system_mtime, lock_version "
+                                           "FROM resources WHERE combined_id = ?", (combined_id,)).fetchall()
+            else:
+                matches = index_db.execute("SELECT repo_id, resource_id, title, system_mtime, lock_version "
+                                           "FROM resources WHERE combined_id = ? AND repo_id = ?",
+                                           (combined_id, repo_id)).fetchall()
+        return matches
+
+    def version(self, uri):
+        """
+        Gets the system_mtime and lock_version of an indexed resource, as of the last time the index was refreshed.
+
+        Args:
+            uri (str): the resource URI, ex. /repositories/2/resources/1
+
+        Returns:
+            (dict or None): the resource's system_mtime and lock_version, None if it is not in the index
+        """
+        with self.connect() as index_db:
+            row = index_db.execute("SELECT system_mtime, lock_version FROM resources WHERE uri = ?", (uri,)).fetchone()
+        return {"system_mtime": row[0], "lock_version": row[1]} if row is not None else None
+
+    def resolve(self, input_ids, repo_id=None):
+        """
+        Looks up many user input identifiers, returning the same way as as_export.resolve_identifiers().
+
+        Args:
+            input_ids (list): user input resource identifiers
+            repo_id (int, optional): repository to look in, or None to look across repositories
+
+        Returns:
+            resolved (dict): user input identifier as key and (repo_id, resource_id, title, system_mtime, lock_version)
+            as value
+            not_found (list): user input identifiers that are not in the index
+            ambiguous (dict): user input identifier as key and a list of (repo_id, resource_id, title, system_mtime,
+            lock_version) for every match as value
+        """
+        resolved, not_found, ambiguous = {}, [], {}
+        for input_id in dict.fromkeys(input_ids):
+            matches = self.lookup(input_id, repo_id)
+            if not matches:
+                not_found.append(input_id)
+            elif len(matches) == 1:
+                resolved[input_id] = matches[0]
+            else:
+                ambiguous[input_id] = matches
+        return resolved, not_found, ambiguous
+
+
+def get_index_path(baseurl):
+    """
+    Gets the filepath of an ArchivesSpace instance's identifier index, so resources indexed from one instance are never
+    resolved for another.
+
+    Args:
+        baseurl (str): the ArchivesSpace API URL, see lookup_cache.client_url()
+
+    Returns:
+        (str): filepath of the SQLite file holding the instance's index
+    """
+    return INDEX_FILE.format(hashlib.sha256(baseurl.encode()).hexdigest()[:16])
+
+
+def open_index(baseurl):
+    """
+    Opens an ArchivesSpace instance's identifier index if it has been built.
+
+    Args:
+        baseurl (str): the ArchivesSpace API URL, see lookup_cache.client_url()
+
+    Returns:
+        (IdentifierIndex instance or None): the instance's index, None if it has not been built
+    """
+    index_path = get_index_path(baseurl)
+    return IdentifierIndex(index_path) if os.path.exists(index_path) else None
+
+
+def refresh_index(client, repo_ids, full=False, index_path=None):
+    """
+    Refreshes the identifier index for each repository, logging instead of raising errors so it can run in the
+    background.
+
+    Args:
+        client (ASnake.client object): a client object from ASnake.client to allow to connect to the ASpace API
+        repo_ids (list): ASpace repository ID #s to index
+        full (bool, optional): whether to re-index every resource instead of only those modified since the last refresh
+        index_path (str, optional): filepath of the SQLite file holding the index, the client's from get_index_path()
+        if None
+
+    Returns:
+        indexed (int): number of resources added or updated, or None if the refresh failed
+    """
+    with _refresh_lock:
+        try:
+            identifier_index = IdentifierIndex(index_path or get_index_path(lcache.client_url(client)))
+            indexed = sum(identifier_index.refresh(client, repo_id, full=full) for repo_id in repo_ids)
+        except Exception as e:
+            logger.error(f'Error refreshing identifier index: {e}')
+            return None
+    logger.info(f'Identifier index refreshed: {indexed} resource(s) added or updated')
+    return indexed
@@ -0,0 +1,443 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import as_export as asx
+from as_logging import logger
+
+CACHE_FILE = "lookup_cache.json"
+"""str: the lookup cache saved between sessions when _PERSIST_LOOKUP_CACHE_ is True, kept next to defaults.json"""
+DEFAULT_TTL = 60 * 60
+"""int: seconds a lookup is cached if _LOOKUP_CACHE_TTL_ is missing from defaults.json"""
+MAX_ENTRIES = 2048
+"""int: lookups of each kind kept before the least recently used is dropped"""
+resource_keys = ["uri", "title", "publish", "system_mtime", "lock_version"]
+"""list: keys of a resource's JSON that are cached along with its id_0 to id_3, all ASExport.read_results() needs"""
+_shared_cache = None
+"""LookupCache instance: the cache shared by every export run in the program, see get_lookup_cache()"""
+_shared_lock = threading.Lock()
+"""threading.Lock object: keeps two runs starting at the same time from each creating the shared cache"""
+
+
+class TTLCache:
+    """
+    A least recently used cache whose entries also expire a fixed number of seconds after they are stored.
+
+    Entries are stored with the wall clock time, so a cache saved to disk expires on schedule when it is loaded again.
+    Hits, misses, expired entries and evictions are counted for the log.
+    """
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES):
+        """
+        Must contain nothing, the TTL and size have defaults.
+
+        Args:
+            ttl (int or float, optional): seconds an entry is kept, 0 to keep nothing
+            max_entries (int, optional): entries kept before the least recently used is dropped
+        """
+        self.ttl = ttl
+        """int or float: seconds an entry is kept"""
+        self.max_entries = max_entries
+        """int: entries kept before the least recently used is dropped"""
+        self.entries = OrderedDict()
+        """collections.OrderedDict object: key as key and (stored time, value) as value, least recently used first"""
+        self.lock = threading.Lock()
+        """threading.Lock object: keeps export worker threads from changing the entries at the same time"""
+        self.hits = 0
+        """int: lookups that found a fresh entry"""
+        self.misses = 0
+        """int: lookups that found nothing or an expired entry"""
+        self.expired = 0
+        """int: entries dropped because they were older than the TTL"""
+        self.evictions = 0
+        """int: entries dropped because the cache was full"""
+
+    def get(self, key):
+        """
+        Looks up a key, counting a hit or a miss.
+
+        Args:
+            key (tuple or str): the key
+
+        Returns:
+            value (object or None): the cached value, None if it is not cached or has expired
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry[0] >= self.ttl:
+                del self.entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, stored=None):
+        """
+        Caches a value, dropping the least recently used entries if the cache is full.
+
+        Args:
+            key (tuple or str): the key
+            value (object): the value, which has to be JSON serializable if the cache is saved
+            stored (float, optional): time the value was fetched in seconds since the epoch, now if None
+
+        Returns:
+            None
+        """
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (stored or time.time(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        """
+        Drops a key from the cache.
+
+        Args:
+            key (tuple or str): the key
+
+        Returns:
+            value (object or None): the value that was cached, None if there was none
+        """
+        with self.lock:
+            entry = self.entries.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def peek(self, key):
+        """
+        Looks up a key without counting a hit or a miss or marking it recently used.
+
+        Args:
+            key (tuple or str): the key
+
+        Returns:
+            value (object or None): the cached value, None if it is not cached or has expired
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or time.time() - entry[0] >= self.ttl:
+            return None
+        return entry[1]
+
+    def pop_where(self, matches):
+        """
+        Drops every entry whose value matches.
+
+        Args:
+            matches (function): called with each key and value, the entry is dropped if it returns True
+
+        Returns:
+            dropped (int): number of entries dropped
+        """
+        with self.lock:
+            keys = [key for key, (stored, value) in self.entries.items() if matches(key, value)]
+            for key in keys:
+                del self.entries[key]
+        return len(keys)
+
+    def snapshot(self):
+        """
+        Lists the fresh entries, for saving the cache.
+
+        Returns:
+            (list): [key, stored time, value] for each fresh entry, least recently used first
+        """
+        now = time.time()
+        with self.lock:
+            return [[key, stored, value] for key, (stored, value) in self.entries.items() if now - stored < self.ttl]
+
+    def stats(self):
+        """
+        Gets the cache's counters.
+
+        Returns:
+            (dict): the number of entries, hits, misses, expired entries and evictions
+        """
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "expired": self.expired,
+                    "evictions": self.evictions}
+
+
+class LookupCache:
+    """
+    Caches identifier searches and resource JSON, so re-exporting the same resources does not search for them again.
+
+    Searches are cached by ArchivesSpace API URL, repository and identifier with its non-alphanumeric characters
+    removed, the same way ASExport.read_results() matches them, and resolve to a resource URI. The resource's JSON is
+    cached by API URL and URI along with its lock_version, and is only returned for the lock_version asked for.
+    Whenever the app downloads a resource's JSON again, from a search, an Export All or the identifier index, and it
+    shows the record was saved since it was cached (see is_newer()), the resource and every search resolved to it are
+    dropped.
+    """
+    def __init__(self, ttl=DEFAULT_TTL, cache_path=None):
+        """
+        Must contain nothing, the TTL has a default and the cache is only kept in memory without cache_path.
+
+        Args:
+            ttl (int or float, optional): seconds a lookup is cached, 0 to cache nothing
+            cache_path (str, optional): filepath of the JSON file the cache is loaded from and saved to
+        """
+        self.searches = TTLCache(ttl)
+        """TTLCache instance: (API URL, repo_id, normalized identifier) as key and resource URI as value"""
+        self.resources = TTLCache(ttl)
+        """TTLCache instance: (API URL, resource URI) as key and [lock_version, resource JSON] as value"""
+        self.cache_path = cache_path
+        """str: filepath of the JSON file the cache is saved to, None if it is only kept in memory"""
+        self.changed = 0
+        """int: cached resources dropped because they changed in ArchivesSpace"""
+        if cache_path is not None:
+            self.load()
+
+    def get_search(self, baseurl, repo_id, input_id, current_version=None):
+        """
+        Looks up the resource an identifier was resolved to.
+
+        Args:
+            baseurl (str): the ArchivesSpace API URL
+            repo_id (int or None): ASpace repository id # searched, None for a search across repositories
+            input_id (str): user input resource identifier
+            current_version (function, optional): called with the resource URI, returns a dict of its lock_version and
+                system_mtime as last fetched from ArchivesSpace or None if it is unknown, ex.
+                id_index.IdentifierIndex.version(). The resource is dropped if it has been saved since it was cached
+
+        Returns:
+            resource_json (dict or None): the uri, title, id_0, system_mtime and lock_version of the resource, None if
+                it is not cached or has changed
+        """
+        key = (baseurl, repo_id, asx.id_combined_regex.sub('', input_id))
+        uri = self.searches.get(key)
+        if uri is None:
+            return None
+        version = current_version(uri) if current_version is not None else None
+        resource_json = self.get_resource(baseurl, uri)
+        if resource_json is not None and version is not None and is_newer(version, resource_json):
+            self.drop_changed(baseurl, uri)
+            resource_json = None
+        if resource_json is None:
+            self.searches.pop(key)
+            return None
+        return dict(resource_json, id_0=input_id)
+
+    def put_search(self, baseurl, repo_id, input_id, resource_json):
+        """
+        Caches the resource an identifier was resolved to, with put_resource().
+
+        Args:
+            baseurl (str): the ArchivesSpace API URL
+            repo_id (int or None): ASpace repository id # searched, None for a search across repositories
+            input_id (str): user input resource identifier
+            resource_json (dict): the uri, title, system_mtime and lock_version of the resource
+
+        Returns:
+            None
+        """
+        self.put_resource(baseurl, {key: value for key, value in resource_json.items() if key != "id_0"})
+        self.searches.put((baseurl, repo_id, asx.id_combined_regex.sub('', input_id)), resource_json["uri"])
+
+    def get_resource(self, baseurl, uri, lock_version=None):
+        """
+        Looks up a resource's JSON.
+
+        Args:
+            baseurl (str): the ArchivesSpace API URL
+            uri (str): the resource URI, ex. /repositories/2/resources/1
+            lock_version (int, optional): the lock_version wanted, any cached lock_version if None
+
+        Returns:
+            resource_json (dict or None): the resource's JSON, None if it is not cached at that lock_version
+        """
+        entry = self.resources.get((baseurl, uri))
+        if entry is None or (lock_version is not None and entry[0] is not None and entry[0] != lock_version):
+            return None
+        return entry[1]
+
+    def put_resource(self, baseurl, resource_json):
+        """
+        Caches a resource's JSON that was just downloaded, dropping what was cached for it if the record has changed.
+
+        Args:
+            baseurl (str): the ArchivesSpace API URL
+            resource_json (dict): the resource's JSON, with its uri, system_mtime and lock_version. Only the keys in
+                resource_keys and its identifier are cached
+
+        Returns:
+            changed (bool): True if an older version of the resource was cached
+        """
+        changed = self.observe(baseurl, [resource_json]) > 0
+        cached_json = {key: value for key, value in resource_json.items()
+                       if key in resource_keys or asx.id_field_regex.match(key)}
+        self.resources.put((baseurl, resource_json["uri"]), [resource_json.get("lock_version"), cached_json])
+        return changed
+
+    def observe(self, baseurl, resource_jsons):
+        """
+        Drops the cached resources that a download shows were saved since they were cached, and the searches
+        resolved to them. Resources that are not cached are not added, so a large Export All does not fill the cache.
+
+        Args:
+            baseurl (str): the ArchivesSpace API URL
+            resource_jsons (list): resource JSON or search results with the uri, system_mtime and lock_version of each
+                resource, ex. the published resources of an Export All
+
+        Returns:
+            changed (int): number of cached resources dropped
+        """
+        changed = 0
+        for resource_json in resource_jsons:
+            entry = self.resources.peek((baseurl, resource_json.get("uri")))
+            if entry is not None and is_newer(resource_json, entry[1]):
+                self.drop_changed(baseurl, resource_json["uri"])
+                changed += 1
+        return changed
+
+    def drop_changed(self, baseurl, uri):
+        """
+        Drops everything cached for a resource that changed in ArchivesSpace, counting it.
+
+        Args:
+            baseurl (str): the ArchivesSpace API URL
+            uri (str): the resource URI
+
+        Returns:
+            None
+        """
+        logger.info(f'{uri} changed in ArchivesSpace, dropping its cached lookups')
+        self.invalidate(baseurl, uri)
+        self.changed += 1
+
+    def invalidate(self, baseurl, uri):
+        """
+        Drops everything cached for a resource, ex. when an export shows its cached lookup is out of date.
+
+        Args:
+            baseurl (str): the ArchivesSpace API URL
+            uri (str): the resource URI
+
+        Returns:
+            None
+        """
+        self.resources.pop((baseurl, uri))
+        self.searches.pop_where(lambda key, search_uri: key[0] == baseurl and search_uri == uri)
+
+    def stats(self):
+        """
+        Gets the counters of both caches.
+
+        Returns:
+            (dict): searches and resources as keys and the stats of each TTLCache as value, and the number of resources
+            dropped because they changed
+        """
+        return {"searches": self.searches.stats(), "resources": self.resources.stats(), "changed": self.changed}
+
+    def load(self):
+        """
+        Loads the entries saved in cache_path that have not expired.
+
+        Returns:
+            None
+        """
+        try:
+            with open(self.cache_path, "r") as cache_file:
+                saved = json.load(cache_file)
+        except (OSError, ValueError):
+            return
+        for name, cache in [("searches", self.searches), ("resources", self.resources)]:
+            for key, stored, value in saved.get(name, []):
+                if name == "searches" and not isinstance(value, str):
+                    continue  # saved before searches were cached as resource URIs
+                if time.time() - stored < cache.ttl:
+                    cache.put(tuple(key), value, stored)
+
+    def save(self):
+        """
+        Saves the fresh entries to cache_path, replacing the file only once it is fully written.
+
+        Returns:
+            None
+        """
+        if self.cache_path is None:
+            return
+        saved = {"searches": self.searches.snapshot(), "resources": self.resources.snapshot()}
+        temp_fd, temp_path = tempfile.mkstemp(suffix=".part", prefix=".",
+                                              dir=os.path.dirname(os.path.abspath(self.cache_path)))
+        try:
+            with os.fdopen(temp_fd, "w") as cache_file:
+                json.dump(saved, cache_file)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            logger.error(f'Error saving the lookup cache: {e}')
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def get_lookup_cache(defaults):
+    """
+    Gets the lookup cache shared by every export run, creating it the first time and keeping its TTL and whether it
+    is saved to lookup_cache.json up to date with the options in defaults.json.
+
+    Args:
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+
+    Returns:
+        (LookupCache instance): the shared cache, which caches nothing if _LOOKUP_CACHE_TTL_ is 0
+    """
+    global _shared_cache
+    try:
+        ttl = float(defaults["performance_default"]["_LOOKUP_CACHE_TTL_"])
+    except (KeyError, TypeError, ValueError):
+        ttl = DEFAULT_TTL
+    persist = defaults.get("performance_default", {}).get("_PERSIST_LOOKUP_CACHE_", False) is True
+    cache_path = CACHE_FILE if persist else None
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = LookupCache(ttl, cache_path)
+        _shared_cache.searches.ttl = _shared_cache.resources.ttl = ttl
+        if _shared_cache.cache_path != cache_path:
+            _shared_cache.cache_path = cache_path
+            if cache_path is not None:  # turned on since the cache was created, so add what was saved before
+                _shared_cache.load()
+        return _shared_cache
+
+
+def client_url(client):
+    """
+    Gets the ArchivesSpace API URL a client is connected to, which every cache key starts with.
+
+    Args:
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+
+    Returns:
+        (str): the API URL, ex. http://localhost:8089
+    """
+    return client.config["baseurl"].rstrip("/")
+
+
+def is_newer(resource_json, cached_json):
+    """
+    Checks whether a resource's JSON shows the record was saved after the JSON cached for it.
+
+    ArchivesSpace increments a record's lock_version every time it is saved, so it is compared when both have one.
+    Otherwise the system_mtimes are, which are ISO 8601 times in UTC and so sort as strings.
+
+    Args:
+        resource_json (dict): the resource's JSON or search result as just fetched, with its lock_version and
+            system_mtime if known
+        cached_json (dict): the resource's JSON as cached
+
+    Returns:
+        (bool): True if the record has changed since it was cached
+    """
+    lock_version, cached_lock_version = resource_json.get("lock_version"), cached_json.get("lock_version")
+    if lock_version is not None and cached_lock_version is not None:
+        return int(lock_version) > int(cached_lock_version)
+    system_mtime, cached_mtime = resource_json.get("system_mtime"), cached_json.get("system_mtime")
+    return system_mtime is not None and (cached_mtime is None or system_mtime > cached_mtime)
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+from pathlib import Path
+
+import cleanup as clean
+import cleanup_pool as cpool
+import export_archive as exarchive
+from as_logging import logger
+
+MANIFEST_FILE = "reclean_manifest.json"
+"""str: the hash and cleanup options each raw EAD export was last re-cleaned with, kept next to defaults.json"""
+HASH_CHUNK = 1024 * 1024
+"""int: bytes of a raw export read at a time while hashing it"""
+
+
+class RecleanManifest:
+    """
+    Records the hash of each raw EAD export and the cleanup options it was last cleaned with, so a re-clean can skip
+    the exports that would come out the same.
+    """
+    def __init__(self, manifest_path=MANIFEST_FILE):
+        """
+        Loads the manifest from manifest_path, starting an empty one if it does not exist or cannot be read.
+
+        Args:
+            manifest_path (str, optional): filepath of the JSON file holding the manifest
+        """
+        self.manifest_path = manifest_path
+        """str: filepath of the JSON file holding the manifest"""
+        self.cleaned = {}
+        """dict: raw export filename as key and a dict of its sha256, the sorted cleanup options and the filepath of
+        the cleaned EAD as value"""
+        self.lock = threading.Lock()
+        """threading.Lock object: keeps a re-clean from recording while the manifest is being saved"""
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, "r") as manifest_file:
+                    self.cleaned = json.load(manifest_file)
+            except (OSError, ValueError) as e:
+                logger.error(f'Error reading re-clean manifest, starting a new one: {e}')
+
+    def is_current(self, filename, sha256, cleanup_options, filepath):
+        """
+        Checks whether a raw export was last cleaned from the same content with the same options to the same place,
+        and its cleaned EAD is still on disk.
+
+        Args:
+            filename (str): name of the raw export, ex. ms1234.xml
+            sha256 (str): hash of the raw export's content
+            cleanup_options (list): the cleanup options it would be cleaned with
+            filepath (str): filepath the cleaned EAD would be written to
+
+        Returns:
+            (bool): True if the raw export does not need to be cleaned again
+        """
+        last_clean = self.cleaned.get(filename)
+        if last_clean is None or last_clean["sha256"] != sha256 or last_clean["options"] != sorted(cleanup_options):
+            return False
+        return last_clean["filepath"] == str(filepath) and os.path.exists(filepath)
+
+    def record(self, filename, sha256, cleanup_options, filepath):
+        """
+        Records a raw export that was cleaned without errors.
+
+        Args:
+            filename (str): name of the raw export, ex. ms1234.xml
+            sha256 (str): hash of the raw export's content
+            cleanup_options (list): the cleanup options it was cleaned with
+            filepath (str): filepath of the cleaned EAD
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.cleaned[filename] = {"sha256": sha256, "options": sorted(cleanup_options), "filepath": str(filepath)}
+
+    def save(self):
+        """
+        Writes the manifest to a temporary file and renames it over manifest_path, so it is never left half written.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            manifest_dir = Path(self.manifest_path).parent
+            temp_fd, temp_path = tempfile.mkstemp(suffix=".part", prefix=".", dir=manifest_dir)
+            try:
+                with os.fdopen(temp_fd, "w") as manifest_file:
+                    json.dump(self.cleaned, manifest_file)
+                os.replace(temp_path, self.manifest_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+
+def hash_file(raw_file, copy_to=None):
+    """
+    Hashes a file as it is read, optionally copying it at the same time.
+
+    Args:
+        raw_file (file object): the file opened for reading in binary
+        copy_to (file object, optional): a file opened for writing in binary the content is also written to
+
+    Returns:
+        (str): the sha256 hex digest of the content
+    """
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: raw_file.read(HASH_CHUNK), b""):
+        sha256.update(chunk)
+        if copy_to is not None:
+            copy_to.write(chunk)
+    return sha256.hexdigest()
+
+
+def iter_raw_exports(source_dir, work_dir):
+    """
+    Finds every raw EAD export in a folder and in the archives of raw exports in it, hashing each one.
+
+    Exports in the folder come first. Each archive is then read once, newest first, and its exports that were not
+    already found are extracted to work_dir, so an export is only found once, the same one export_archive.open_raw()
+    would read. This is a generator, so archived exports are only extracted as they are asked for.
+
+    Args:
+        source_dir (str): the raw EAD exports folder
+        work_dir (str): folder archived exports are extracted to
+
+    Yields:
+        filename (str): name of the raw export, ex. ms1234.xml
+        filepath (str): filepath of the raw export in source_dir, or of its copy in work_dir if it was archived
+        sha256 (str): hash of the raw export's content
+        archive_path (str or None): filepath of the archive the export was extracted from, None if it is in the folder
+    """
+    found = set()
+    for filepath in sorted(Path(source_dir).glob("*.xml")):
+        with open(filepath, "rb") as raw_file:
+            sha256 = hash_file(raw_file)
+        found.add(filepath.name)
+        yield filepath.name, str(filepath), sha256, None
+    for archive_path in sorted(Path(source_dir).glob(exarchive.ARCHIVE_GLOB), reverse=True):  # names sort by time
+        try:
+            with tarfile.open(archive_path, "r:gz") as tar:
+                for member in tar:
+                    filename = Path(member.name).name
+                    if not member.isfile() or Path(filename).suffix != ".xml" or filename in found:
+                        continue
+                    found.add(filename)
+                    filepath = str(Path(work_dir, filename))
+                    with tar.extractfile(member) as raw_file, open(filepath, "wb") as raw_copy:
+                        sha256 = hash_file(raw_file, raw_copy)
+                    yield filename, filepath, sha256, str(archive_path)
+        except (OSError, tarfile.TarError) as e:
+            logger.error(f'Error reading raw export archive {archive_path}: {e}')
+
+
+def reclean_eads(defaults, cleanup_options, source_dir=None, force=False, manifest_path=MANIFEST_FILE):
+    """
+    Cleans every raw EAD export in a folder and its archives again with the current cleanup options, without
+    exporting them from ArchivesSpace.
+
+    The exports are cleaned in parallel in the shared cleanup pool, see cleanup_pool.get_cleanup_pool(), and are left
+    where they are, unlike cleanup_eads(), which deletes, archives or sweeps them after an export. Exports whose
+    content and cleanup options are the same as when they were last re-cleaned are skipped, see RecleanManifest.
+
+    Args:
+        defaults (dict): contains the data from defaults.json file, all data the user has specified as default
+        cleanup_options (list): keys used to determine what cleanup methods to run, see cleanup.EADRecord.clean_suite()
+        source_dir (str, optional): the raw EAD exports folder, _SOURCE_DIR_ in defaults if None
+        force (bool, optional): whether to clean every export, even those that are unchanged
+        manifest_path (str, optional): filepath of the JSON file holding the re-clean manifest
+
+    Yields:
+        filename (str): name of the raw export, ex. ms1234.xml
+        valid (bool or None): True if the XML was valid and False if not, None if the export was skipped
+        results (str or None): cleanup results, None if the export was skipped
+    """
+    source_dir = source_dir or defaults["ead_export_default"]["_SOURCE_DIR_"]
+    output_dir = defaults["ead_export_default"]["_OUTPUT_DIR_"]
+    manifest = RecleanManifest(manifest_path)
+    cleanup_pool = cpool.get_cleanup_pool(defaults)
+    raw_exports = {}  # filepath of each export being cleaned as key and (filename, sha256, archive_path) as value
+    skipped = []
+
+    def changed_exports(work_dir):
+        for filename, filepath, sha256, archive_path in iter_raw_exports(source_dir, work_dir):
+            if force is False and manifest.is_current(filename, sha256, cleanup_options, Path(output_dir, filename)):
+                skipped.append(filename)
+                if archive_path is not None:
+                    os.remove(filepath)
+                continue
+            raw_exports[filepath] = (filename, sha256, archive_path)
+            yield filepath
+
+    logger.info(f'Re-cleaning raw EAD exports in {source_dir} with {cleanup_options}, force: {force}')
+    cleaned_count = 0
+    stream_min_size = clean.get_stream_min_size(defaults)
+    work_dir = tempfile.mkdtemp(prefix="reclean_")
+    try:
+        for filepath, valid, results in cleanup_pool.clean_files(changed_exports(work_dir), cleanup_options, output_dir,
+                                                                 stream_min_size=stream_min_size, raw_exports=False):
+            while skipped:
+                yield skipped.pop(0), None, None
+            filename, sha256, archive_path = raw_exports.pop(filepath)
+            if archive_path is not None:  # the extracted copy is no longer needed
+                os.remove(filepath)
+                results = results.replace(work_dir, archive_path)
+            if valid is True:
+                manifest.record(filename, sha256, cleanup_options, Path(output_dir, filename))
+                cleaned_count += 1
+            yield filename, valid, results
+        while skipped:
+            yield skipped.pop(0), None, None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        manifest.save()
+        logger.info(f'Re-cleaned {cleaned_count} raw EAD export(s) in {source_dir}')
@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import time
+
+from as_logging import logger
+
+CACHE_FILE = "repo_cache.json"
+"""str: the repository cache, kept next to defaults.json"""
+CACHE_MAX_AGE = 24 * 60 * 60
+"""int: seconds before cached repositories are refreshed in the background"""
+
+
+def fetch_repositories(client):
+    """
+    Gets the name and id # of every repository in an ArchivesSpace instance.
+
+    Args:
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+
+    Returns:
+        repositories (dict): repository name as key and repository id # as value
+    """
+    repositories = {}
+    repo_results = client.get('/repositories')
+    for result in json.loads(repo_results.content.decode()):
+        uri_components = result["uri"].split("/")
+        repositories[result["name"]] = int(uri_components[-1])
+    return repositories
+
+
+def load_repositories(as_api, cache_path=CACHE_FILE):
+    """
+    Gets the repositories cached for an ArchivesSpace API URL.
+
+    Args:
+        as_api (str): the ArchivesSpace API URL the repositories were fetched from
+        cache_path (str, optional): filepath of the JSON file holding the cache
+
+    Returns:
+        repositories (dict or None): repository name as key and repository id # as value, None if nothing is cached
+        fetched (float or None): time the repositories were fetched, in seconds since the epoch
+    """
+    try:
+        with open(cache_path, "r") as cache_file:
+            cached_api = json.load(cache_file).get(as_api)
+    except (OSError, ValueError):
+        return None, None
+    if cached_api is None:
+        return None, None
+    return cached_api["repositories"], cached_api["fetched"]
+
+
+def save_repositories(as_api, repositories, cache_path=CACHE_FILE):
+    """
+    Caches the repositories for an ArchivesSpace API URL, replacing the cache file only once it is fully written.
+
+    Args:
+        as_api (str): the ArchivesSpace API URL the repositories were fetched from
+        repositories (dict): repository name as key and repository id # as value
+        cache_path (str, optional): filepath of the JSON file holding the cache
+
+    Returns:
+        None
+    """
+    try:
+        with open(cache_path, "r") as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        cache = {}
+    cache[as_api] = {"fetched": time.time(), "repositories": repositories}
+    temp_fd, temp_path = tempfile.mkstemp(suffix=".part", prefix=".", dir=os.path.dirname(os.path.abspath(cache_path)))
+    try:
+        with os.fdopen(temp_fd, "w") as cache_file:
+            json.dump(cache, cache_file)
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def is_fresh(fetched, max_age=CACHE_MAX_AGE):
+    """
+    Checks whether cached repositories are recent enough to skip refreshing them.
+
+    Args:
+        fetched (float or None): time the repositories were fetched, in seconds since the epoch
+        max_age (int, optional): seconds cached repositories stay fresh
+
+    Returns:
+        (bool): True if the cache is fresh
+    """
+    return fetched is not None and time.time() - fetched < max_age
+
+
+def refresh_repositories(client, as_api, gui_window, cache_path=CACHE_FILE):
+    """
+    Fetches and caches the repositories, then sends them to the GUI. Meant to run in a background thread.
+
+    Args:
+        client (ASnake.client object): the ArchivesSpace ASnake client for accessing and connecting to the API
+        as_api (str): the ArchivesSpace API URL the repositories are fetched from
+        gui_window (PySimpleGUI Object): is the GUI window for the app. See PySimpleGUI.org for more info
+        cache_path (str, optional): filepath of the JSON file holding the cache
+
+    Returns:
+        None
+    """
+    try:
+        repositories = fetch_repositories(client)
+        save_repositories(as_api, repositories, cache_path)
+    except Exception as e:
+        logger.error(f'Error refreshing repositories: {e}')
+        return
+    logger.info(f'Refreshed {len(repositories)} repositories')
+    gui_window.write_event_value('-REPOS_REFRESH-', repositories)
@@ -1,7 +1,4 @@
-from as_xtf_GUI import logger
-from paramiko import SSHClient, AutoAddPolicy, SFTPClient
-from paramiko.ssh_exception import AuthenticationException
-from scp import SCPClient, SCPException
+from as_logging import logger
 
 # source code found here: https://hackersandslackers.com/automate-ssh-scp-python-paramiko/
 
@@ -19,7 +16,11 @@ class RemoteClient:
         self.scp = None
 
     def connect_remote(self):
-        # open connection to remote host
+        # open connection to remote host, paramiko and scp are imported here so importing this module stays fast
+        from paramiko import SSHClient, AutoAddPolicy, SFTPClient
+        from paramiko.ssh_exception import AuthenticationException
+        from scp import SCPClient
+
         try:
             self.client = SSHClient()
             self.client.load_system_host_keys()
@@ -77,6 +78,8 @@ class RemoteClient:
 
     def __upload_single_file(self, file):
         # upload a single file to a remote directory
+        from scp import SCPException
+
         try:
             self.scp.put(file,
                          recursive=True,